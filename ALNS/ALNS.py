@@ -1,22 +1,19 @@
-from EVSPModel import EVSP
-from .InitialSolution import initialize, initialize_nightCharge
+from EVSPModel import EVSP, Schedule
+from EVSPModel.CacheClass import LRUCache
+from .InitialSolution import initialize, initialize_nightCharge, initialize_minFleet, initialize_warmStart, matchTrips
 from .WeightsManagement import Weights
 from .RemoveOperators import randomRemoval, timeRelatedRemoval, neighborRemoval
 from .InsertOperators import randomInsert, greedyInsert
+from .PostOptimize import postOptimize
+from .ChargingAssignment import assignChargingTime
+from .Calculations import evaluateSchedule, evaluateViolation
 
 import math
 import random
 import numpy as np
-from tqdm import tqdm
 from copy import deepcopy
 from timeit import default_timer as timer
 
-import matplotlib
-import matplotlib.pyplot as plt
-plt.rcParams['figure.dpi'] = 100
-plt.rcParams['xtick.labelsize'] = 'large'
-plt.rcParams['ytick.labelsize'] = 'large'
-
 
 """
 @author: Chen Qiuzi
@@ -28,6 +25,17 @@ _better = 2
 _optimal = 3
 
 
+def pyplot():
+    """
+    Import matplotlib.pyplot when plotting with the style of ALNS plots, so that solving does not import matplotlib.
+    """
+    import matplotlib.pyplot as plt
+    plt.rcParams['figure.dpi'] = 100
+    plt.rcParams['xtick.labelsize'] = 'large'
+    plt.rcParams['ytick.labelsize'] = 'large'
+    return plt
+
+
 class ALNS():
 
     """
@@ -48,10 +56,25 @@ class ALNS():
         r=0.5,
         enePenalty=700,
         capPenalty=700,
+        adaptivePenalty=False,
+        targetFeasibleRatio=0.5,
+        penaltyStep=1.2,
         chargeProb = 0.9,
         segLength=100,
         terminate=True,
         terminateLength=2000,
+        evalTableSize=5000,
+        repairCharging=False,
+        repairTimeLimit=1,
+        postOpt=False,
+        postTimeLimit=60,
+        timeLimit=None,
+        initializer='greedy',
+        targetGap=None,
+        selection='roulette',
+        removeOperators=None,
+        insertOperators=None,
+        callback=None,
         printLog=True,
     ):
         """
@@ -61,9 +84,28 @@ class ALNS():
         alpha: cooling rate of temperature (0,1)
         r: reaction factor when update weights (0,1)
         enePenalty, capPenalty: penalty when violating capacity and energy constraints
+        adaptivePenalty: whether to penalize violation magnitudes (kWh below the safe battery level, vehicles over the station
+                         capacity in each time division) with adaptive multipliers, enePenalty & capPenalty are initial multipliers
+        targetFeasibleRatio: target ratio of neighbours feasible for each constraint in a segment with adaptive penalties
+        penaltyStep: a multiplier is multiplied (divided) by penaltyStep after a segment below (above) the target ratio
         chargeProb: probability of charging insertion for random insertion
         segLength: segment length for updating weights
         terminateLength: length of iteration to check improvement
+        evalTableSize: number of recently evaluated schedule fingerprints to keep, duplicate neighbours are resolved from it
+        repairCharging: whether to reassign charging time of capacity-infeasible neighbours optimally
+        repairTimeLimit: time limit of charging time reassignment / sec
+        postOpt: whether to perform set-partitioning post-optimization over energy-feasible duties generated during search
+        postTimeLimit: time limit of post-optimization / sec
+        timeLimit: time limit of the search / sec, None means no limit
+        initializer: initial solution, 'greedy' (see initialize), 'minFleet' (see initialize_minFleet),
+                     or a function evsp -> Schedule
+        targetGap: terminate when the gap between the best cost and the lower bound (see EVSP.lowerBound) is reached,
+                   checked every segment, e.g. 0.01 for 1%, None means not to check
+        selection: selection policy of operators, 'roulette', 'rewardPerSecond', 'ucb', 'thompson',
+                   or a function returning a new SelectionPolicy object (see WeightsManagement)
+        removeOperators, insertOperators: lists of operators, default are the operators in RemoveOperators & InsertOperators,
+                                          more can be registered by addRemoveOperator() & addInsertOperator()
+        callback: function called after each segment with the ALNS object and the number of iterations, e.g. to report progress
         nightCharge: decision var of <night time charge only> mode
         ALNS class use <Weights> class to manage operators.
         """
@@ -75,6 +117,12 @@ class ALNS():
         self.alpha = alpha
         self.enePenalty = enePenalty
         self.capPenalty = capPenalty
+        self.adaptivePenalty = adaptivePenalty
+        self.targetFeasibleRatio = targetFeasibleRatio
+        self.penaltyStep = penaltyStep
+        self.eneMultiplier = enePenalty  # penalty per kWh of energy violation
+        self.capMultiplier = capPenalty  # penalty per vehicle of capacity violation
+        self.historyPenalty = []  # (eneMultiplier, capMultiplier) after each segment
         self.chargeProb = chargeProb
         self.segLength = segLength
         self.terminate=terminate
@@ -83,26 +131,36 @@ class ALNS():
         else:
             self.terminateLength = self.iterMax
 
+        self.evalTableSize = evalTableSize
+        self.evaluated = None  # table of evaluated schedules, fingerprint: (cost, eneViolation, capViolation)
+        self.duplicateRate = 0  # ratio of neighbours resolved from the table
+        self.repairCharging = repairCharging
+        self.repairTimeLimit = repairTimeLimit
+        self.repairNum = 0  # number of neighbours made feasible by charging time reassignment
+        self.postOpt = postOpt
+        self.postTimeLimit = postTimeLimit
+        self.historyDuty = {}  # energy-feasible duties for post-optimization, cache key: duty
+        self.postCost = None  # cost of the post-optimized schedule
+        self.timeLimit = timeLimit
+        if (initializer not in ['greedy', 'minFleet']) and (not callable(initializer)):
+            raise ValueError("Initializer should be 'greedy', 'minFleet' or a function.")
+        self.initializer = initializer
+        self.targetGap = targetGap
+        self.lowerBound = None  # lower bound of the total cost
+        self.historyGap = []  # gap to the lower bound at the end of each segment
+        self.callback = callback
         self.printLog = printLog
         self.nightCharge = evsp.nightCharge
         if self.nightCharge:
             self.chargeProb = 0
 
-        self.removeOperators = {
-            1: randomRemoval,
-            2: timeRelatedRemoval,
-            3: neighborRemoval
-        }
-
-        # self.insertOperators = {
-        #     1: greedyInsert
-        # }
-        self.insertOperators = {
-            1: randomInsert,
-            2: greedyInsert
-        }
-
-        self.weights = Weights(r, self.removeOperators, self.insertOperators)
+        self.weights = Weights(r, policy=selection)
+        self.removeOperators = self.weights.removeOperators  # {key: operator}
+        self.insertOperators = self.weights.insertOperators
+        for operator in removeOperators if removeOperators is not None else [randomRemoval, timeRelatedRemoval, neighborRemoval]:
+            self.addRemoveOperator(operator)
+        for operator in insertOperators if insertOperators is not None else [randomInsert, greedyInsert]:
+            self.addInsertOperator(operator)
         
         self.bestSchedule = None
         self.bestCost = 0
@@ -113,25 +171,56 @@ class ALNS():
         self.totalIter = 0
 
 
-    def solve(self):
+    def solve(self, initialSchedule:Schedule=None, T0=None, mapping=None):
         """
         Solve EVSP using ALNS.
+        initialSchedule: warm start from an existing schedule, e.g. the best schedule of the last run,
+                         which is repaired to cover the trips of the model (see initialize_warmStart)
+        T0: initial temperature of this run, default is T0 of ALNS, a lower one is suggested for a warm start
+        mapping: renumbering of trips of the initial schedule, e.g. returned by EVSP.removeTrips(),
+                 None means trips are matched by the ID column of the timetables (see matchTrips)
         """
         if self.printLog is True:
             print("--- ALNS Starts")
         tic = timer()
 
         # initialize
-        if self.nightCharge:
+        self.eneMultiplier, self.capMultiplier = self.enePenalty, self.capPenalty
+        self.historyPenalty = []
+        if initialSchedule is not None:
+            repairTimeLimit = self.repairTimeLimit if self.timeLimit is None else min(self.repairTimeLimit, self.timeLimit)
+            self.bestSchedule = initialize_warmStart(self.evsp, initialSchedule, self.chargeProb, mapping, repairTimeLimit)
+            self.bestCost, _isFeasible = self.evaluate(self.bestSchedule)  # penalized if infeasible
+            if self.printLog is True:
+                trip = matchTrips(self.evsp, initialSchedule, mapping)
+                given = set(s for duty in initialSchedule.schedule for s in duty.S if type(s) == int)
+                kept = set(trip[s] for s in given if s in trip)
+                print("--- Warm Start: %d trips dropped, %d trips inserted" % (len(given) - len(kept), len(self.evsp.T - kept)))
+        elif callable(self.initializer):
+            self.bestSchedule = self.initializer(self.evsp)
+            self.bestCost, _isFeasible = self.evaluate(self.bestSchedule)  # penalized if infeasible
+        elif self.initializer == 'minFleet':
+            self.bestSchedule = initialize_minFleet(self.evsp)
+            self.bestCost, _isFeasible = self.evaluate(self.bestSchedule)  # penalized if infeasible
+        elif self.nightCharge:
             self.bestSchedule = initialize_nightCharge(self.evsp)
+            self.bestCost = self.bestSchedule.calCost()
         else:
             self.bestSchedule = initialize(self.evsp)
-        self.bestCost = self.bestSchedule.calCost()
+            self.bestCost = self.bestSchedule.calCost()
         currentSchedule = deepcopy(self.bestSchedule)
+        self.repairNum = 0
+        self.historyDuty = {}
+        if self.postOpt:
+            self.recordSchedule(self.bestSchedule)
         currentCost = deepcopy(self.bestCost)
 
         # params
-        T = self.T0
+        T = self.T0 if T0 is None else T0
+        self.lowerBound = self.evsp.lowerBound() if (self.targetGap is not None) or (self.printLog is True) else None  # only for gaps
+        self.historyGap = []
+        self.evaluated = LRUCache(self.evalTableSize)
+        eneFeasibleNum, capFeasibleNum = 0, 0  # neighbours feasible for each constraint in the segment
 
         # iteration
         # for iter in tqdm(range(self.iterMax), desc='Iteration', ncols=60):
@@ -142,8 +231,19 @@ class ALNS():
 
             # remove and insert
             num2remove = random.randint(self.nMin, self.nMax)          
+            toc = timer()
             tripBank, removedSchedule = removeOp(self.evsp, currentSchedule, num2remove)
-            newCost, newSchedule, isFeasible = insertOp(self.evsp, tripBank, removedSchedule, self.enePenalty, self.capPenalty, self.chargeProb)
+            removeTime, toc = timer() - toc, timer()
+            newCost, newSchedule, isFeasible = insertOp(self.evsp, tripBank, removedSchedule, *self.penalties(), self.chargeProb, self.evaluated)
+            insertTime = timer() - toc
+            if self.adaptivePenalty:
+                newCost, eneViolation, capViolation = self.penalize(newCost, newSchedule, isFeasible)
+                eneFeasibleNum += (eneViolation == 0)
+                capFeasibleNum += (capViolation == 0)
+            if self.repairCharging and (not isFeasible) and (not newSchedule.checkCapacityFeasibility()):
+                newCost, newSchedule, isFeasible = self.repairChargingTime(newCost, newSchedule, isFeasible)
+            if self.postOpt:
+                self.recordSchedule(newSchedule)
             
             # acceptance
             result = _reject
@@ -163,13 +263,32 @@ class ALNS():
             # update params
             self.historyCurrentCost.append(currentCost)
             self.historyBestCost.append(self.bestCost)
-            self.weights.updateTimeAndScores(result)
+            self.weights.updateTimeAndScores(result, removeTime, insertTime)
             T = T * self.alpha
 
             # update weights
             if (iter+1) % self.segLength == 0:
                 self.weights.updateWeights()    
 
+                # adjust penalties, costs are penalized again by new multipliers
+                if self.adaptivePenalty:
+                    self.updatePenalties(eneFeasibleNum / self.segLength, capFeasibleNum / self.segLength)
+                    eneFeasibleNum, capFeasibleNum = 0, 0
+                    currentCost, _isFeasible = self.evaluate(currentSchedule)
+                    self.bestCost, _isFeasible = self.evaluate(self.bestSchedule)
+
+                if self.callback is not None:
+                    self.callback(self, iter + 1)
+
+                # gap termination
+                if self.lowerBound is not None:
+                    self.historyGap.append(self.gap())
+                if (self.targetGap is not None) and (self.historyGap[-1] <= self.targetGap):
+                    self.totalIter = iter + 1
+                    if self.printLog is True:
+                        print("--- Gap %.2f%% Reached at %d Iteration"%(self.historyGap[-1]*100, iter+1))
+                    break
+
                 # no improvement termination
                 if self.terminate is False:
                     pass
@@ -180,44 +299,163 @@ class ALNS():
                             print("--- Terminate at %d Iteration"%(iter+1))
                         break
 
+            # time limit termination
+            if (self.timeLimit is not None) and (timer() - tic >= self.timeLimit):
+                self.totalIter = iter + 1
+                if self.printLog is True:
+                    print("--- Time Limit Reached at %d Iteration"%(iter+1))
+                break
+
+        # post-optimization
+        if self.postOpt:
+            self.postOptimize()
+
         toc = timer()
         self.runTime = toc - tic
         if self.totalIter == 0:
             self.totalIter = self.iterMax
+        self.duplicateRate = self.evaluated.hitRate()
         
         self.bestSchedule.updateR()
+        _cost, eneFeasible = self.bestSchedule.evaluate()  # verify the best schedule in one batched pass
 
         if self.printLog is True:
             print("--- Solve Time: %.2f sec"%(toc-tic))
             print("--- Best Cost: %.2f yuan"%(self.bestCost))
             print("--- Number of Buses: %d" %(len(self.bestSchedule.schedule)))
             print("--- Number of Charging Trips: %d" %(len(self.bestSchedule.R)))
-            # print("--- Energy Feasibility: %s"%(self.bestSchedule.checkEnergyFeasibility()))
+            print("--- Energy Feasibility: %s"%(eneFeasible))
+            print("--- Gap to Lower Bound: %.2f%% (%.2f yuan)"%(self.gap()*100, self.lowerBound))
+            if self.repairCharging:
+                print("--- Repaired Neighbours: %d"%(self.repairNum))
+            print("--- Duplicate Neighbours: %.1f%%"%(self.duplicateRate*100))
+            print("--- Duty Cache Hit Rate: %.1f%% (%d hits, %d misses)"%(self.evsp.dutyCache.hitRate()*100, self.evsp.dutyCache.hits, self.evsp.dutyCache.misses))
             # print("--- Capacity Feasibility: %s"%(self.bestSchedule.checkCapacityFeasibility()))
             print("--- ALNS Finished")
 
 
-    # def recordSchedule(self, schedule:Schedule):
-    #     """
-    #     Record history duties for post-optimization.
-    #     Duties should be energy-feasible.
-    #     """
-    #     for duty in schedule.schedule:
-    #         if duty.checkEnergyFeasibility():
-    #             self.historyDuty.append(duty)
+    def addRemoveOperator(self, operator):
+        """
+        Register a remove operator, (evsp, schedule, n) -> (tripBank, removedSchedule).
+        Return the key of the operator.
+        """
+        return self.weights.addRemoveOperator(operator)
+
+
+    def addInsertOperator(self, operator):
+        """
+        Register an insert operator,
+        (evsp, tripBank, schedule, enePenalty, capPenalty, chargeProb, evaluated) -> (cost, schedule, isFeasible).
+        Return the key of the operator.
+        """
+        return self.weights.addInsertOperator(operator)
+
+
+    def gap(self):
+        """
+        Relative gap between the best cost and the lower bound of the total cost,
+        None if the lower bound is not computed (no targetGap and no log).
+        """
+        if self.lowerBound is None:
+            return None
+        return (self.bestCost - self.lowerBound) / self.bestCost
+
+
+    def penalties(self):
+        """
+        Return (enePenalty, capPenalty) for insert operators, no penalty is added by operators with adaptive penalties.
+        """
+        return (0, 0) if self.adaptivePenalty else (self.enePenalty, self.capPenalty)
+
+
+    def penalize(self, cost, schedule:Schedule, isFeasible):
+        """
+        Penalize a schedule evaluated without penalty by the magnitudes of violations and the adaptive multipliers.
+        Return (cost, eneViolation, capViolation).
+        """
+        if isFeasible:
+            return cost, 0, 0
+        cost, eneViolation, capViolation = evaluateViolation(self.evsp, schedule)
+        return cost + self.eneMultiplier * eneViolation + self.capMultiplier * capViolation, eneViolation, capViolation
+
+
+    def evaluate(self, schedule:Schedule, evaluated=None):
+        """
+        Return (cost, isFeasible) of a schedule, penalized by fixed or adaptive penalties.
+        """
+        cost, isFeasible = evaluateSchedule(self.evsp, schedule, *self.penalties(), evaluated)
+        if self.adaptivePenalty:
+            cost = self.penalize(cost, schedule, isFeasible)[0]
+        return cost, isFeasible
+
+
+    def updatePenalties(self, eneRatio, capRatio):
+        """
+        Adjust penalty multipliers after each segment toward the target feasible ratio.
+        A multiplier is increased if the ratio of neighbours feasible for its constraint is below the target, else decreased.
+        Multipliers are kept within 1e-3 to 1e3 times the initial penalties.
+        """
+        for name, ratio, initial in [('eneMultiplier', eneRatio, self.enePenalty), ('capMultiplier', capRatio, self.capPenalty)]:
+            multiplier = getattr(self, name) * (self.penaltyStep if ratio < self.targetFeasibleRatio else 1 / self.penaltyStep)
+            setattr(self, name, min(max(multiplier, initial * 1e-3), initial * 1e3))
+        self.historyPenalty.append((self.eneMultiplier, self.capMultiplier))
+
+
+    def repairChargingTime(self, newCost, newSchedule:Schedule, isFeasible):
+        """
+        Reassign charging time of a capacity-infeasible neighbour optimally with trip chains fixed.
+        Return (newCost, newSchedule, isFeasible) of the repaired neighbour, or the original one if it cannot be repaired.
+        """
+        repaired = assignChargingTime(self.evsp, newSchedule, self.repairTimeLimit)
+        if repaired is None:
+            return newCost, newSchedule, isFeasible
+        repairedCost, repairedFeasible = self.evaluate(repaired, self.evaluated)
+        if repairedCost < newCost:
+            self.repairNum += repairedFeasible
+            return repairedCost, repaired, repairedFeasible
+        return newCost, newSchedule, isFeasible
+
+
+    def recordSchedule(self, schedule:Schedule):
+        """
+        Record history duties for post-optimization.
+        Duties should be energy-feasible, duplicate duties are recorded once.
+        """
+        for duty in schedule.schedule:
+            key = duty.cacheKey()
+            if (key not in self.historyDuty) and duty.checkEnergyFeasibility():
+                self.historyDuty[key] = deepcopy(duty)
+
+
+    def postOptimize(self):
+        """
+        Solve a set-partitioning model over history duties,
+        replace the best schedule if a better feasible one is found.
+        """
+        newSchedule = postOptimize(self.evsp, list(self.historyDuty.values()), self.postTimeLimit)
+        if newSchedule is None:
+            if self.printLog is True:
+                print("--- Post-Optimization: no solution within %d sec"%(self.postTimeLimit))
+            return
+        self.postCost = newSchedule.calCost()
+        if self.printLog is True:
+            print("--- Post-Optimization: %d duties, cost %.2f -> %.2f yuan"%(len(self.historyDuty), self.bestCost, self.postCost))
+        if (self.postCost < self.bestCost) and newSchedule.checkEnergyFeasibility() and newSchedule.checkCapacityFeasibility():
+            self.bestSchedule, self.bestCost = newSchedule, self.postCost
 
 
     def plotWeights(self):
         """
         Display history weights of operators.
         """
-        lineStyle = {1:'k-', 2:'k--', 3:'k-.', 4:'k:'}
+        plt = pyplot()
+        lineStyle = ['k-', 'k--', 'k-.', 'k:']
         fig, ax = plt.subplots(2,1, figsize=(14,8))
         for k,v in self.weights.historyWeightR.items():
-            ax[0].plot(v, lineStyle[k], label=self.weights.removeOperators[k].__name__)
+            ax[0].plot(v, lineStyle[(k-1) % 4], label=self.weights.removeOperators[k].__name__)
         ax[0].legend(fontsize=15, loc=1)
         for k,v in self.weights.historyWeightI.items():
-            ax[1].plot(v, lineStyle[k], label=self.weights.insertOperators[k].__name__)
+            ax[1].plot(v, lineStyle[(k-1) % 4], label=self.weights.insertOperators[k].__name__)
         ax[1].legend(fontsize=15, loc=1)
 
         for ax_ in ax:
@@ -235,6 +473,7 @@ class ALNS():
         """
         Display history cost change.
         """
+        plt = pyplot()
         fig, ax = plt.subplots(1,1,figsize=(14,6))
         ax.plot(self.historyCurrentCost, 'k--', label="Current Cost / yuan")
         ax.plot(self.historyBestCost, 'k-', label="Best Cost / yuan")
@@ -1,7 +1,9 @@
 from EVSPModel import Duty, Schedule, EVSP
 from EVSPModel.Calculations import calCharge
+from EVSPModel.EvaluatorClass import getEvaluator
 
 import random
+import numpy as np
 
 
 """
@@ -76,8 +78,9 @@ def findPosInDuty(evsp:EVSP, duty:Duty, trip:int):
     Consider time feasibility.
     """
     pos = -1
-    for index, _trip in enumerate(duty.S[:-1]):
-        trip_ = duty.S[index+1]  # trip/node before & after
+    S = duty.S[:]
+    for index, _trip in enumerate(S[:-1]):
+        trip_ = S[index+1]  # trip/node before & after
         
         if (_trip,trip) not in evsp.A:  # no pos to insert
             break
@@ -99,38 +102,46 @@ def findPosInDuty(evsp:EVSP, duty:Duty, trip:int):
     return pos
 
 
+def chargingWindow(evsp:EVSP, trip1:int, trip2):
+    """
+    Return (a, b), the index range of possible charging time divisions between trip1 & trip2 in evsp.slotIndex.
+    a > b if no division is available.
+    """
+    earliest = evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)]
+    if trip2 == 'd':
+        return evsp.slotIndex.window(earliest)
+    else:
+        return evsp.slotIndex.window(earliest, evsp.s_i[trip2]-evsp.U*evsp.delta-evsp.t_ij[("f%d"%trip1,trip2)])
+
+
 def greedyChargingTime(evsp:EVSP, schedule:Schedule, trip1:int, trip2:int):
     """
     Find an available charging time division between trip1 & trip2.
+    The cheapest division with free capacity is chosen (the earliest one if prices are equal),
+    a random one is chosen if no division has free capacity.
     Return None if cannot insert charging node.
     """
     r = None
     if ("f%d"%trip1,trip2) not in evsp.A:
         return r
     else:
-        possibleR = []
-        if trip2 == 'd':
-            possibleR = [r for r in evsp.R if (evsp.s_r[r]>=evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)])]
+        a, b = chargingWindow(evsp, trip1, trip2)
+
+        if evsp.stationCap < 0:  # capacity not considered
+            isFree = None
         else:
-            possibleR = [r for r in evsp.R if ((evsp.s_r[r]>=evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)]) and (evsp.s_r[r]+evsp.U*evsp.delta+evsp.t_ij[("f%d"%trip1,trip2)]<=evsp.s_i[trip2]))]
-    
-        # assignFlag = 0  # flag param, =1 if assignment finished
-        # minCost = float("inf")
-        availableR = {}
-        for r_ in possibleR:
-            num = calVehNumList(evsp, schedule, r_)
-            if (max(num) < evsp.stationCap):
-                availableR[r_] = evsp.c_e[r_]
-        if len(availableR) != 0:
-            r = min(availableR, key=availableR.get)
+            starts = {}  # number of charging events starting at each time division
+            for r_ in schedule.R.values():
+                starts[r_] = starts.get(r_, 0) + 1
+            def isFree(index):
+                num = calVehNumList(evsp, starts, evsp.slotIndex.R[index])
+                return max(num) < evsp.stationCap
+
+        index = evsp.slotIndex.cheapest(a, b, isFree)
+        if index is not None:
+            r = evsp.slotIndex.R[index]
         else:
-            r = random.choice(possibleR)  # choose one randomly
-        #     if (max(num) < evsp.capacity) and (evsp.c_e[r_] < minCost):  # considering capacity
-        #         minCost = evsp.c_e[r_]
-        #         r = r_
-        #         assignFlag = 1
-        # if assignFlag == 0:  # no available time division
-        #     r = random.choice(possibleR)  # choose one randomly
+            r = random.choice(evsp.slotIndex.R[a:b+1])  # choose one randomly
     return r
 
 
@@ -144,13 +155,8 @@ def randomChargingTime(evsp:EVSP, trip1, trip2):
     if ("f%d"%trip1,trip2) not in evsp.A:
         return r
     else:
-        possibleR = []
-        if trip2 == 'd':
-            possibleR = [r for r in evsp.R if (evsp.s_r[r]>=evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)])]
-        elif ("f%d"%trip1, trip2) in evsp.A:
-            possibleR = [r for r in evsp.R if ((evsp.s_r[r]>=evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)]) and (evsp.s_r[r]+evsp.U*evsp.delta+evsp.t_ij[("f%d"%trip1,trip2)]<=evsp.s_i[trip2]))]
-        
-        r = random.choice(possibleR)  # choose the nearest
+        a, b = chargingWindow(evsp, trip1, trip2)
+        r = random.choice(evsp.slotIndex.R[a:b+1])  # choose one randomly
         return r
 
 
@@ -164,13 +170,8 @@ def nearestChargingTime(evsp:EVSP, trip1, trip2):
     if ("f%d"%trip1,trip2) not in evsp.A:
         return r
     else:
-        possibleR = []
-        if trip2 == 'd':
-            possibleR = [r for r in evsp.R if (evsp.s_r[r]>=evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)])]
-        elif ("f%d"%trip1, trip2) in evsp.A:
-            possibleR = [r for r in evsp.R if ((evsp.s_r[r]>=evsp.s_i[trip1]+evsp.t_i[trip1]+evsp.t_ij[(trip1,"f%d"%trip1)]) and (evsp.s_r[r]+evsp.U*evsp.delta+evsp.t_ij[("f%d"%trip1,trip2)]<=evsp.s_i[trip2]))]
-      
-        r = possibleR[0]  # choose the nearest
+        a, b = chargingWindow(evsp, trip1, trip2)
+        r = evsp.slotIndex.R[a]  # choose the nearest
         return r
 
 
@@ -181,16 +182,57 @@ def findBestVehType(evsp:EVSP, duty:Duty):
     if len(evsp.K) == 1:
         return evsp.K[0]
     else:
-        cost = {}
-        for k in evsp.K:
-            duty_ = Duty(evsp, k, duty.S, duty.R)
-            cost[k] = duty_.calCost() if duty_.checkEnergyFeasibility() else float("inf")
-        return min(cost, key=cost.get)
+        key = duty.cacheKey(k=0)  # type 0 stands for the best type of the trip chain
+        k = evsp.dutyCache.get(key)
+        if k is None:
+            cost, feasibility = getEvaluator(evsp).evaluateVehTypes(duty.S, duty.R)  # all types in one pass
+            cost = np.where(feasibility, cost, float("inf"))
+            k = evsp.K[int(np.argmin(cost))]
+            evsp.dutyCache.put(key, k)
+        return k
+
+
+def evaluateSchedule(evsp:EVSP, schedule:Schedule, enePenalty, capPenalty, evaluated=None):
+    """
+    Calculate the cost of a schedule, adding a penalty if capacity or energy constraint is violated.
+    evaluated: LRUCache of evaluated schedules {fingerprint: (cost, eneViolation, capViolation)},
+               a schedule evaluated before is resolved from it without re-evaluation
+    Return (cost, isFeasible).
+    """
+    newCost, eneViolation, capViolation = evaluateViolation(evsp, schedule, evaluated)
+    # add penalty
+    if capViolation > 0:
+        newCost += capPenalty
+    if eneViolation > 0:
+        newCost += enePenalty
+    return newCost, (eneViolation == 0) and (capViolation == 0)
+
+
+def evaluateViolation(evsp:EVSP, schedule:Schedule, evaluated=None):
+    """
+    Calculate the cost and the magnitudes of constraint violations of a schedule.
+    Energy violation is computed with the cost of each duty and cached in the duty cache.
+    evaluated: LRUCache of evaluated schedules, see evaluateSchedule()
+    Return (cost, eneViolation, capViolation), energy violation / kWh (see Schedule.calEnergyViolation)
+    and capacity violation / vehicle (see Schedule.calCapacityViolation).
+    """
+    if evaluated is not None:
+        fingerprint = schedule.fingerprint()
+        cached = evaluated.get(fingerprint)
+        if cached is not None:
+            return cached
+
+    result = (schedule.calCost(), schedule.calEnergyViolation(), schedule.calCapacityViolation())
+
+    if evaluated is not None:
+        evaluated.put(fingerprint, result)
+    return result
 
 
-def calVehNumList(evsp:EVSP, schedule:Schedule, r:str):
+def calVehNumList(evsp:EVSP, starts:dict, r:str):
     """
     Calculate the number of vehicle still in charging station of division r.
+    starts: number of charging events starting at each time division, {r: num}
     """
     numList = []
     for u in range(evsp.U):  # 0, 1, 2...
@@ -199,7 +241,7 @@ def calVehNumList(evsp:EVSP, schedule:Schedule, r:str):
         for u in range(evsp.U):
             index_before = index-u  # index of r when vehicle still charging
             if index_before > 0:  # considering r1, r2...
-                num_before += sum(map(('r%d'%(index_before)).__eq__, schedule.R.values()))
+                num_before += starts.get('r%d'%(index_before), 0)
         numList.append(num_before)
     return numList
 
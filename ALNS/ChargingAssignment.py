@@ -0,0 +1,111 @@
+from EVSPModel import Schedule, EVSP
+from EVSPModel.Calculations import calCharge
+from .Calculations import chargingWindow
+
+import numpy as np
+from copy import deepcopy
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+def chargingEvents(evsp:EVSP, schedule:Schedule):
+    """
+    Collect charging events of a schedule.
+    Charging volume of an event depends on the battery level when arriving at the station,
+    but not on the time division, so it is fixed when trip chains are fixed.
+    Return list of (duty index, charging node, charging volume, a, b),
+    where [a, b] is the index range of possible time divisions in evsp.slotIndex.
+    """
+    events = []
+    for index, duty in enumerate(schedule.schedule):
+        k = duty.K
+        y = evsp.E_k[k]  # battery level at the beginning of a node
+        for i, s in enumerate(duty.S[:-1]):
+            if s in evsp.F:
+                chargeVolume = calCharge(evsp, k, y)
+                a, b = chargingWindow(evsp, int(s[1:]), duty.S[i+1])
+                events.append((index, s, chargeVolume, a, b))
+                y = y + chargeVolume - evsp.e_kij[k][(s,duty.S[i+1])]
+            else:
+                y = y - evsp.e_ki[k][s] - evsp.e_kij[k][(s,duty.S[i+1])]
+    return events
+
+
+def assignChargingTime(evsp:EVSP, schedule:Schedule, timeLimit=1, fixed=None):
+    """
+    Keep trip chains fixed and reassign time divisions of all the charging events optimally.
+    Minimize charging cost subject to station capacity, a charging event occupies U time divisions.
+    Without capacity constraints, each event takes its cheapest division;
+    otherwise the assignment is solved by the HiGHS MILP solver in SciPy (scipy.optimize.milp).
+    timeLimit: time limit of the MILP solver / sec
+    fixed: charging nodes whose time divisions are kept, e.g. charging events already started
+    Return a new schedule, None if the capacity constraints cannot be satisfied.
+    """
+    events = chargingEvents(evsp, schedule)
+    if fixed:
+        fixed = set(fixed)
+        for e, (index, f, chargeVolume, a, b) in enumerate(events):
+            if f in fixed:
+                r = evsp.slotIndex.R.index(schedule.schedule[index].R[f])
+                events[e] = (index, f, chargeVolume, r, r)
+    newSchedule = deepcopy(schedule)
+    if not events:
+        return newSchedule
+    if any(a > b for _index, _f, _v, a, b in events):  # no possible time division
+        return None
+
+    slotIndex = evsp.slotIndex
+    if evsp.stationCap < 0:  # capacity not considered
+        choice = [slotIndex.argmin(a, b) for _index, _f, _v, a, b in events]
+    else:
+        try:
+            from scipy.optimize import milp, LinearConstraint, Bounds
+            from scipy.sparse import csr_matrix
+        except ImportError:
+            raise ImportError("Charging time assignment requires SciPy (>=1.9) for the MILP solver.")
+
+        nR = len(slotIndex.R) + evsp.U  # time divisions possibly occupied
+        cost, slots = [], []  # cost & time division of each assignment variable
+        eventRows, eventCols, capRows, capCols = [], [], [], []
+        for e, (_index, _f, chargeVolume, a, b) in enumerate(events):
+            for r in range(a, b+1):
+                col = len(cost)
+                cost.append(chargeVolume * slotIndex.price[r])
+                slots.append(r)
+                eventRows.append(e)
+                eventCols.append(col)
+                for u in range(evsp.U):  # vehicle is being charged from r to r+U-1
+                    capRows.append(r + u)
+                    capCols.append(col)
+        m = len(cost)
+
+        # overflow of capacity, heavily penalized so that it is zero whenever possible
+        penalty = 1e3 * (max(cost) + 1)
+        cost = np.concatenate([cost, np.full(nR, penalty)])
+        capRows.extend(range(nR))
+        capCols.extend(range(m, m + nR))
+        capVals = np.concatenate([np.ones(len(capRows) - nR), -np.ones(nR)])
+
+        A_event = csr_matrix((np.ones(len(eventRows)), (eventRows, eventCols)), shape=(len(events), m + nR))
+        A_cap = csr_matrix((capVals, (capRows, capCols)), shape=(nR, m + nR))
+        result = milp(
+            cost,
+            constraints=[LinearConstraint(A_event, 1, 1), LinearConstraint(A_cap, -np.inf, evsp.stationCap)],
+            integrality=np.concatenate([np.ones(m), np.zeros(nR)]),
+            bounds=Bounds(0, np.concatenate([np.ones(m), np.full(nR, np.inf)])),
+            options={'time_limit': timeLimit},
+        )
+        if (result.x is None) or (result.x[m:].sum() > 0.5):  # capacity cannot be satisfied
+            return None
+        x = result.x[:m]
+        choice = [None] * len(events)
+        for col in np.flatnonzero(x > 0.5):
+            choice[eventRows[col]] = slots[col]
+
+    for (index, f, _v, _a, _b), r in zip(events, choice):
+        newSchedule.schedule[index].R[f] = slotIndex.R[r]
+    newSchedule.updateR()
+    return newSchedule
@@ -0,0 +1,148 @@
+from EVSPModel import Duty, Schedule, EVSP
+from .ALNS import ALNS
+from .ChargingAssignment import assignChargingTime
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+def solveSubProblem(evsp:EVSP, trips:list, params:dict, seed, initialDuties=None, T0=None, vehicles=None):
+    """
+    Create the model of a sub problem and solve it by ALNS, run in a worker process.
+    The time limit of ALNS in params, if any, includes creating the model.
+    trips: trip nodes of the original problem, trip i of the sub problem is trips[i-1]
+    params: params of ALNS
+    initialDuties: warm start from duties (type, trip chain, charging time) in nodes of the original problem, None means no warm start
+    T0: initial temperature of a warm start
+    vehicles: last trips of vehicles in operation in nodes of the original problem, arcs between them are removed
+              so that a duty of the sub problem continues at most one vehicle, None means no vehicle in operation
+    Return (duties, bestCost, runTime), duties are (type, trip chain, charging time) in nodes of the original problem.
+    """
+    random.seed(seed)
+    tic = timer()
+    evsp.createModel()
+    if params.get('timeLimit') is not None:
+        params = dict(params, timeLimit=max(params['timeLimit'] - (timer() - tic), 0))
+    if vehicles:
+        position = {i: index for index, i in enumerate(trips, start=1)}
+        anchors = [position[i] for i in vehicles]
+        evsp.A.difference_update([(a, b) for a in anchors for b in anchors] + [('f%d' % a, b) for a in anchors for b in anchors])
+    alns = ALNS(evsp, printLog=False, **params)
+    if initialDuties is None:
+        alns.solve()
+    else:
+        subNode = {'o': 'o', 'd': 'd'}
+        for index, i in enumerate(trips, start=1):
+            subNode[i] = index
+            subNode['f%d' % i] = 'f%d' % index
+        initialSchedule = Schedule(evsp, [], {})
+        for K, S, R in initialDuties:
+            initialSchedule.addDuty(Duty(evsp, K, [subNode[s] for s in S if s in subNode], {subNode[f]:r for f,r in R.items() if f in subNode}))
+        alns.solve(initialSchedule=initialSchedule, T0=T0)
+
+    def mapNode(s):
+        if s in evsp.T:
+            return trips[s-1]
+        elif s in evsp.F:
+            return 'f%d' % trips[int(s[1:])-1]
+        else:  # depot
+            return s
+
+    duties = [(duty.K, [mapNode(s) for s in duty.S], {mapNode(f):r for f,r in duty.R.items()}) for duty in alns.bestSchedule.schedule]
+    return duties, alns.bestCost, alns.runTime
+
+
+class DecomposedALNS():
+
+    """
+    When line change is not allowed, an EVSP splits into independent sub problems of routes,
+    which only share the capacity of the charging station.
+    DecomposedALNS solves the sub problem of each route by ALNS in parallel worker processes,
+    merges the schedules, and coordinates the station capacity by reassigning charging time.
+    """
+
+    def __init__(
+        self,
+        evsp:EVSP,
+        processes=None,
+        repairTimeLimit=10,
+        printLog=True,
+        **params,
+    ):
+        """
+        evsp: EVSP model with lineChange=False, createModel() should be called
+        processes: number of worker processes, default is min(number of routes, number of CPUs), 1 means solving in the main process
+        repairTimeLimit: time limit of charging time reassignment for capacity coordination / sec
+        params: params of ALNS for sub problems, e.g. iterMax, T0
+        """
+        if evsp.lineChange:
+            raise ValueError("Route decomposition requires an EVSP with lineChange=False.")
+        self.evsp = evsp
+        self.processes = processes
+        self.repairTimeLimit = repairTimeLimit
+        self.printLog = printLog
+        self.params = params
+
+        self.routes = {}  # route: trip nodes
+        routeList = evsp.timetable.Route.tolist()
+        for i in sorted(evsp.T):
+            self.routes.setdefault(routeList[i-1], []).append(i)
+
+        self.bestSchedule = None
+        self.bestCost = 0
+        self.isFeasible = False
+        self.subCost = {}  # route: best cost of the sub problem
+        self.subRunTime = {}  # route: solve time of the sub problem
+        self.runTime = 0
+
+    def solve(self):
+        """
+        Solve sub problems in parallel, then merge and coordinate.
+        """
+        if self.printLog is True:
+            print("--- Decomposed ALNS Starts: %d Routes" % len(self.routes))
+        tic = timer()
+
+        routes = list(self.routes.keys())
+        args = [(self.evsp.subProblem(self.routes[route]), self.routes[route], self.params, random.randrange(2**31)) for route in routes]
+        processes = self.processes if self.processes is not None else min(len(routes), os.cpu_count() or 1)
+        if processes == 1:
+            results = [solveSubProblem(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(solveSubProblem, *zip(*args)))
+
+        # merge
+        schedule = Schedule(self.evsp, [], {})
+        for route, (duties, cost, runTime) in zip(routes, results):
+            self.subCost[route] = cost
+            self.subRunTime[route] = runTime
+            for K, S, R in duties:
+                schedule.addDuty(Duty(self.evsp, K, S, R))
+
+        # capacity coordination
+        capFeasible = schedule.checkCapacityFeasibility()
+        if not capFeasible:
+            repaired = assignChargingTime(self.evsp, schedule, self.repairTimeLimit)
+            if repaired is not None:
+                schedule, capFeasible = repaired, True
+
+        self.bestSchedule = schedule
+        self.bestCost = schedule.calCost()
+        self.isFeasible = capFeasible and schedule.checkEnergyFeasibility()
+        self.runTime = timer() - tic
+
+        if self.printLog is True:
+            print("--- Solve Time: %.2f sec" % (self.runTime))
+            print("--- Best Cost: %.2f yuan" % (self.bestCost))
+            print("--- Number of Buses: %d" % (len(schedule.schedule)))
+            print("--- Number of Charging Trips: %d" % (len(schedule.R)))
+            print("--- Feasibility: %s" % (self.isFeasible))
+            print("--- Decomposed ALNS Finished")
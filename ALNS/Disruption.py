@@ -0,0 +1,175 @@
+from EVSPModel import Duty, Schedule, EVSP
+from .ChargingAssignment import assignChargingTime
+from .Decomposition import solveSubProblem
+from .RollingHorizon import stitchFragments
+
+import random
+from timeit import default_timer as timer
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+class DisruptionRepair():
+
+    """
+    Repair a schedule in operation after disruptions (delayed trips, cancelled trips, broken-down buses).
+    Everything executed before the current time is frozen. Only the duties affected by the disruptions
+    and their time-neighbours (duties with a trip starting close to a disrupted trip) are destroyed:
+    their remaining trips are rescheduled by a short ALNS run on the sub problem of these trips,
+    warm started from the current plan and stopped at a time budget, and linked back to the
+    frozen parts of the destroyed duties, whose vehicle types and states are kept.
+    """
+
+    def __init__(
+        self,
+        evsp:EVSP,
+        timeBudget=5,
+        neighborhood=30,
+        T0=10,
+        printLog=True,
+        **params,
+    ):
+        """
+        evsp: EVSP model, createModel() should be called, delayed trips are retimed in the model (see repair)
+        timeBudget: time limit of a repair / sec
+        neighborhood: duties with a remaining trip starting within neighborhood minutes of a disrupted trip are destroyed too
+        T0: initial temperature of the warm-started ALNS
+        params: params of ALNS, e.g. iterMax, nMax
+        """
+        self.evsp = evsp
+        self.timeBudget = timeBudget
+        self.neighborhood = neighborhood
+        self.T0 = T0
+        self.printLog = printLog
+        self.params = params
+
+        self.bestSchedule = None
+        self.bestCost = 0
+        self.isFeasible = False
+        self.destroyedDuties = []  # indices of destroyed duties in the schedule under repair
+        self.rescheduledTrips = []  # trips rescheduled by ALNS
+        self.runTime = 0
+
+    def repair(self, schedule:Schedule, currentTime, delay=None, cancel=None, breakdown=None):
+        """
+        Repair a schedule after disruptions.
+        Side effect: delayed trips are retimed in the model by EVSP.updateTrip(), so the model (and its variants)
+        stays in line with operation. Since delays are given as new start times, repeating a repair with the same
+        delays does not retime trips again. The timetable passed to EVSP() is not changed.
+        schedule: current schedule
+        currentTime: current time / min, trips and charging events started before it are executed
+        delay: delayed trips, dict {trip: new start time / min}
+        cancel: cancelled trips, list
+        breakdown: broken-down buses, list of duty indices in the schedule, their remaining trips are reassigned
+        Return the repaired schedule, cancelled trips are not covered.
+        """
+        evsp = self.evsp
+        tic = timer()
+        delay = delay if delay is not None else {}
+        cancel = set(cancel) if cancel is not None else set()
+        breakdown = set(breakdown) if breakdown is not None else set()
+        for i, startTime in delay.items():
+            if evsp.s_i[i] != startTime:
+                evsp.updateTrip(i, StartTimeMin=startTime)
+
+        # split duties into executed & remaining parts
+        executed, remaining = [], []
+        for duty in schedule.schedule:
+            prefix, future = self.split(duty, currentTime)
+            executed.append(prefix)
+            remaining.append([i for i in future if i not in cancel])
+
+        # destroy affected duties & time-neighbours
+        disrupted = set(delay) | cancel
+        affected = set(breakdown)
+        times = []  # start time of disrupted trips
+        for index, duty in enumerate(schedule.schedule):
+            trips = disrupted.intersection(duty.S)
+            if trips:
+                affected.add(index)
+                times.extend(evsp.s_i[i] for i in trips)
+            if (index in breakdown) and remaining[index]:
+                times.append(evsp.s_i[remaining[index][0]])
+        destroyed = set(affected)
+        for index in range(len(schedule.schedule)):
+            if any(abs(evsp.s_i[i] - t) <= self.neighborhood for i in remaining[index] for t in times):
+                destroyed.add(index)
+        self.destroyedDuties = sorted(destroyed)
+        self.rescheduledTrips = sorted(i for index in destroyed for i in remaining[index])
+
+        # reschedule remaining trips of destroyed duties
+        newSchedule = Schedule(evsp, [], {})
+        vehicles = []  # frozen parts which can take rescheduled trips
+        for index, duty in enumerate(schedule.schedule):
+            if index not in destroyed:
+                newSchedule.addDuty(duty)
+            elif len(executed[index].S) > 2:  # vehicle in operation
+                newSchedule.addDuty(executed[index])
+                if index not in breakdown:
+                    vehicles.append(len(newSchedule.schedule) - 1)
+        if self.rescheduledTrips:
+            initialDuties = []  # current plan of rescheduled trips
+            for index in self.destroyedDuties:
+                if remaining[index]:
+                    duty = schedule.schedule[index]
+                    S = ['o'] + [s for s in duty.S if (s in remaining[index]) or ((s in evsp.F) and int(s[1:]) in remaining[index])] + ['d']
+                    initialDuties.append((duty.K, S, {f:r for f,r in duty.R.items() if f in S}))
+            params = dict(self.params)
+            params['timeLimit'] = max(self.timeBudget - (timer() - tic), 0)
+            duties, _cost, _runTime = solveSubProblem(
+                evsp.subProblem(self.rescheduledTrips), self.rescheduledTrips, params, random.randrange(2**31), initialDuties, self.T0
+            )
+            fragments = [Duty(evsp, K, S, R) for K, S, R in duties]
+            newSchedule = stitchFragments(evsp, newSchedule, fragments, vehicles, keepType=True)
+        newSchedule.updateR()
+
+        # charging time of rescheduled charging events considering capacity of the whole schedule,
+        # charging time of other future charging events is released if capacity cannot be satisfied
+        capFeasible = newSchedule.checkCapacityFeasibility()
+        if not capFeasible:
+            rescheduled = set(self.rescheduledTrips)
+            started = [f for f,r in newSchedule.R.items() if evsp.s_r[r] < currentTime]
+            for fixed in [started + [f for f in newSchedule.R if int(f[1:]) not in rescheduled], started]:
+                timeLeft = max(self.timeBudget - (timer() - tic), 0)
+                if timeLeft == 0:
+                    break
+                repaired = assignChargingTime(evsp, newSchedule, timeLeft, fixed)
+                if repaired is not None:
+                    newSchedule, capFeasible = repaired, True
+                    break
+
+        self.bestSchedule = newSchedule
+        self.bestCost = newSchedule.calCost()
+        self.isFeasible = capFeasible and newSchedule.checkEnergyFeasibility()
+        self.runTime = timer() - tic
+
+        if self.printLog is True:
+            print("--- Repair Time: %.2f sec" % (self.runTime))
+            print("--- Destroyed Duties: %d, Rescheduled Trips: %d" % (len(self.destroyedDuties), len(self.rescheduledTrips)))
+            print("--- Cost: %.2f yuan" % (self.bestCost))
+            print("--- Number of Buses: %d" % (len(newSchedule.schedule)))
+            print("--- Feasibility: %s" % (self.isFeasible))
+        return newSchedule
+
+    def split(self, duty:Duty, currentTime):
+        """
+        Split a duty at the current time.
+        Return (executed part, remaining trips), the executed part is a duty of trips and charging events
+        started before the current time.
+        """
+        evsp = self.evsp
+        S, future = ['o'], []
+        for s in duty.S[1:-1]:
+            if s in evsp.T:
+                started = evsp.s_i[s] < currentTime
+            else:
+                started = evsp.s_r[duty.R[s]] < currentTime
+            if started and not future:
+                S.append(s)
+            elif s in evsp.T:
+                future.append(s)
+        S.append('d')
+        return Duty(evsp, duty.K, S, {f:r for f,r in duty.R.items() if f in S}), future
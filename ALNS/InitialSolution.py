@@ -1,5 +1,14 @@
 from EVSPModel import Duty, Schedule, EVSP
 from EVSPModel.Calculations import calCharge
+from EVSPModel.EvaluatorClass import getEvaluator
+from EVSPModel.Matching import hopcroftKarp
+from .Calculations import chargingWindow, greedyChargingTime, findBestVehType
+from .InsertOperators import greedyInsert
+from .ChargingAssignment import assignChargingTime
+
+import heapq
+import numpy as np
+from bisect import bisect_left
 
 
 """
@@ -10,31 +19,25 @@ from EVSPModel.Calculations import calCharge
 def initialize(evsp:EVSP):
     """
     Provide initialize feasible solution using greedy heuristic.
+    Each duty starts from the earliest unassigned trip and links the earliest compatible one,
+    inserting a charging node when the next trip would violate the energy constraint.
     """
     k0 = max(evsp.E_k, key=evsp.E_k.get)  # initial veh_type has the largest capacity
-    T = [i for i in evsp.T]  # temp trip set
+    T = UnassignedTrips(evsp)  # temp trip set
     newSchedule = Schedule(evsp, [], {})  # dict, veh_no:[type:int, schedule:list, time division:dict]
-    S = []  # trip chain list of single duty
     R = {}  # time division dict for charging nodes
+    occupancy = [0] * (len(evsp.R) + evsp.U + 1)  # number of vehicles being charged in each time division
 
     while T:
         # initialization
-        T = list(filter(lambda x: x not in S, T)) # update T
-        if not T:
-            break
         i = 'o'
         Y = [evsp.E_k[k0]]  # initial battery level
         S = [i]
         while 1:
-            j = search_trip(evsp, i, T, R)  # search the nearest trip
+            j = search_trip(evsp, i, T)  # search the nearest trip
             if j == None:  # end of a schedule
                 if i in evsp.F:
                     S.remove(i)
-                # if i not in evsp.F:
-                #     S.append('f%d'%i)  # link with charging node
-                #     # Y.append(Y[-1] - evsp.e_ki[k0][i] - evsp.e_kij[k0][(i,'f%d'%i)])  # update energy level of fi
-                #     i = 'f%d'%i
-                #     R = choose_r(evsp, i, R)
                 S.append('d')
                 if evsp.k_num == 1:
                     kb = k0
@@ -56,10 +59,11 @@ def initialize(evsp:EVSP):
                     S.append('f%d'%i)
                     Y.append(Y[-1] - evsp.e_ki[k0][i] - evsp.e_kij[k0][(i,j)])  # update energy level of fi
                     i = 'f%d'%i
-                    R = choose_r(evsp,i,R)
+                    R = choose_r(evsp, i, R, occupancy)
                     continue
             else:
                 S.append(j)
+                T.assign(j)
                 if i in evsp.F:
                     Y.append(Y[-1] + calCharge(evsp, k0, Y[-1]) - evsp.e_kij[k0][(i,j)])  # if i is charging trip
                 else:
@@ -68,7 +72,7 @@ def initialize(evsp:EVSP):
                 continue
 
     # update solution
-    newSchedule.R = R
+    newSchedule.updateR()  # charging nodes removed during construction are not kept
     
     return newSchedule
 
@@ -78,29 +82,18 @@ def initialize_nightCharge(evsp:EVSP):
     Provide initialize feasible solution using greedy heuristic for <night time charge only> mode.
     """
     k0 = max(evsp.E_k, key=evsp.E_k.get)  # initial veh_type
-    T = [i for i in evsp.T]  # temp trip set
+    T = UnassignedTrips(evsp)  # temp trip set
     newSchedule = Schedule(evsp, [], {})  # dict, veh_no:[type:int, schedule:list, time division:dict]
-    S = []  # schedule list
     R = {}  # time division dict for charging nodes
 
     while T:
         # initialization
-        T = list(filter(lambda x: x not in S, T)) # update T
-        if not T:
-            break
         i = 'o'
         Y = [evsp.E_k[k0]]  # initial battery level
         S = [i]
         while 1:
-            j = search_trip(evsp, i, T, R)  # search the nearest trip
+            j = search_trip(evsp, i, T)  # search the nearest trip
             if j == None or energy_violate(evsp, k0, Y, i, j):  # end of a schedule
-                # if i in evsp.F:
-                #     S.remove(i)
-                # if i not in evsp.F:
-                #     S.append('f%d'%i)  # link with charging node
-                #     # Y.append(Y[-1] - evsp.e_ki[k0][i] - evsp.e_kij[k0][(i,'f%d'%i)])  # update energy level of fi
-                #     i = 'f%d'%i
-                #     R = choose_r(evsp, i, R)
                 S.append('d')
                 if evsp.k_num == 1:
                     kb = k0
@@ -110,6 +103,7 @@ def initialize_nightCharge(evsp:EVSP):
                 break
             else:
                 S.append(j)
+                T.assign(j)
                 if i in evsp.F:
                     Y.append(Y[-1] + calCharge(evsp, k0, Y[-1]) - evsp.e_kij[k0][(i,j)])  # if i is charging trip
                 else:
@@ -118,57 +112,312 @@ def initialize_nightCharge(evsp:EVSP):
                 continue
 
     # update solution
-    newSchedule.R = R
+    newSchedule.updateR()  # charging nodes removed during construction are not kept
     
     return newSchedule
 
 
-def search_trip(evsp, i, T, R):
+def initialize_minFleet(evsp:EVSP):
+    """
+    Provide initial solution from minimum path covers of the trip-compatibility graph (see EVSP.minPathCover).
+    In each round, the unassigned trips and the open duties are covered by chains with Hopcroft-Karp,
+    and the chains are followed with the largest vehicle type. When the next trip would violate the energy
+    constraint, a charging node is inserted at the latest possible position of the duty, at the cheapest
+    time division with free capacity. If not possible, the duty charges after its last trip and stays open
+    for the next round, or is closed if it has just charged. The rest trips of the chain are covered again
+    in the next round. Vehicle types are chosen at last.
+    """
+    k0 = max(evsp.E_k, key=evsp.E_k.get)  # initial veh_type has the largest capacity
+    evaluator = getEvaluator(evsp)
+    def feasible(S, R):  # energy feasibility of k0
+        return evaluator.evaluateVehTypes(S, R)[1][evsp.K.index(k0)]
+    occupancy = [0] * (len(evsp.R) + evsp.U)  # number of vehicles being charged in each time division (by index in evsp.slotIndex)
+    if evsp.stationCap < 0:  # capacity not considered
+        isFree = None
+    else:
+        def isFree(index):
+            return max(occupancy[index:index+evsp.U]) < evsp.stationCap
+    def charge(i, j):  # free time division for charging between trip i & j, the cheapest one, or the earliest one after the last trip
+        a, b = chargingWindow(evsp, i, j)
+        if (j != 'd' and ("f%d"%i, j) not in evsp.A) or (a > b):
+            return None
+        if j == 'd':  # available for the next trips as soon as possible
+            index = next((index for index in range(a, b+1) if (isFree is None) or isFree(index)), None)
+        else:
+            index = evsp.slotIndex.cheapest(a, b, isFree)
+        return None if index is None else evsp.slotIndex.R[index]
+    def occupy(r, num):
+        index = int(r[1:]) - 1
+        for u in range(evsp.U):
+            occupancy[index+u] += num
+
+    def linkable(S, R, j):  # whether trip j can follow the last node of duty (S, R) in time
+        i = S[-1]
+        if i in evsp.F:
+            return ((i,j) in evsp.A) and (evsp.s_r[R[i]] + evsp.U * evsp.delta + evsp.t_ij[(i,j)] <= evsp.s_i[j])
+        return (i,j) in evsp.A
+    def extend(S, R, j):  # link trip j to duty (S, R) directly or with charging, return False if not possible
+        if linkable(S, R, j) and feasible(S + [j,'d'], R):
+            S.append(j)
+            return True
+        # charging after the last charging node, the latest position first
+        last = max([pos for pos, s in enumerate(S) if s in evsp.F], default=0)
+        for pos in range(len(S)-1, last, -1):
+            if evsp.nightCharge or ((pos+1 < len(S)) and ((S[-1],j) not in evsp.A)):
+                break
+            i = S[pos]
+            r = charge(i, S[pos+1] if pos+1 < len(S) else j)
+            if (r is not None) and feasible(S[:pos+1] + ["f%d"%i] + S[pos+1:] + [j,'d'], {**R, "f%d"%i: r}):
+                S.insert(pos+1, "f%d"%i)
+                S.append(j)
+                R["f%d"%i] = r
+                occupy(r, 1)
+                return True
+        return False
+
+    succ = {i: set() for i in evsp.T}  # trips which can follow trip i, directly or after charging
+    for a, b in evsp.A:
+        if (type(b) == int) and (a != 'o'):
+            succ[a if type(a) == int else int(a[1:])].add(b)
+
+    T = set(evsp.T)  # trips to cover
+    opened, closed = [], []  # duties, [trip chain, time division dict]
+    while T:
+        # cover open duties & unassigned trips
+        trips = sorted(T, key=lambda i: evsp.s_i[i])
+        position = {i: p for p, i in enumerate(trips)}
+        adj = []
+        for S, R in opened:
+            i = S[-1]
+            adj.append(sorted(position[j] for j in succ[i if i in evsp.T else int(i[1:])] if (j in position) and linkable(S, R, j)))
+        for i in trips:
+            adj.append(sorted(position[j] for j in succ[i] if j in position))
+        matchL, matchR = hopcroftKarp(adj, len(trips))
+        D = len(opened)
+        duties = opened + [[['o', trips[p]], {}] for p in range(len(trips)) if matchR[p] == -1]
+        heads = list(range(D)) + [D+p for p in range(len(trips)) if matchR[p] == -1]
+        opened = []
+
+        # follow chains together in time order, so that capacity is taken in time order
+        chains = []
+        for S, R in duties:
+            chain = []
+            v = matchL[heads[len(chains)]]
+            while v != -1:
+                chain.append(trips[v])
+                v = matchL[D+v]
+            T.difference_update(S)
+            chains.append(chain)
+        queue = [(evsp.s_i[chain[0]], d, 0) for d, chain in enumerate(chains) if chain]  # (start time of the next trip, duty, position in chain)
+        heapq.heapify(queue)
+        isOpen = [False] * len(duties)
+        while queue:
+            _t, d, pos = heapq.heappop(queue)
+            (S, R), j = duties[d], chains[d][pos]
+            if extend(S, R, j):
+                T.discard(j)
+                if pos+1 < len(chains[d]):
+                    heapq.heappush(queue, (evsp.s_i[chains[d][pos+1]], d, pos+1))
+            elif (not evsp.nightCharge) and (S[-1] in evsp.T):  # charging after the last trip
+                r = charge(S[-1], 'd')
+                if (r is not None) and feasible(S + ["f%d"%S[-1], 'd'], {**R, "f%d"%S[-1]: r}):
+                    R["f%d"%S[-1]] = r
+                    S.append("f%d"%S[-1])
+                    occupy(r, 1)
+                    isOpen[d] = True
+        for d, (S, R) in enumerate(duties):
+            if isOpen[d] and T:
+                opened.append([S, R])
+            else:
+                if S[-1] in evsp.F:  # charging at the end is not needed
+                    occupy(R.pop(S.pop()), -1)
+                closed.append([S, R])
+
+    newSchedule = Schedule(evsp, [], {})
+    for S, R in closed:
+        S = S + ['d']
+        if evsp.k_num == 1:
+            kb = k0
+        else:
+            kb = choose_k(evsp, S, R)  # choose an optimal veh type
+        newSchedule.schedule.append(Duty(evsp, kb, S, R))
+    newSchedule.updateR()
+
+    return newSchedule
+
+
+def matchTrips(evsp:EVSP, schedule:Schedule, mapping=None):
+    """
+    Match trips of a schedule to trips of the model.
+    Trips are matched by the ID column of the timetables, trip i of the schedule is row i of the timetable of
+    the schedule's model. If trips of the schedule's model have been renumbered since the schedule was made
+    (see EVSP.removeTrips), the renumbering returned by the edit should be given, else a ValueError is raised.
+    mapping: {trip of the schedule: trip of the model}, None means matching by IDs
+    Return {trip of the schedule: trip of the model}, trips no longer in the model are not included.
+    """
+    if mapping is not None:
+        return {i: j for i, j in mapping.items() if j in evsp.T}
+    if schedule.numbering != schedule.evsp.numbering:
+        raise ValueError("Trips of the schedule's model have been renumbered since the schedule was made, the renumbering returned by removeTrips() should be given as mapping.")
+    ids = evsp.timetable.ID.tolist()
+    if len(set(ids)) < len(ids):
+        raise ValueError("IDs of the timetable should be unique to match trips.")
+    trip = {ID: i for i, ID in enumerate(ids, start=1)}
+    return {i: trip[ID] for i, ID in enumerate(schedule.evsp.timetable.ID.tolist(), start=1) if ID in trip}
+
+
+def initialize_warmStart(evsp:EVSP, schedule:Schedule, chargeProb=0.9, mapping=None, timeLimit=1):
+    """
+    Provide initial solution from an existing schedule, e.g. the schedule of the last run or of yesterday's timetable.
+    Trips are matched by the ID column of the timetables (see matchTrips). Trips no longer in the model are dropped,
+    links no longer time-feasible are broken, and charging time divisions out of their windows are reassigned.
+    Trips not covered are inserted by greedy insertion, and capacity conflicts are resolved by
+    reassigning charging time (see assignChargingTime).
+    chargeProb: probability of charging insertion, 0 means charging nodes are not kept or inserted
+    mapping: renumbering of trips of the schedule, e.g. returned by EVSP.removeTrips(), None means matching by IDs
+    timeLimit: time limit of charging time reassignment / sec, 0 means capacity conflicts are left to the search
+    """
+    trip = matchTrips(evsp, schedule, mapping)
+    newSchedule = Schedule(evsp, [], {})
+    covered = set()  # trips covered by kept duties
+    for duty in schedule.schedule:
+        S = ['o']  # trip chain
+        R = {}  # charging time
+        for s in duty.S[1:-1]:
+            if type(s) == int:  # trip of the schedule
+                s = trip.get(s)
+                if s is None:  # no longer in the model
+                    continue
+            elif int(s[1:]) in trip:  # charging node of the schedule
+                r = duty.R.get(s)
+                s = 'f%d' % trip[int(s[1:])]
+            else:
+                continue
+            if s in evsp.T:
+                if s in covered:  # covered by another duty
+                    continue
+                while ((S[-1], s) not in evsp.A) and (S[-1] in evsp.F):  # no time to charge before s
+                    R.pop(S.pop())
+                if (S[-1], s) in evsp.A:
+                    S.append(s)
+                    covered.add(s)
+            elif (s in evsp.F) and (S[-1] == int(s[1:])) and (chargeProb > 0):
+                S.append(s)
+                R[s] = r
+        while S[-1] in evsp.F:  # no charging at the end
+            R.pop(S.pop())
+        if len(S) == 1:
+            continue
+        S.append('d')
+
+        newDuty = Duty(evsp, duty.K, S, R)
+        if duty.K not in evsp.K:
+            newDuty.K = findBestVehType(evsp, newDuty)
+        newSchedule.addDuty(newDuty)
+
+    # charging time divisions out of windows, reassigned considering the capacity of the whole schedule
+    for duty in newSchedule.schedule:
+        for pos, s in enumerate(duty.S[:-1]):
+            if s in evsp.F:
+                r = duty.R[s]
+                a, b = chargingWindow(evsp, duty.S[pos-1], duty.S[pos+1])
+                if (r not in evsp.s_r) or not (a <= int(r[1:]) - 1 <= b):
+                    newSchedule.delR(s)
+                    duty.R[s] = greedyChargingTime(evsp, newSchedule, duty.S[pos-1], duty.S[pos+1])
+                    if duty.R[s] is not None:
+                        newSchedule.addR(s, duty.R[s])
+        if None in duty.R.values():  # no time to charge
+            duty.S = [s for s in duty.S if (s not in duty.R) or (duty.R[s] is not None)]
+            duty.R = {f:r for f,r in duty.R.items() if r is not None}
+
+    # insert trips not covered
+    tripBank = [i for i in sorted(evsp.T) if i not in covered]
+    if tripBank:
+        _cost, newSchedule, _isFeasible = greedyInsert(evsp, tripBank, newSchedule, 0, 0, chargeProb)
+    newSchedule.updateR()
+
+    # resolve capacity conflicts of kept & inserted charging events at once
+    if (timeLimit > 0) and not newSchedule.checkCapacityFeasibility():
+        repaired = assignChargingTime(evsp, newSchedule, timeLimit)
+        if repaired is not None:
+            newSchedule = repaired
+
+    return newSchedule
+
+
+class UnassignedTrips():
+
+    """
+    Unassigned trips of greedy construction, sorted by start time (ties in the order of evsp.T).
+    Assigned trips are skipped by pointers to the next unassigned position (with path halving),
+    so the earliest unassigned trip starting after a given time is found by bisection.
+    """
+
+    def __init__(self, evsp:EVSP):
+        self.order = sorted(evsp.T, key=lambda i: evsp.s_i[i])  # trips sorted by start time
+        self.starts = [evsp.s_i[i] for i in self.order]  # start time of sorted trips
+        self.position = {i: p for p, i in enumerate(self.order)}
+        self.next = list(range(len(self.order) + 1))  # next[p] leads to the next unassigned position >= p
+        self.num = len(self.order)  # number of unassigned trips
+
+    def __len__(self):
+        return self.num
+
+    def find(self, p):
+        """
+        Return the first unassigned position >= p, len(order) if not exist.
+        """
+        pointer = self.next
+        while pointer[p] != p:
+            pointer[p] = pointer[pointer[p]]
+            p = pointer[p]
+        return p
+
+    def assign(self, i):
+        """
+        Mark trip i assigned.
+        """
+        p = self.position[i]
+        self.next[p] = p + 1
+        self.num -= 1
+
+    def after(self, t):
+        """
+        Iterate unassigned trips starting at or after time t in time order.
+        """
+        p = self.find(bisect_left(self.starts, t))
+        while p < len(self.order):
+            yield self.order[p]
+            p = self.find(p + 1)
+
+
+def search_trip(evsp, i, T):
     """
     i: current node index
-    T: set of remain trips
-    R: dict of charging division assignment
+    T: remain trips, UnassignedTrips
     return: nearest linkable trip
     considering: time compatibility
     """
-    j = None
     if not T:
         return None
-    elif i in evsp.T:
-        for t in T:
-            if ((i, t) in evsp.A):  # cause trips are sorted assendingly
-                j = t
-                break
-    elif i in evsp.F:
-        for t in T:
-            if ((i, t) in evsp.A):
-                j = t
-                break
     elif i == 'o':
-        j = T[0]
-    return j
-    
-    # j = None
-    # if i=='o':  # first trip of a schedule
-    #     return T[0]
-    # elif not T:  # available trips set empty
-    #     return None
-    # elif i in evsp.F:  # charging trip node
-    #     for t in T:
-    #         if ((i, t) in evsp.A) and (evsp.s_i[t] >= evsp.s_r[R[i]] + evsp.U * evsp.delta + evsp.t_ij[(i,t)]):
-    #             j = t
-    #             break
-    # else:  # trip node
-    #     for t in T:
-    #         if ((i, t) in evsp.A) and (evsp.s_i[t] >= evsp.s_i[i] + evsp.t_i[i] + evsp.t_ij[(i,t)]):  # cause trips are sorted assendingly
-    #             j = t
-    #             break
-    # return j
-
-def choose_r(evsp, f, R):
+        return next(T.after(float("-inf")))
+    elif i in evsp.T:
+        earliest = evsp.s_i[i] + evsp.t_i[i]  # trips starting earlier are not linkable
+    else:  # charging node
+        trip = int(i[1:])
+        earliest = evsp.s_i[trip] + evsp.t_i[trip] + evsp.U * evsp.delta
+    for t in T.after(earliest):
+        if ((i, t) in evsp.A):
+            return t
+    return None
+
+
+def choose_r(evsp, f, R, occupancy):
     """
     i: current node index
     R: dict of charging division assignment
+    occupancy: number of vehicles being charged in each time division (by index of r), updated in place
     return: new R with the nearest available time division
     considering: time & capacity
     """
@@ -176,17 +425,11 @@ def choose_r(evsp, f, R):
         R[f] = [r for r in evsp.R if (f,r) in evsp.I][0]
     else:
         for r in [r for r in evsp.R if (f,r) in evsp.I]:
-            num = []  # number of vehicle in the station before r when i is charging
-            for u in range(evsp.U):  # 0, 1, 2...
-                index = int(r[1:])+u  # index of r to check capacity, if r=r3, then index=3,4,5...
-                num_before = 0
-                for u in range(evsp.U):
-                    index_before = index-u  # index of r when vehicle still charging
-                    if index_before > 0:  # considering r1, r2...
-                        num_before += sum(map(('r%d'%(index_before)).__eq__, R.values()))
-                num.append(num_before)
-            if  (max(num) < evsp.stationCap):  # considering capacity
+            index = int(r[1:])  # vehicle is being charged from index to index+U-1
+            if max(occupancy[index:index+evsp.U]) < evsp.stationCap:  # considering capacity
                 R[f] = r
+                for u in range(evsp.U):
+                    occupancy[index+u] += 1
                 break
     return R
 
@@ -196,11 +439,9 @@ def choose_k(evsp, S, R):
     R: dict of recharging time division
     return: type k leading to min cost
     """
-    cost = {}
-    for k in evsp.K:
-        duty = Duty(evsp,k,S,R)
-        cost[k] = duty.calCost() if duty.checkEnergyFeasibility() else float("inf")
-    return min(cost, key=cost.get)  # minimum cost k    
+    cost, feasibility = getEvaluator(evsp).evaluateVehTypes(S, R)  # all types in one pass
+    cost = np.where(feasibility, cost, float("inf"))
+    return evsp.K[int(np.argmin(cost))]  # minimum cost k
 
 def energy_violate(evsp, k, Y, i, j):
     """
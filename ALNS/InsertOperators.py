@@ -1,7 +1,7 @@
 from EVSPModel import Duty, Schedule, EVSP
 from .Calculations import randomPos
 from .Calculations import randomChargingTime, greedyChargingTime, nearestChargingTime
-from .Calculations import findBestVehType, calSOC
+from .Calculations import findBestVehType, calSOC, evaluateSchedule
 
 import random
 from copy import deepcopy
@@ -12,7 +12,7 @@ from copy import deepcopy
 """
 
 
-def randomInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPenalty, chargeProb):
+def randomInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPenalty, chargeProb, evaluated=None):
     """
     Insert trips & charging randomly.
     Random insertion doesn't need to guarantee feasibility, but for diversification.
@@ -21,6 +21,7 @@ def randomInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPen
     3. Insert a charging node behind it randomly.(choose a random charging time division)
     4. Choose a random time division for the last charging node. (needn't last charging in beta version)
     5. If infeasible, add a penalty instead of reject it.
+    evaluated: LRUCache of evaluated schedules, duplicate neighbours are not re-evaluated
     """
     newCost = 0
     newSchedule = deepcopy(schedule)
@@ -56,22 +57,13 @@ def randomInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPen
             r_ = duty.R.pop(i)
             newSchedule.delR(i)
 
-    # calculate cost
-    eneFeasible, capFeasible = True, True
-    newCost = newSchedule.calCost()
-    # add penalty
-    if not newSchedule.checkCapacityFeasibility():
-        newCost += capPenalty
-        capFeasible = False
-    if not newSchedule.checkEnergyFeasibility():
-        newCost += enePenalty
-        eneFeasible = False
-    isFeasible = eneFeasible and capFeasible
+    # calculate cost, add penalty if infeasible
+    newCost, isFeasible = evaluateSchedule(evsp, newSchedule, enePenalty, capPenalty, evaluated)
 
     return newCost, newSchedule, isFeasible
 
 
-def greedyInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPenalty, chargeProb):
+def greedyInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPenalty, chargeProb, evaluated=None):
     """
     Greedy insertion try to guarantee feasibility.
     1. Select a trip randomly.
@@ -79,6 +71,7 @@ def greedyInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPen
     3. Insert a charging node behind it randomly.(choose the nearest charging time division)
     4. Choose a greedy time division for the last charging node.
     5. If infeasible, add a penalty instead of reject it.
+    evaluated: LRUCache of evaluated schedules, duplicate neighbours are not re-evaluated
     """
     newCost = 0
     newSchedule = deepcopy(schedule)
@@ -131,17 +124,8 @@ def greedyInsert(evsp:EVSP, tripBank:list, schedule:Schedule, enePenalty, capPen
     for duty in newSchedule.schedule:
         duty.K = findBestVehType(evsp, duty)
 
-    # calculate cost
-    eneFeasible, capFeasible = True, True
-    newCost = newSchedule.calCost()
-    # add penalty
-    if not newSchedule.checkCapacityFeasibility():
-        newCost += capPenalty
-        capFeasible = False
-    if not newSchedule.checkEnergyFeasibility():
-        newCost += enePenalty
-        eneFeasible = False
-    isFeasible = eneFeasible and capFeasible
+    # calculate cost, add penalty if infeasible
+    newCost, isFeasible = evaluateSchedule(evsp, newSchedule, enePenalty, capPenalty, evaluated)
 
     return newCost, newSchedule, isFeasible
 
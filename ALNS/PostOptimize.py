@@ -0,0 +1,67 @@
+from EVSPModel import Duty, Schedule, EVSP
+
+import numpy as np
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+def postOptimize(evsp:EVSP, duties:list, timeLimit=60, printLog=False):
+    """
+    Post-optimization by solving a set-partitioning model over a pool of energy-feasible duties.
+    Each trip should be covered by exactly one duty, and the number of vehicles being charged
+    in each time division should not exceed the station capacity.
+    The model is solved by the HiGHS MILP solver in SciPy (scipy.optimize.milp).
+    duties: pool of energy-feasible duties, e.g. duties generated during ALNS
+    timeLimit: time limit of the MILP solver / sec
+    Return the best schedule found, None if no feasible schedule is found within the time limit.
+    """
+    try:
+        from scipy.optimize import milp, LinearConstraint, Bounds
+        from scipy.sparse import csr_matrix
+    except ImportError:
+        raise ImportError("Post-optimization requires SciPy (>=1.9) for the MILP solver.")
+
+    m = len(duties)
+    if m == 0:
+        return None
+    cost = np.array([duty.calCost() for duty in duties])
+
+    # trip covering constraints
+    rows, cols = [], []
+    for col, duty in enumerate(duties):
+        for s in duty.S:
+            if s in evsp.T:
+                rows.append(s - 1)
+                cols.append(col)
+    A_trip = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(evsp.n, m))
+    constraints = [LinearConstraint(A_trip, 1, 1)]
+
+    # station capacity constraints
+    if evsp.stationCap >= 0:
+        rows, cols = [], []
+        for col, duty in enumerate(duties):
+            for r in duty.R.values():
+                for u in range(evsp.U):  # vehicle is being charged from r to r+U-1
+                    rows.append(int(r[1:]) - 1 + u)
+                    cols.append(col)
+        A_cap = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(evsp.R) + evsp.U, m))
+        constraints.append(LinearConstraint(A_cap, -np.inf, evsp.stationCap))
+
+    result = milp(
+        cost,
+        constraints=constraints,
+        integrality=np.ones(m),
+        bounds=Bounds(0, 1),
+        options={'time_limit': timeLimit, 'disp': printLog},
+    )
+    if result.x is None:
+        return None
+
+    newSchedule = Schedule(evsp, [], {})
+    for col in np.flatnonzero(result.x > 0.5):
+        duty = duties[col]
+        newSchedule.addDuty(Duty(evsp, duty.K, list(duty.S), dict(duty.R)))
+    return newSchedule
@@ -22,9 +22,10 @@ def randomRemoval(evsp:EVSP, schedule:Schedule, n:int):
     for duty in removedSchedule.schedule:  # remove trips and charging
                 
         chargingBank = list(set(['f%d'%i for i in tripBank if 'f%d'%i in duty.S]))
-        duty.S = list(filter(lambda x: (x not in tripBank) and (x not in chargingBank), duty.S))
+        duty.removeNodes(set(tripBank + chargingBank))
         for f in chargingBank:
             r_ = duty.R.pop(f)
+            removedSchedule.delR(f)
 
         if len(duty.S) <= 4:  # duty too short
             tripBank.extend([i for i in duty.S[1:-1] if type(i)==int])
@@ -54,9 +55,10 @@ def timeRelatedRemoval(evsp:EVSP, schedule:Schedule, n:int):
     for duty in removedSchedule.schedule:
 
         chargingBank = list(set(['f%d'%i for i in tripBank if 'f%d'%i in duty.S]))
-        duty.S = list(filter(lambda x: (x not in tripBank) and (x not in chargingBank), duty.S))
+        duty.removeNodes(set(tripBank + chargingBank))
         for f in chargingBank:
             r_ = duty.R.pop(f)
+            removedSchedule.delR(f)
 
         if len(duty.S) <= 4:  # duty too short
             tripBank.extend([i for i in duty.S[1:-1] if type(i)==int])
@@ -96,9 +98,10 @@ def neighborRemoval(evsp:EVSP, schedule:Schedule, n:int):
     for duty in removedSchedule.schedule:
         
         chargingBank = list(set(['f%d'%i for i in tripBank if 'f%d'%i in duty.S]))
-        duty.S = list(filter(lambda x: (x not in tripBank) and (x not in chargingBank), duty.S))
+        duty.removeNodes(set(tripBank + chargingBank))
         for f in chargingBank:
             r_ = duty.R.pop(f)
+            removedSchedule.delR(f)
         
         if len(duty.S) <= 4:  # duty too short
             tripBank.extend([i for i in duty.S[1:-1] if type(i)==int])
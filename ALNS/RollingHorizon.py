@@ -0,0 +1,301 @@
+from EVSPModel import Duty, Schedule, EVSP
+from EVSPModel.EvaluatorClass import getEvaluator
+from .Calculations import chargingWindow, findBestVehType, calVehNumList
+from .ChargingAssignment import assignChargingTime
+from .Decomposition import solveSubProblem
+
+import random
+import numpy as np
+from bisect import bisect_right
+from timeit import default_timer as timer
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+def stitchFragments(evsp:EVSP, schedule:Schedule, fragments:list, vehicles=None, keepType=False, candidates=None):
+    """
+    Link fragments to the vehicles (duties) of a schedule by a min-cost assignment.
+    A vehicle ending with trip i takes a fragment starting with trip j if (i, j) is an arc,
+    directly or with a charging event after trip i, and the linked duty is energy-feasible.
+    A vehicle ending with a charging event takes a fragment if the charging event finishes in time.
+    Charging events for linking take the cheapest division with free capacity.
+    Fragments not linked are served by new vehicles.
+    schedule: schedule of vehicles, charging events of all the duties count for capacity
+    vehicles: indices of duties in the schedule which can take fragments, default is all
+    keepType: whether to keep the types of vehicles, otherwise the best type of a linked duty is chosen
+    candidates: number of vehicles evaluated for each fragment, vehicles free before the fragment starts are
+                screened by arcs, the ones free latest first, None means all the vehicles
+    Return the new schedule.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        raise ImportError("Linking fragments requires SciPy for the assignment.")
+
+    vehicles = list(range(len(schedule.schedule))) if vehicles is None else list(vehicles)
+    starts = {}  # number of charging events starting at each time division
+    for duty in schedule.schedule + fragments:
+        for r in duty.R.values():
+            starts[r] = starts.get(r, 0) + 1
+
+    # vehicles sorted by busy-until
+    busyUntil = []
+    for index in vehicles:
+        duty = schedule.schedule[index]
+        i = duty.S[-2]
+        busyUntil.append(evsp.s_r[duty.R[i]] + evsp.U * evsp.delta if i in evsp.F else evsp.s_i[i] + evsp.t_i[i])
+    order = sorted(range(len(vehicles)), key=lambda v: busyUntil[v])
+    ends = [busyUntil[v] for v in order]
+
+    gain = np.zeros((len(vehicles), len(fragments)))  # cost change of linking, negative if saved
+    linked = {}  # (vehicle, fragment): [(cost change, linked duty)], directly or with charging
+    for f, fragment in enumerate(fragments):
+        j = fragment.S[1]
+        evaluated = 0  # vehicles evaluated for the fragment
+        for p in range(bisect_right(ends, evsp.s_i[j]) - 1, -1, -1):
+            if (candidates is not None) and (evaluated >= candidates):
+                break
+            v = order[p]
+            duty = schedule.schedule[vehicles[v]]
+            i = duty.S[-2]  # last node, location and busy-until of the vehicle
+            candidateDuties = []
+            if i in evsp.F:  # charging at the end
+                if ((i, j) in evsp.A) and (evsp.s_r[duty.R[i]] + evsp.U * evsp.delta + evsp.t_ij[(i, j)] <= evsp.s_i[j]):
+                    candidateDuties.append(Duty(evsp, duty.K, duty.S[:-1] + fragment.S[1:], {**duty.R, **fragment.R}))
+            else:
+                if (i, j) in evsp.A:
+                    candidateDuties.append(Duty(evsp, duty.K, duty.S[:-1] + fragment.S[1:], {**duty.R, **fragment.R}))
+                r = freeChargingTime(evsp, starts, i, j)
+                if r is not None:
+                    candidateDuties.append(Duty(evsp, duty.K, duty.S[:-1] + ["f%d"%i] + fragment.S[1:], {**duty.R, "f%d"%i: r, **fragment.R}))
+            if not candidateDuties:  # location or time infeasible
+                continue
+            evaluated += 1
+            for newDuty in candidateDuties:
+                if keepType is False:
+                    newDuty.K = findBestVehType(evsp, newDuty)
+                if newDuty.checkEnergyFeasibility():
+                    delta = newDuty.calCost() - duty.calCost() - fragment.calCost()
+                    if delta < 0:
+                        linked.setdefault((v, f), []).append((delta, newDuty))
+                        gain[v, f] = min(gain[v, f], delta)
+
+    newSchedule = Schedule(evsp, [duty for duty in schedule.schedule], {})
+    taken = set()
+    if linked:
+        pairs = [(v, f) for v, f in zip(*linear_sum_assignment(gain)) if (v, f) in linked]
+        for v, f in sorted(pairs, key=lambda pair: gain[pair]):
+            duty = schedule.schedule[vehicles[v]]
+            for _delta, newDuty in sorted(linked[(v, f)], key=lambda candidate: candidate[0]):
+                f_ = "f%d" % duty.S[-2] if duty.S[-2] in evsp.T else None
+                if f_ in newDuty.R:  # charging for linking, capacity may be taken by previous links
+                    r = freeChargingTime(evsp, starts, duty.S[-2], fragments[f].S[1])
+                    if r is None:
+                        continue
+                    newDuty.R[f_] = r
+                    starts[r] = starts.get(r, 0) + 1
+                    newDuty.calCost()
+                newSchedule.schedule[vehicles[v]] = newDuty
+                taken.add(f)
+                break
+    for f, fragment in enumerate(fragments):
+        if f not in taken:
+            newSchedule.schedule.append(fragment)
+    newSchedule.updateR()
+    return newSchedule
+
+
+def freeChargingTime(evsp:EVSP, starts:dict, i:int, j:int):
+    """
+    Return the cheapest time division with free capacity for charging between trip i & trip j,
+    None if not exist.
+    starts: number of charging events starting at each time division
+    """
+    if ("f%d"%i, j) not in evsp.A:
+        return None
+    a, b = chargingWindow(evsp, i, j)
+    if evsp.stationCap < 0:  # capacity not considered
+        isFree = None
+    else:
+        def isFree(index):
+            return max(calVehNumList(evsp, starts, evsp.slotIndex.R[index])) < evsp.stationCap
+    index = evsp.slotIndex.cheapest(a, b, isFree)
+    return None if index is None else evsp.slotIndex.R[index]
+
+
+class RollingHorizonALNS():
+
+    """
+    For very large timetables, the day is partitioned by trip start time into overlapping windows,
+    which are solved one after another by ALNS. Only the trips starting before the end of a window
+    are committed, the trips in the overlap are released and solved again in the next window.
+    Vehicles of previous windows are carried over into the sub problem of a window: the last trip of each
+    vehicle is a trip of the sub problem which can only start a duty, so that its location and busy-until
+    are respected, and its consumption is set so that the vehicle continues with the battery level left by
+    its committed trip chain. The search is warm started from the vehicles in operation.
+    Duties continuing a vehicle are appended to it, new duties are linked to vehicles where cheaper
+    (see stitchFragments), and the full schedule is polished by reassigning charging time.
+    """
+
+    def __init__(
+        self,
+        evsp:EVSP,
+        windowSize=360,
+        overlap=120,
+        stitchCandidates=5,
+        repairTimeLimit=10,
+        printLog=True,
+        **params,
+    ):
+        """
+        evsp: EVSP model, createModel() should be called
+        windowSize: length of the committed part of a window / min
+        overlap: length of the overlap with the next window / min
+        stitchCandidates: number of vehicles evaluated for linking each new duty of a window, None means all
+        repairTimeLimit: time limit of charging time reassignment when polishing / sec
+        params: params of ALNS for windows, e.g. iterMax, T0
+        """
+        if windowSize <= 0 or overlap < 0:
+            raise ValueError("Window size should be positive and overlap should be non-negative.")
+        self.evsp = evsp
+        self.windowSize = windowSize
+        self.overlap = overlap
+        self.stitchCandidates = stitchCandidates
+        self.repairTimeLimit = repairTimeLimit
+        self.printLog = printLog
+        self.params = params
+
+        self.bestSchedule = None
+        self.bestCost = 0
+        self.isFeasible = False
+        self.windowNum = 0  # number of windows solved
+        self.windowRunTime = []  # solve time of each window
+        self.runTime = 0
+
+    def solve(self):
+        """
+        Solve windows in time order with vehicle states carried over, then polish.
+        """
+        evsp = self.evsp
+        if self.printLog is True:
+            print("--- Rolling Horizon ALNS Starts: %d Trips" % evsp.n)
+        tic = timer()
+
+        trips = sorted(evsp.T, key=lambda i: evsp.s_i[i])  # uncommitted trips
+        schedule = Schedule(evsp, [], {})
+        start = evsp.s_i[trips[0]]
+        while trips:
+            end = start + self.windowSize  # trips starting before end are committed
+            windowTrips = [i for i in trips if evsp.s_i[i] < end + self.overlap]
+            if evsp.s_i[trips[-1]] < end + self.overlap:  # last window
+                end = float("inf")
+            if windowTrips:
+                toc = timer()
+                schedule, committed = self.solveWindow(schedule, windowTrips, end)
+                trips = [i for i in trips if i not in committed]
+                self.windowRunTime.append(timer() - toc)
+                self.windowNum += 1
+                if self.printLog is True:
+                    print("Window %d: %d trips, %d committed, %d buses" % (self.windowNum, len(windowTrips), len(committed), len(schedule.schedule)))
+            start = end
+
+        # polish
+        capFeasible = schedule.checkCapacityFeasibility()
+        repaired = assignChargingTime(evsp, schedule, self.repairTimeLimit)
+        if repaired is not None:
+            schedule, capFeasible = repaired, True
+
+        self.bestSchedule = schedule
+        self.bestCost = schedule.calCost()
+        self.isFeasible = capFeasible and schedule.checkEnergyFeasibility()
+        self.runTime = timer() - tic
+
+        if self.printLog is True:
+            print("--- Solve Time: %.2f sec" % (self.runTime))
+            print("--- Best Cost: %.2f yuan" % (self.bestCost))
+            print("--- Number of Buses: %d" % (len(schedule.schedule)))
+            print("--- Number of Charging Trips: %d" % (len(schedule.R)))
+            print("--- Feasibility: %s" % (self.isFeasible))
+            print("--- Rolling Horizon ALNS Finished")
+
+    def solveWindow(self, schedule:Schedule, windowTrips:list, end):
+        """
+        Solve a window with the vehicles of a schedule carried over, and commit the trips starting before end.
+        Duties of vehicles end with trips, since charging nodes at the end of committed duties are removed.
+        Return (new schedule, committed trips).
+        """
+        evsp = self.evsp
+        vehicles = {duty.S[-2]: index for index, duty in enumerate(schedule.schedule)}  # last trip: duty index
+        trips = sorted(list(windowTrips) + list(vehicles))
+        sub = evsp.subProblem(trips)
+        self.carryOver(sub, trips, schedule, vehicles)
+        initialDuties = [(schedule.schedule[index].K, ['o', i, 'd'], {}) for i, index in vehicles.items()] if vehicles else None
+        duties, _cost, _runTime = solveSubProblem(sub, trips, self.params, random.randrange(2**31), initialDuties, vehicles=list(vehicles))
+
+        newSchedule = Schedule(evsp, list(schedule.schedule), {})
+        fragments = []
+        committed = set()
+        for K, S, R in duties:
+            if S[1] in vehicles:  # continue a vehicle
+                duty = schedule.schedule[vehicles[S[1]]]
+                if len(S) == 3:  # no trip in the window
+                    continue
+                continued = self.commit(Duty(evsp, duty.K, duty.S[:-1] + S[2:], {**duty.R, **R}), end)
+                if continued.checkEnergyFeasibility():
+                    newSchedule.schedule[vehicles[S[1]]] = continued
+                    committed.update(s for s in continued.S[len(duty.S)-1:] if s in evsp.T)
+                    continue
+                S = ['o'] + S[2:]  # battery level differs with the vehicle type chosen, linked as a new duty instead
+                while S[1] in evsp.F:
+                    S.pop(1)
+            fragment = self.commit(Duty(evsp, K, S, {f:r for f,r in R.items() if f in S}), end)
+            if fragment is not None:
+                fragments.append(fragment)
+                committed.update(s for s in fragment.S if s in evsp.T)
+        newSchedule = stitchFragments(evsp, newSchedule, fragments, candidates=self.stitchCandidates)
+        return newSchedule, committed
+
+    def carryOver(self, sub:EVSP, trips:list, schedule:Schedule, vehicles:dict):
+        """
+        Set the consumption of the last trip of each vehicle in the sub problem (before createModel()),
+        so that a vehicle of its type starting a duty of the sub problem with that trip has the battery level
+        left by its committed trip chain.
+        trips: trip nodes of the original problem, trip i of the sub problem is trips[i-1]
+        vehicles: last trip of a vehicle: index of the duty in the schedule
+        """
+        if not vehicles:
+            return
+        evsp = self.evsp
+        duties = [schedule.schedule[index] for index in vehicles.values()]
+        energy = getEvaluator(evsp).evaluate(duties)['energy']  # after each node & the arc to the next node
+        position = {i: p for p, i in enumerate(trips)}
+        sub.timetable['Consumption'] = sub.timetable['Consumption'].astype(float)
+        for row, (i, duty) in enumerate(zip(vehicles, duties)):
+            left = energy[row, len(duty.S)-2] + evsp.e_kij[duty.K][(i, 'd')]  # energy left after trip i
+            consumption = evsp.E_k[duty.K] - left - evsp.e_kij[duty.K][('o', i)]
+            sub.timetable.loc[position[i], 'Consumption'] = max(consumption, 0)
+            if evsp.capRelatedCons:
+                sub.timetable.loc[position[i], 'Distance'] = 0  # the same consumption for all the types
+
+    def commit(self, duty:Duty, end):
+        """
+        Truncate a duty before the first trip starting at or after end, as well as charging nodes at its end.
+        Return the committed fragment, None if no trip is committed.
+        """
+        evsp = self.evsp
+        S = ['o']
+        for s in duty.S[1:-1]:
+            if (s in evsp.T) and (evsp.s_i[s] >= end):
+                break
+            S.append(s)
+        while S[-1] in evsp.F:
+            S.pop()
+        if len(S) == 1:
+            return None
+        S.append('d')
+        fragment = Duty(evsp, duty.K, S, {f:r for f,r in duty.R.items() if f in S})
+        fragment.K = findBestVehType(evsp, fragment)
+        return fragment
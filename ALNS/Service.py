@@ -0,0 +1,356 @@
+from EVSPModel import EVSP
+from .ALNS import ALNS
+
+import os
+import json
+import random
+import asyncio
+import argparse
+import threading
+import itertools
+import multiprocessing
+import pandas as pd
+from timeit import default_timer as timer
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+serviceModels = None  # created models kept hot in a worker process
+serviceProgress = None  # queue of progress events sent to the service
+
+
+def initService(models:dict, progress):
+    """
+    Keep the created models and the progress queue in a worker process.
+    """
+    global serviceModels, serviceProgress
+    serviceModels = models
+    serviceProgress = progress
+
+
+def solveJob(jobId:int, name, params:dict, seed):
+    """
+    Solve a job by ALNS on a hot model, progress is reported after each segment.
+    params: params of ALNS
+    Return a dict of results, the best schedule is in the split format of Schedule.to_frame().
+    """
+    tic = timer()
+    serviceProgress.put((jobId, 'running', {}))
+
+    def report(alns:ALNS, iteration):
+        serviceProgress.put((jobId, 'progress', {
+            'Iteration': iteration,
+            'BestCost': alns.bestCost,
+            'CurrentCost': alns.historyCurrentCost[-1],
+            'Time': timer() - tic,
+        }))
+
+    random.seed(seed)
+    alns = ALNS(serviceModels[name], printLog=False, callback=report, **params)
+    alns.solve()
+    schedule = alns.bestSchedule
+    frame = schedule.to_frame()
+    return {
+        'Cost': schedule.calCost(),
+        'Buses': len(schedule.schedule),
+        'ChargingEvents': len(schedule.R),
+        'Feasible': schedule.checkEnergyFeasibility() and schedule.checkCapacityFeasibility(),
+        'Iterations': alns.totalIter,
+        'RunTime': alns.runTime,
+        'Schedule': {'columns': list(frame.columns), 'data': frame.values.tolist()},
+    }
+
+
+def createModel(spec:dict):
+    """
+    Create an EVSP model from a spec:
+        timetable: path of an Excel/CSV file, or records of the timetable
+        model: params of EVSP()
+        vehTypes, costs, chargingFunc: params of setVehTypes(), setCosts(), setChargingFunc()
+    """
+    timetable = spec['timetable']
+    if isinstance(timetable, str):
+        timetable = pd.read_csv(timetable) if timetable.endswith('.csv') else pd.read_excel(timetable)
+    else:
+        timetable = pd.DataFrame(timetable)
+    evsp = EVSP(timetable, **spec.get('model', {}))
+    evsp.setVehTypes(**spec.get('vehTypes', {}))
+    evsp.setCosts(**spec.get('costs', {}))
+    evsp.setChargingFunc(**spec.get('chargingFunc', {}))
+    evsp.createModel()
+    return evsp
+
+
+class SolverService():
+
+    """
+    A long-running local solver service over HTTP (asyncio, JSON bodies).
+    Models are created once when registered and kept hot in the worker processes of a process pool,
+    so a job only pays for the search. Jobs are queued onto the pool, progress is reported after each
+    segment of ALNS and can be streamed, and the best schedule is returned in a compact split format.
+    Endpoints:
+        POST /models                 register a model, body: {name, timetable, model, vehTypes, costs, chargingFunc}, see createModel()
+        GET  /models                 registered models
+        POST /jobs                   submit a job, body: {model, params (of ALNS), seed}
+        GET  /jobs                   status of jobs
+        GET  /jobs/<id>              status and result of a job
+        GET  /jobs/<id>/progress     stream progress events of a job as JSON lines until it is finished
+        DELETE /jobs/<id>            cancel a queued job
+    Workers are restarted with all the models when a model is registered, running jobs are finished by the old workers.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, processes=None, printLog=True):
+        """
+        host, port: address to listen on, port 0 means a free port (see port after start())
+        processes: number of worker processes, default is the number of CPUs
+        """
+        self.host = host
+        self.port = port
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+        self.printLog = printLog
+
+        self.models = {}  # name: EVSP model
+        self.jobs = {}  # id: job record
+        self.pool = None
+        self.server = None
+        self.loop = None
+        self.thread = None
+        self.ids = itertools.count(1)
+        self.progress = multiprocessing.get_context().Queue()
+        self.changed = None  # condition notified when a job changes
+
+    # --- Service ---
+
+    async def start(self):
+        """
+        Start listening, in a running event loop.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Condition()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        threading.Thread(target=self.readProgress, daemon=True).start()
+        if self.printLog is True:
+            print("--- Solver Service Listening on http://%s:%d" % (self.host, self.port))
+
+    async def stop(self):
+        """
+        Stop listening and shut down workers.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        self.progress.put(None)
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def serve(self):
+        """
+        Serve forever in the current thread.
+        """
+        async def main():
+            await self.start()
+            async with self.server:
+                await self.server.serve_forever()
+        asyncio.run(main())
+
+    def startInThread(self):
+        """
+        Serve in a background thread, e.g. for tests on localhost. Return when the service is listening.
+        """
+        ready = threading.Event()
+        def run():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def stopInThread(self):
+        """
+        Stop a service served by startInThread().
+        """
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    # --- Models & jobs ---
+
+    async def addModel(self, spec:dict):
+        """
+        Create a model and restart workers with all the models.
+        """
+        name = spec['name']
+        evsp = await self.loop.run_in_executor(None, createModel, spec)
+        self.models[name] = evsp
+        old = self.pool
+        self.pool = ProcessPoolExecutor(max_workers=self.processes, initializer=initService, initargs=(dict(self.models), self.progress))
+        if old is not None:
+            old.shutdown(wait=False)
+        return {'Name': name, 'Trips': evsp.n}
+
+    async def submit(self, request:dict):
+        """
+        Queue a job onto the pool.
+        """
+        name = request.get('model')
+        if name not in self.models:
+            raise KeyError("Model %s is not registered." % name)
+        jobId = next(self.ids)
+        seed = request.get('seed', random.randrange(2**31))
+        job = {
+            'Id': jobId, 'Model': name, 'Params': request.get('params', {}), 'Seed': seed,
+            'Status': 'queued', 'Submitted': timer(), 'Started': None, 'Finished': None,
+            'Events': [], 'Result': None, 'Error': None,
+        }
+        self.jobs[jobId] = job
+        future = self.pool.submit(solveJob, jobId, name, job['Params'], seed)
+        job['Future'] = future
+        asyncio.wrap_future(future).add_done_callback(lambda f: self.finish(jobId, f))
+        return self.status(jobId)
+
+    def finish(self, jobId, future):
+        """
+        Record the result of a job.
+        """
+        job = self.jobs[jobId]
+        job['Finished'] = timer()
+        if future.cancelled():
+            job['Status'] = 'cancelled'
+        elif future.exception() is not None:
+            job['Status'] = 'failed'
+            job['Error'] = repr(future.exception())
+        else:
+            job['Status'] = 'done'
+            job['Result'] = future.result()
+        self.loop.create_task(self.notify())
+
+    def readProgress(self):
+        """
+        Forward progress events of workers to jobs, in a background thread.
+        """
+        while True:
+            message = self.progress.get()
+            if message is None:
+                break
+            self.loop.call_soon_threadsafe(self.onProgress, *message)
+
+    def onProgress(self, jobId, kind, event):
+        job = self.jobs.get(jobId)
+        if job is None:
+            return
+        if kind == 'running':
+            job['Status'] = 'running' if job['Status'] == 'queued' else job['Status']
+            job['Started'] = timer()
+        else:
+            job['Events'].append(event)
+        self.loop.create_task(self.notify())
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    def status(self, jobId, result=True):
+        """
+        Return the status of a job, with times / sec.
+        """
+        job = self.jobs[jobId]
+        status = {k: job[k] for k in ['Id', 'Model', 'Params', 'Seed', 'Status', 'Error']}
+        status['QueueTime'] = (job['Started'] or job['Finished'] or timer()) - job['Submitted']
+        status['Latency'] = (job['Finished'] - job['Submitted']) if job['Finished'] else None
+        status['Progress'] = job['Events'][-1] if job['Events'] else None
+        if result:
+            status['Result'] = job['Result']
+        return status
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        """
+        Handle an HTTP request.
+        """
+        try:
+            method, path, body = await self.readRequest(reader)
+            parts = [p for p in path.split('?')[0].split('/') if p]
+            if (parts == ['models']) and (method == 'POST'):
+                await self.respond(writer, 201, await self.addModel(body))
+            elif (parts == ['models']) and (method == 'GET'):
+                await self.respond(writer, 200, [{'Name': name, 'Trips': evsp.n} for name, evsp in self.models.items()])
+            elif (parts == ['jobs']) and (method == 'POST'):
+                await self.respond(writer, 202, await self.submit(body))
+            elif (parts == ['jobs']) and (method == 'GET'):
+                await self.respond(writer, 200, [self.status(jobId, result=False) for jobId in self.jobs])
+            elif (len(parts) >= 2) and (parts[0] == 'jobs') and (int(parts[1]) in self.jobs):
+                jobId = int(parts[1])
+                if (len(parts) == 2) and (method == 'GET'):
+                    await self.respond(writer, 200, self.status(jobId))
+                elif (len(parts) == 2) and (method == 'DELETE'):
+                    cancelled = self.jobs[jobId]['Future'].cancel()
+                    await self.respond(writer, 200 if cancelled else 409, self.status(jobId, result=False))
+                elif (parts[2:] == ['progress']) and (method == 'GET'):
+                    await self.stream(writer, jobId)
+                else:
+                    await self.respond(writer, 404, {'Error': 'Not found.'})
+            else:
+                await self.respond(writer, 404, {'Error': 'Not found.'})
+        except (KeyError, ValueError, TypeError) as e:
+            await self.respond(writer, 400, {'Error': str(e)})
+        except Exception as e:
+            await self.respond(writer, 500, {'Error': repr(e)})
+        finally:
+            writer.close()
+
+    async def readRequest(self, reader):
+        """
+        Return (method, path, JSON body) of a request.
+        """
+        line = (await reader.readline()).decode()
+        method, path, _version = line.split()
+        length = 0
+        while True:
+            header = (await reader.readline()).decode().strip()
+            if not header:
+                break
+            key, value = header.split(':', 1)
+            if key.strip().lower() == 'content-length':
+                length = int(value)
+        body = json.loads(await reader.readexactly(length)) if length > 0 else {}
+        return method, path, body
+
+    async def respond(self, writer, code, content):
+        data = json.dumps(content).encode()
+        writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (code, {200: b'OK', 201: b'Created', 202: b'Accepted', 400: b'Bad Request', 404: b'Not Found', 409: b'Conflict', 500: b'Internal Server Error'}[code], len(data)))
+        writer.write(data)
+        await writer.drain()
+
+    async def stream(self, writer, jobId):
+        """
+        Stream progress events of a job as JSON lines until it is finished, the last line is the status.
+        """
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+        job, sent = self.jobs[jobId], 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: (len(job['Events']) > sent) or (job['Finished'] is not None))
+            for event in job['Events'][sent:]:
+                writer.write(json.dumps(event).encode() + b"\n")
+            sent = len(job['Events'])
+            await writer.drain()
+            if job['Finished'] is not None:
+                writer.write(json.dumps(self.status(jobId)).encode() + b"\n")
+                await writer.drain()
+                break
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local EVSP solver service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+    SolverService(args.host, args.port, args.processes).serve()
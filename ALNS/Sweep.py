@@ -0,0 +1,81 @@
+from EVSPModel import EVSP
+from .ALNS import ALNS
+
+import os
+import random
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+sweepModel = None  # created model shared by the scenarios of a worker process
+
+
+def initSweep(evsp:EVSP):
+    """
+    Keep the created model in a worker process, so it is transferred once per worker instead of once per scenario.
+    """
+    global sweepModel
+    sweepModel = evsp
+
+
+def solveScenario(name, variant:dict, params:dict, seed):
+    """
+    Derive a variant of the created model and solve it by ALNS.
+    variant: params of EVSP.variant()
+    params: params of ALNS
+    Return a dict of results.
+    """
+    random.seed(seed)
+    evsp = sweepModel.variant(**variant)
+    alns = ALNS(evsp, printLog=False, **params)
+    alns.solve()
+    schedule = alns.bestSchedule
+    return {
+        'Scenario': name,
+        'Cost': schedule.calCost(),
+        'FleetSize': len(schedule.schedule),
+        'ChargingEvents': len(schedule.R),
+        'EnergyFeasible': schedule.checkEnergyFeasibility(),
+        'CapacityFeasible': schedule.checkCapacityFeasibility(),
+        'RunTime': alns.runTime,
+    }
+
+
+def scenarioSweep(evsp:EVSP, scenarios:dict, processes=None, printLog=True, **params):
+    """
+    Solve the same timetable under several scenarios by ALNS in parallel worker processes.
+    The model is created once, and each scenario is a cheap variant of it (see EVSP.variant).
+    evsp: EVSP model, createModel() should be called
+    scenarios: {scenario name: params of EVSP.variant()},
+               e.g. {'cap2': {'stationCap': 2}, 'piecewise': {'chargingFunc': {'chargingFuncType': 'piecewise'}}}
+    processes: number of worker processes, default is min(number of scenarios, number of CPUs), 1 means solving in the main process
+    params: params of ALNS, e.g. iterMax
+    Return a DataFrame with a row for each scenario, columns:
+        Scenario, Cost, FleetSize, ChargingEvents, EnergyFeasible, CapacityFeasible, RunTime
+    """
+    names = list(scenarios.keys())
+    args = [(name, scenarios[name], params, random.randrange(2**31)) for name in names]
+    for name in names:  # invalid params fail before solving
+        evsp.variant(**scenarios[name])
+
+    processes = processes if processes is not None else min(len(names), os.cpu_count() or 1)
+    if processes == 1:
+        initSweep(evsp)
+        results = []
+        for arg in args:
+            results.append(solveScenario(*arg))
+            if printLog is True:
+                print("Scenario %s: %.2f yuan, %d buses" % (arg[0], results[-1]['Cost'], results[-1]['FleetSize']))
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=initSweep, initargs=(evsp,)) as pool:
+            results = list(pool.map(solveScenario, *zip(*args)))
+        if printLog is True:
+            for result in results:
+                print("Scenario %s: %.2f yuan, %d buses" % (result['Scenario'], result['Cost'], result['FleetSize']))
+
+    return pd.DataFrame(results, columns=['Scenario', 'Cost', 'FleetSize', 'ChargingEvents', 'EnergyFeasible', 'CapacityFeasible', 'RunTime'])
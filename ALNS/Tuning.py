@@ -0,0 +1,254 @@
+from .ALNS import ALNS
+
+import os
+import random
+import inspect
+import numpy as np
+import pandas as pd
+from timeit import default_timer as timer
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+defaultSpace = {
+    'T0': (10, 500),
+    'alpha': (0.999, 0.9999),
+    'r': (0.1, 0.9),
+    'nMax': (5, 20),
+    'enePenalty': (100, 2000),
+    'capPenalty': (100, 2000),
+    'chargeProb': (0.5, 1.0),
+    'segLength': [50, 100, 200],
+}
+
+tuningInstances = None  # created models shared by the runs of a worker process
+
+
+def initTuning(instances:dict):
+    """
+    Keep the created models in a worker process, so they are transferred once per worker instead of once per run.
+    """
+    global tuningInstances
+    tuningInstances = instances
+
+
+def solveConfiguration(instance, config:dict, params:dict, seed):
+    """
+    Solve an instance by ALNS with a configuration.
+    config, params: params of ALNS, config overrides params
+    Return a dict of results.
+    """
+    random.seed(seed)
+    alns = ALNS(tuningInstances[instance], printLog=False, **{**params, **config})
+    alns.solve()
+    schedule = alns.bestSchedule
+    history = alns.historyBestCost
+    firstBest = history.index(min(history)) + 1 if history else 0  # iteration reaching the best cost
+    return {
+        'Cost': schedule.calCost(),
+        'Feasible': schedule.checkEnergyFeasibility() and schedule.checkCapacityFeasibility(),
+        'RunTime': alns.runTime,
+        'TimeToBest': alns.runTime * firstBest / max(len(history), 1),
+    }
+
+
+def sampleConfiguration(space:dict):
+    """
+    Sample a configuration uniformly from a parameter space.
+    space: {param: (low, high)} for a range, integers if both bounds are integers, or {param: list} for choices
+    """
+    config = {}
+    for param, values in space.items():
+        if type(values) == list:
+            config[param] = random.choice(values)
+        elif type(values[0]) == int and type(values[1]) == int:
+            config[param] = random.randint(values[0], values[1])
+        else:
+            config[param] = random.uniform(values[0], values[1])
+    return config
+
+
+class RaceTuning():
+
+    """
+    Tune params of ALNS by racing (F-race, as used by irace).
+    Candidate configurations are evaluated block by block, a block is an instance solved with the same seed
+    by all the surviving configurations in parallel worker processes. After firstTest blocks, the ranks of
+    costs in blocks are compared by the Friedman test, and the configurations significantly worse than the
+    best one (Conover's post-hoc test) are eliminated, so the budget is spent on the promising ones.
+    The race stops when one configuration survives, the budget of runs is used up, or maxBlocks is reached.
+    """
+
+    def __init__(
+        self,
+        instances:dict,
+        configurations:list=None,
+        space:dict=None,
+        nConfigs=20,
+        maxExperiments=200,
+        maxBlocks=None,
+        firstTest=5,
+        alpha=0.05,
+        processes=None,
+        printLog=True,
+        **params,
+    ):
+        """
+        instances: {name: EVSP model}, createModel() should be called, e.g. the timetables in Data/
+        configurations: candidate configurations, list of dicts of ALNS params, default are sampled from space
+        space: param space to sample configurations, see sampleConfiguration(), default is defaultSpace
+        nConfigs: number of configurations to sample, the default params of ALNS are one of them
+        maxExperiments: maximum number of ALNS runs
+        maxBlocks: maximum number of blocks, default is not limited
+        firstTest: number of blocks before the first elimination test
+        alpha: significance level of tests
+        processes: number of worker processes, default is the number of CPUs, 1 means solving in the main process
+        params: fixed params of ALNS for all the configurations, e.g. iterMax
+        """
+        if firstTest < 2:
+            raise ValueError("At least 2 blocks are needed before the first test.")
+        self.instances = instances
+        self.configurations = configurations
+        self.space = space if space is not None else defaultSpace
+        self.nConfigs = nConfigs
+        self.maxExperiments = maxExperiments
+        self.maxBlocks = maxBlocks
+        self.firstTest = firstTest
+        self.alpha = alpha
+        self.processes = processes if processes is not None else (os.cpu_count() or 1)
+        self.printLog = printLog
+        self.params = params
+
+        self.bestConfig = None
+        self.results = None  # DataFrame of runs
+        self.summary = None  # DataFrame of configurations
+        self.experiments = 0
+        self.runTime = 0
+
+    def tune(self):
+        """
+        Race the configurations, return the best configuration.
+        """
+        try:
+            from scipy import stats
+        except ImportError:
+            raise ImportError("Race tuning requires SciPy for the statistical tests.")
+
+        tic = timer()
+        if self.configurations is not None:
+            configs = [dict(config) for config in self.configurations]
+        else:
+            defaults = inspect.signature(ALNS).parameters
+            configs = [{param: defaults[param].default for param in self.space}]  # default params of ALNS
+            configs += [sampleConfiguration(self.space) for _ in range(self.nConfigs - 1)]
+        names = list(self.instances.keys())
+        alive = list(range(len(configs)))
+        eliminated = {}  # config: block at which it is eliminated
+        rows = []
+        cost = {}  # (config, block): cost, inf if infeasible
+
+        pool = None
+        if self.processes > 1:
+            pool = ProcessPoolExecutor(max_workers=self.processes, initializer=initTuning, initargs=(self.instances,))
+        else:
+            initTuning(self.instances)
+        try:
+            block = 0
+            while (len(alive) > 1) and (self.experiments + len(alive) <= self.maxExperiments) \
+                    and ((self.maxBlocks is None) or (block < self.maxBlocks)):
+                instance, seed = names[block % len(names)], random.randrange(2**31)
+                args = [(instance, configs[c], self.params, seed) for c in alive]
+                if pool is None:
+                    results = [solveConfiguration(*arg) for arg in args]
+                else:
+                    results = list(pool.map(solveConfiguration, *zip(*args)))
+                self.experiments += len(alive)
+                for c, result in zip(alive, results):
+                    rows.append({'Config': c, 'Block': block, 'Instance': instance, 'Seed': seed, **result})
+                    cost[(c, block)] = result['Cost'] if result['Feasible'] else np.inf
+                block += 1
+
+                # elimination
+                if block >= self.firstTest:
+                    survivors = self.race(stats, alive, [[cost[(c, b)] for c in alive] for b in range(block)])
+                    for c in alive:
+                        if c not in survivors:
+                            eliminated[c] = block
+                    alive = survivors
+                if self.printLog is True:
+                    print("Block %d (%s): %d configurations alive" % (block, instance, len(alive)))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.results = pd.DataFrame(rows, columns=['Config', 'Block', 'Instance', 'Seed', 'Cost', 'Feasible', 'RunTime', 'TimeToBest'])
+        self.summary = self.summarize(configs, alive, eliminated)
+        self.bestConfig = {**self.params, **configs[int(self.summary.index[0])]}
+        self.runTime = timer() - tic
+
+        if self.printLog is True:
+            print("--- Tuning Time: %.2f sec" % (self.runTime))
+            print("--- Experiments: %d" % (self.experiments))
+            print("--- Best Configuration: %s" % (configs[int(self.summary.index[0])]))
+            print("--- Mean Deviation: %.2f%%, Mean Run Time: %.2f sec" % (self.summary.MeanDeviation.iloc[0] * 100, self.summary.MeanRunTime.iloc[0]))
+        return self.bestConfig
+
+    def race(self, stats, alive:list, costs:list):
+        """
+        Eliminate configurations significantly worse than the best one.
+        stats: scipy.stats
+        costs: costs of alive configurations in each block, [[cost of config for config in alive] for block]
+        Return the surviving configurations.
+        """
+        ranks = np.array([stats.rankdata(blockCosts) for blockCosts in costs])  # ranks in each block, ties averaged
+        b, k = ranks.shape
+        R = ranks.sum(axis=0)  # rank sums
+        best = int(np.argmin(R))
+
+        if k == 2:  # paired comparison of two configurations
+            diff = np.nan_to_num(np.array(costs)[:, 0] - np.array(costs)[:, 1], posinf=1e12, neginf=-1e12)
+            if np.all(diff == 0):
+                return alive
+            p = stats.wilcoxon(diff).pvalue
+            return [alive[best]] if p < self.alpha else alive
+
+        # Friedman test
+        A = (ranks ** 2).sum()
+        C = b * k * (k + 1) ** 2 / 4
+        if A - C <= 0:  # all tied
+            return alive
+        T = (k - 1) * ((R - b * (k + 1) / 2) ** 2).sum() / (A - C)
+        if stats.chi2.sf(T, k - 1) >= self.alpha:
+            return alive
+
+        # Conover's post-hoc test against the best configuration
+        df = (b - 1) * (k - 1)
+        critical = stats.t.ppf(1 - self.alpha / 2, df) * np.sqrt(2 * b * (1 - T / (b * (k - 1))) * (A - C) / df)
+        return [c for c, rankSum in zip(alive, R) if rankSum - R[best] <= critical]
+
+    def summarize(self, configs:list, alive:list, eliminated:dict):
+        """
+        Summarize results of configurations, the best one first.
+        Deviation is the relative difference to the best cost of a block, and infeasible runs are excluded.
+        Return a DataFrame indexed by configurations.
+        """
+        results = self.results.copy()
+        feasible = results[results.Feasible]
+        blockBest = feasible.groupby('Block').Cost.min()
+        results['Deviation'] = np.where(results.Feasible, results.Cost / results.Block.map(blockBest) - 1, np.nan)
+        grouped = results.groupby('Config')
+        summary = pd.DataFrame({
+            'Blocks': grouped.size(),
+            'MeanDeviation': grouped.Deviation.mean(),
+            'FeasibleRate': grouped.Feasible.mean(),
+            'MeanRunTime': grouped.RunTime.mean(),
+            'MeanTimeToBest': grouped.TimeToBest.mean(),
+            'Alive': [c in alive for c in grouped.size().index],
+            'EliminatedAt': [eliminated.get(c) for c in grouped.size().index],
+        })
+        summary = summary.join(pd.DataFrame(configs).rename_axis('Config'))
+        return summary.sort_values(['Alive', 'Blocks', 'MeanDeviation'], ascending=[False, False, True])
@@ -1,4 +1,8 @@
+import math
 import random
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from itertools import accumulate
 
 
 """
@@ -17,6 +21,224 @@ score2Add = {
     2: 15,
     3: 30
 }
+maxScore = max(score2Add.values())
+
+
+class SelectionPolicy(ABC):
+
+    """
+    Selection policy of a group of operators, indexed by 0, 1, 2... in the order of registration.
+    A SelectionPolicy object needs functions including
+        add an operator,
+        select an operator,
+        update after each iteration (score & run time of the selected operator),
+        update after each segment,
+        weights of operators (for history & plots).
+    """
+
+    def __init__(self):
+        self.num = 0  # number of operators
+
+    def add(self):
+        """
+        Add an operator.
+        """
+        self.num += 1
+
+    @abstractmethod
+    def select(self):
+        """
+        Return the index of the selected operator.
+        """
+
+    def update(self, index:int, score, runTime):
+        """
+        Update after each iteration.
+        score: score of the result, see score2Add
+        runTime: run time of the operator / sec
+        """
+        pass
+
+    def updateSegment(self):
+        """
+        Update after each segment.
+        """
+        pass
+
+    @abstractmethod
+    def weights(self):
+        """
+        Return weights of operators, list.
+        """
+
+
+class RoulettePolicy(SelectionPolicy):
+
+    """
+    Roulette wheel selection, the adaptive weight of an operator is updated after each segment
+    by its average score in the segment. Cumulative weights are precomputed when weights change,
+    so an operator is selected by one random number and a bisection.
+    """
+
+    def __init__(self, r=0.5):
+        """
+        r: reaction factor when update weights (0,1)
+        """
+        super().__init__()
+        self.r = r
+        self.weight = []
+        self.score = []  # scores in the segment
+        self.time = []  # times of selection in the segment
+        self.cumWeight = []
+
+    def add(self):
+        super().add()
+        self.weight.append(1)
+        self.score.append(0)
+        self.time.append(0)
+        self.cumWeight = list(accumulate(self.weight))
+
+    def select(self):
+        rouletteValue = random.uniform(0, self.cumWeight[-1])  # roulette wheel number
+        return bisect_left(self.cumWeight, rouletteValue)
+
+    def update(self, index:int, score, runTime):
+        self.score[index] += score
+        self.time[index] += 1
+
+    def updateSegment(self):
+        for i in range(self.num):
+            if self.time[i] != 0:
+                self.weight[i] = self.weight[i] * (1 - self.r) + self.r * (self.score[i] / self.time[i])
+        self.score = [0] * self.num
+        self.time = [0] * self.num
+        self.cumWeight = list(accumulate(self.weight))
+
+    def weights(self):
+        return list(self.weight)
+
+
+class RewardPerSecondPolicy(RoulettePolicy):
+
+    """
+    Roulette wheel selection with weights updated by the score per second of run time in the segment,
+    so that cheap operators are preferred when they pay off similarly.
+    """
+
+    def __init__(self, r=0.5):
+        super().__init__(r)
+        self.runTime = []  # run time in the segment
+
+    def add(self):
+        super().add()
+        self.runTime.append(0)
+
+    def update(self, index:int, score, runTime):
+        super().update(index, score, runTime)
+        self.runTime[index] += runTime
+
+    def updateSegment(self):
+        for i in range(self.num):
+            if self.time[i] != 0:
+                self.weight[i] = self.weight[i] * (1 - self.r) + self.r * (self.score[i] / max(self.runTime[i], 1e-6))
+        self.score = [0] * self.num
+        self.time = [0] * self.num
+        self.runTime = [0] * self.num
+        self.cumWeight = list(accumulate(self.weight))
+
+
+class UCBPolicy(SelectionPolicy):
+
+    """
+    UCB1 selection, the operator with the largest upper confidence bound of its average reward is selected,
+    reward is the score scaled to [0, 1]. Operators not selected yet are selected first.
+    """
+
+    def __init__(self, c=math.sqrt(2), decay=1):
+        """
+        c: exploration factor
+        decay: statistics are multiplied by decay after each segment (0,1], older rewards count less if < 1
+        """
+        if not 0 < decay <= 1:
+            raise ValueError("Decay should be in (0, 1].")
+        super().__init__()
+        self.c = c
+        self.decay = decay
+        self.count = []  # number of selections
+        self.reward = []  # sum of rewards
+
+    def add(self):
+        super().add()
+        self.count.append(0)
+        self.reward.append(0)
+
+    def select(self):
+        for i in range(self.num):
+            if self.count[i] == 0:
+                return i
+        logTotal = math.log(max(sum(self.count), 1))  # counts decay below 1 in total
+        bounds = [self.reward[i] / self.count[i] + self.c * math.sqrt(logTotal / self.count[i]) for i in range(self.num)]
+        return max(range(self.num), key=bounds.__getitem__)
+
+    def update(self, index:int, score, runTime):
+        self.count[index] += 1
+        self.reward[index] += score / maxScore
+
+    def updateSegment(self):
+        if self.decay < 1:
+            self.count = [n * self.decay for n in self.count]
+            self.reward = [v * self.decay for v in self.reward]
+
+    def weights(self):
+        return [self.reward[i] / self.count[i] if self.count[i] > 0 else 0 for i in range(self.num)]
+
+
+class ThompsonPolicy(SelectionPolicy):
+
+    """
+    Thompson sampling, the reward (score scaled to [0, 1]) of an operator is modeled by a Beta distribution,
+    and the operator with the largest sample is selected.
+    """
+
+    def __init__(self, decay=1):
+        """
+        decay: posterior params are shrunk toward the prior after each segment (0,1], older rewards count less if < 1
+        """
+        if not 0 < decay <= 1:
+            raise ValueError("Decay should be in (0, 1].")
+        super().__init__()
+        self.decay = decay
+        self.alpha = []
+        self.beta = []
+
+    def add(self):
+        super().add()
+        self.alpha.append(1)
+        self.beta.append(1)
+
+    def select(self):
+        samples = [random.betavariate(self.alpha[i], self.beta[i]) for i in range(self.num)]
+        return max(range(self.num), key=samples.__getitem__)
+
+    def update(self, index:int, score, runTime):
+        self.alpha[index] += score / maxScore
+        self.beta[index] += 1 - score / maxScore
+
+    def updateSegment(self):
+        if self.decay < 1:
+            self.alpha = [1 + (a - 1) * self.decay for a in self.alpha]
+            self.beta = [1 + (b - 1) * self.decay for b in self.beta]
+
+    def weights(self):
+        return [self.alpha[i] / (self.alpha[i] + self.beta[i]) for i in range(self.num)]
+
+
+policies = {
+    'roulette': RoulettePolicy,
+    'rewardPerSecond': RewardPerSecondPolicy,
+    'ucb': UCBPolicy,
+    'thompson': ThompsonPolicy,
+}
 
 
 class Weights():
@@ -24,91 +246,116 @@ class Weights():
     """
     Weights of operators.
     A Weights object needs functions including
-        initialize, 
-        update scores, 
+        register operators,
+        update scores,
         update weights,
         select operators.
+    Operators are selected by a selection policy for remove and insert operators respectively.
     """
 
     def __init__(
         self,
         r,
-        removeOperators:dict,
-        insertOperators:dict,
+        removeOperators:dict=None,
+        insertOperators:dict=None,
+        policy='roulette',
     ):
         """
         A Weights object can record selection state and weights.
+        r: reaction factor when update weights of roulette policies (0,1)
+        removeOperators, insertOperators: operators to register, {key: function}, registered in the order of keys
+        policy: selection policy, 'roulette', 'rewardPerSecond', 'ucb', 'thompson',
+                or a function returning a new SelectionPolicy object
         """
+        if (policy not in policies) and (not callable(policy)):
+            raise ValueError("Policy should be one of %s or a function returning a SelectionPolicy object." % list(policies.keys()))
         self.r = r  # control param when update weights
+        self.policy = policy
         self.removeSelection = 0
         self.insertSelection = 0
-        self.removeOperators = removeOperators
-        self.insertOperators = insertOperators
+        self.removeOperators = {}  # {key: operator}, keys start from 1
+        self.insertOperators = {}
+        self.removePolicy = self.newPolicy()
+        self.insertPolicy = self.newPolicy()
+        self.historyWeightR = {}
+        self.historyWeightI = {}
 
-        self.weightRemove = {i:1 for i in removeOperators.keys()}
-        self.weightInsert = {i:1 for i in insertOperators.keys()}
-        self.scoreRemove = {i:0 for i in removeOperators.keys()}
-        self.scoreInsert = {i:0 for i in insertOperators.keys()}
-        self.timeRemove = {i:0 for i in removeOperators.keys()}
-        self.timeInsert = {i:0 for i in insertOperators.keys()}
-        self.historyWeightR = {i:[1] for i in removeOperators.keys()}
-        self.historyWeightI = {i:[1] for i in insertOperators.keys()}
+        for k in sorted(removeOperators.keys()) if removeOperators is not None else []:
+            self.addRemoveOperator(removeOperators[k])
+        for k in sorted(insertOperators.keys()) if insertOperators is not None else []:
+            self.addInsertOperator(insertOperators[k])
 
-    def updateTimeAndScores(self, result:int):
+    def newPolicy(self):
+        """
+        Return a new SelectionPolicy object.
+        """
+        if self.policy in ['roulette', 'rewardPerSecond']:
+            return policies[self.policy](self.r)
+        elif self.policy in policies:
+            return policies[self.policy]()
+        else:
+            return self.policy()
+
+    def addRemoveOperator(self, operator):
+        """
+        Register a remove operator, (evsp, schedule, n) -> (tripBank, removedSchedule).
+        Return the key of the operator.
+        """
+        k = len(self.removeOperators) + 1
+        self.removeOperators[k] = operator
+        self.removePolicy.add()
+        self.historyWeightR[k] = [self.removePolicy.weights()[-1]]
+        return k
+
+    def addInsertOperator(self, operator):
+        """
+        Register an insert operator,
+        (evsp, tripBank, schedule, enePenalty, capPenalty, chargeProb, evaluated) -> (cost, schedule, isFeasible).
+        Return the key of the operator.
+        """
+        k = len(self.insertOperators) + 1
+        self.insertOperators[k] = operator
+        self.insertPolicy.add()
+        self.historyWeightI[k] = [self.insertPolicy.weights()[-1]]
+        return k
+
+    @property
+    def weightRemove(self):
+        return dict(zip(self.removeOperators.keys(), self.removePolicy.weights()))
+
+    @property
+    def weightInsert(self):
+        return dict(zip(self.insertOperators.keys(), self.insertPolicy.weights()))
+
+    def updateTimeAndScores(self, result:int, removeTime=0, insertTime=0):
         """
         Update scores after each interation.
+        removeTime, insertTime: run time of the selected operators / sec
         """
-        self.scoreRemove[self.removeSelection] += score2Add[result]
-        self.scoreInsert[self.insertSelection] += score2Add[result]
-        self.timeRemove[self.removeSelection] += 1
-        self.timeInsert[self.insertSelection] += 1
+        self.removePolicy.update(self.removeSelection - 1, score2Add[result], removeTime)
+        self.insertPolicy.update(self.insertSelection - 1, score2Add[result], insertTime)
 
     def updateWeights(self):
         """
         Update weights after each segment.
         """
-        for i in self.weightRemove.keys():
-            if self.timeRemove[i] == 0:
-                self.historyWeightR[i].append(self.weightRemove[i])
-            else:
-                self.weightRemove[i] = self.weightRemove[i] * (1 - self.r) + self.r * (self.scoreRemove[i] / self.timeRemove[i])
-                self.historyWeightR[i].append(self.weightRemove[i])
-       
-        for i in self.weightInsert.keys():
-            if self.timeInsert[i] == 0:
-                self.historyWeightI[i].append(self.weightInsert[i])
-            else:
-                self.weightInsert[i] = self.weightInsert[i] * (1 - self.r) + self.r * (self.scoreInsert[i] / self.timeInsert[i])
-                self.historyWeightI[i].append(self.weightInsert[i])
-
-        self.scoreRemove = {i:0 for i in self.removeOperators.keys()}
-        self.scoreInsert = {i:0 for i in self.insertOperators.keys()}
-        self.timeRemove = {i:0 for i in self.removeOperators.keys()}
-        self.timeInsert = {i:0 for i in self.insertOperators.keys()}
-    
+        self.removePolicy.updateSegment()
+        self.insertPolicy.updateSegment()
+        for k, w in self.weightRemove.items():
+            self.historyWeightR[k].append(w)
+        for k, w in self.weightInsert.items():
+            self.historyWeightI[k].append(w)
+
     def selectRemoveOperator(self):
         """
-        Select operators according to weights.
-        """
-        cumWeights = {i:sum([self.weightRemove[n] for n in self.weightRemove.keys() if n <= i]) for i in self.weightRemove.keys()}  # cumulative probability
-        rouletteValue = random.uniform(0, max(cumWeights.values()))  # roulette wheel number
-        for k in self.weightRemove.keys():
-            if cumWeights[k] >= rouletteValue:
-                operator = self.removeOperators[k]
-                self.removeSelection = k
-                break
-        return operator
-        
+        Select operators according to the policy.
+        """
+        self.removeSelection = self.removePolicy.select() + 1
+        return self.removeOperators[self.removeSelection]
+
     def selectInsertOperator(self):
         """
-        Select operators according to weights.
-        """
-        cumWeights = {i:sum([self.weightInsert[n] for n in self.weightInsert.keys() if n <= i]) for i in self.weightInsert.keys()}  # cumulative probability
-        rouletteValue = random.uniform(0, max(cumWeights.values()))  # roulette wheel number
-        for k in self.weightInsert.keys():
-            if cumWeights[k] >= rouletteValue:
-                operator = self.insertOperators[k]
-                self.insertSelection = k
-                break
-        return operator
-    
\ No newline at end of file
+        Select operators according to the policy.
+        """
+        self.insertSelection = self.insertPolicy.select() + 1
+        return self.insertOperators[self.insertSelection]
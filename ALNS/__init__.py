@@ -1,8 +1,14 @@
-from .InitialSolution import initialize, initialize_nightCharge
+from .InitialSolution import initialize, initialize_nightCharge, initialize_minFleet, initialize_warmStart
 from .ALNS import ALNS
 from .RemoveOperators import randomRemoval, timeRelatedRemoval, neighborRemoval
 from .InsertOperators import randomInsert, greedyInsert
-# from .PostOptimize import postOptimize
+from .PostOptimize import postOptimize
+from .Decomposition import DecomposedALNS
+from .RollingHorizon import RollingHorizonALNS
+from .Disruption import DisruptionRepair
+from .Sweep import scenarioSweep
+from .Tuning import RaceTuning
+from .Service import SolverService
 
 
 """
@@ -0,0 +1,48 @@
+"""
+@author: Chen Qiuzi
+Import time benchmark of the solver core.
+Each module is imported in a fresh interpreter, and the time of the import statement is measured.
+Plotting libraries should not be imported by the solver core.
+
+Run from the root of the repository:
+    python Benchmark/importTime.py
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+script = """
+import sys, json
+from timeit import default_timer as timer
+tic = timer()
+import %s
+toc = timer()
+print(json.dumps({'time': toc - tic, 'lazy': [m for m in ['matplotlib', 'tqdm'] if m not in sys.modules]}))
+"""
+
+
+def importTime(module, repeat=5):
+    """
+    Import a module in fresh interpreters.
+    Return (median import time / sec, modules not imported among matplotlib & tqdm).
+    """
+    times, lazy = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', script % module], cwd=root, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result['time'])
+        lazy = result['lazy']
+    return statistics.median(times), lazy
+
+
+if __name__ == '__main__':
+    print("%-20s %10s   %s" % ("Module", "Time / ms", "Not imported"))
+    for module in ['pandas', 'matplotlib.pyplot', 'EVSPModel', 'ALNS']:
+        time, lazy = importTime(module)
+        print("%-20s %10.1f   %s" % (module, time * 1000, ", ".join(lazy)))
@@ -0,0 +1,127 @@
+from EVSPModel.EvaluatorClass import getEvaluator
+
+import numpy as np
+import pandas as pd
+
+
+"""
+@author: Chen Qiuzi
+This Python file includes headless analytics of a schedule, results are returned as arrays or DataFrames
+without plotting, and are computed from the batched evaluation of duties (see Evaluator).
+"""
+
+
+def chargingEvents(schedule):
+    """
+    Collect charging events of a schedule.
+    Return (duty index, node position, time division index, charging volume), arrays with one value per event,
+    time division index is the index in evsp.R.
+    """
+    if not schedule.schedule:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    evaluator = getEvaluator(schedule.evsp)
+    _K, nodes, slots, length = evaluator.pack(schedule.schedule)
+    chargeVolume = evaluator.evaluate(schedule.schedule)['chargeVolume']
+    valid = np.arange(nodes.shape[1]-1)[None, :] < (length[:, None] - 1)
+    rows, cols = np.nonzero(evaluator.isCharge[nodes[:, :-1]] & valid)
+    return rows, cols, slots[rows, cols], chargeVolume[rows, cols]
+
+
+def chargerOccupancy(schedule):
+    """
+    Number of vehicles being charged in each time division, a charging event occupies U time divisions.
+    Return a DataFrame indexed by time divisions, columns:
+        StartTime: start time of the division / min
+        Starts: number of charging events starting in the division
+        Occupancy: number of vehicles being charged in the division
+    """
+    evsp = schedule.evsp
+    _rows, _cols, slots, _volume = chargingEvents(schedule)
+    starts = np.bincount(slots, minlength=len(evsp.R))
+    cumStarts = np.cumsum(starts)
+    occupancy = cumStarts - np.concatenate([np.zeros(evsp.U, dtype=int), cumStarts[:-evsp.U]])[:len(starts)]
+    return pd.DataFrame({
+        'StartTime': getEvaluator(evsp).s_slot,
+        'Starts': starts,
+        'Occupancy': occupancy,
+    }, index=pd.Index(evsp.R, name='TimeDivision'))
+
+
+def chargingPower(schedule, interval=None, start=300, end=1620):
+    """
+    Charging volume and average charging power at the station in time buckets.
+    A charging event is counted in the bucket containing the start of its time division.
+    interval: length of buckets / min, default is the charging duration U*delta
+    start, end: time range of buckets / min
+    Return a DataFrame indexed by buckets, columns:
+        StartTime: start time of the bucket / min
+        ChargingVolume: charging volume of events starting in the bucket / kWh
+        Power: average charging power in the bucket / kW·h per min
+    """
+    evsp = schedule.evsp
+    if interval is None:
+        interval = evsp.U * evsp.delta
+    bucketStart = np.arange(start, end, interval)
+    _rows, _cols, slots, volume = chargingEvents(schedule)
+    t = getEvaluator(evsp).s_slot[slots]
+    inRange = (t >= start) & (t < bucketStart[-1] + interval)
+    bucket = ((t[inRange] - start) // interval).astype(int)
+    chargingVolume = np.bincount(bucket, weights=volume[inRange], minlength=len(bucketStart))
+    return pd.DataFrame({
+        'StartTime': bucketStart,
+        'ChargingVolume': chargingVolume,
+        'Power': chargingVolume / interval,
+    })
+
+
+def socTraces(schedule):
+    """
+    SOC of each bus along its trip chain.
+    Return a DataFrame with a row for each node of each duty, columns:
+        Duty: index of the duty in the schedule
+        Position: position of the node in the trip chain
+        Node: trip or charging node, 'o' or 'd'
+        Time: start time of the trip or charging event / min, nan for 'o' & 'd'
+        SOC: SOC at the beginning of the node
+    """
+    columns = ['Duty', 'Position', 'Node', 'Time', 'SOC']
+    if not schedule.schedule:
+        return pd.DataFrame(columns=columns)
+    evaluator = getEvaluator(schedule.evsp)
+    K, nodes, slots, length = evaluator.pack(schedule.schedule)
+    m, L = nodes.shape
+    energy = evaluator.evaluate(schedule.schedule)['energy']
+    soc = np.hstack([np.ones((m, 1)), energy / evaluator.E_k[K][:, None]])  # full at 'o'
+    time = np.where(evaluator.isCharge[nodes], evaluator.s_slot[slots], evaluator.s_node[nodes])
+    valid = np.arange(L)[None, :] < length[:, None]
+    rows, cols = np.nonzero(valid)
+    return pd.DataFrame({
+        'Duty': rows,
+        'Position': cols,
+        'Node': [s for duty in schedule.schedule for s in duty.S],
+        'Time': time[rows, cols],
+        'SOC': soc[rows, cols],
+    }, columns=columns)
+
+
+def costBreakdown(schedule):
+    """
+    Cost composition of each duty.
+    Return a DataFrame with a row for each duty, columns:
+        VehicleType, VehicleCost, TimeCost, ChargingCost, TotalCost, MinSOC, EnergyFeasibility
+    Cost items not considered (see EVSP.setCosts) are 0, totals are the same as Schedule.evaluate().
+    """
+    evsp = schedule.evsp
+    columns = ['VehicleType', 'VehicleCost', 'TimeCost', 'ChargingCost', 'TotalCost', 'MinSOC', 'EnergyFeasibility']
+    if not schedule.schedule:
+        return pd.DataFrame(columns=columns)
+    result = getEvaluator(evsp).evaluate(schedule.schedule)
+    return pd.DataFrame({
+        'VehicleType': [duty.K for duty in schedule.schedule],
+        'VehicleCost': result['vehicleCost'],
+        'TimeCost': result['timeCost'],
+        'ChargingCost': result['chargingCost'],
+        'TotalCost': result['totalCost'],
+        'MinSOC': result['minSOC'],
+        'EnergyFeasibility': result['energyFeasibility'],
+    }, columns=columns)
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+class LRUCache():
+
+    """
+    A LRUCache object is a bounded LRU cache of evaluation results.
+    It is used to cache evaluated duties (see EVSP.dutyCache), where keys are
+    (vehicle type, trip chain tuple, charging time divisions tuple) and values are cost components &
+    energy feasibility of a duty, or the best vehicle type of a trip chain,
+    and evaluated schedules in ALNS, where keys are schedule fingerprints.
+    The least recently used entry is discarded when the cache is full.
+    """
+
+    __slots__ = ['maxSize','cache','hits','misses']
+
+    def __init__(self, maxSize=20000):
+        """
+        maxSize: maximum number of entries, 0 means caching is disabled
+        """
+        self.maxSize = maxSize
+        self.cache = OrderedDict()
+        self.hits = 0  # number of lookups answered by the cache
+        self.misses = 0  # number of lookups need to be evaluated
+
+    def get(self, key):
+        """
+        Return the value of key, None if key is not cached.
+        """
+        value = self.cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.cache.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Cache the value of key.
+        """
+        if self.maxSize <= 0:
+            return
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.maxSize:
+            self.cache.popitem(last=False)
+
+    def hitRate(self):
+        """
+        Return the ratio of lookups answered by the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def clear(self):
+        """
+        Discard all the entries and reset counters.
+        """
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
@@ -1,5 +1,7 @@
 from EVSPModel.EVSPClass import EVSP
 
+import numpy as np
+
 
 """
 @author: Chen Qiuzi
@@ -40,3 +42,35 @@ def calCharge(evsp:EVSP, k, y0):
             interval = [i for i in B[:-1] if c_b[i]<= c1 <c_b[i+1]][0]
             a1 = (c1 - c_b[interval]) * rate[interval] + a_b[interval]
             return (a1 - a0) * E  # kWh
+
+
+def calChargeArray(evsp:EVSP, k, y0):
+    """
+    Calculate charging volumes of several recharging activities of vehicle type k at once.
+    y0: array of origin battery levels, kWh
+    Same results as calCharge applied element-wise.
+    """
+    y0 = np.asarray(y0, dtype=float)
+    duration = evsp.U * evsp.delta
+    if evsp.chargingFuncType == 'linear':
+        return np.minimum(evsp.E_k[k] - y0, evsp.v_k[k] * duration)
+    else:
+        E = evsp.E_k[k]
+        a_b = np.asarray(evsp.a_kb[k], dtype=float)  # soc of break points / 1
+        c_b = np.asarray(evsp.c_kb[k], dtype=float)  # time of break points / min
+        m = len(a_b)
+        a0 = y0/E  # origin soc
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.diff(a_b) / np.diff(c_b)
+
+        # origin time, the first break point is taken if a0 is a break point
+        left = np.minimum(np.searchsorted(a_b, a0, side='left'), m-1)
+        interval = np.clip(np.searchsorted(a_b, a0, side='right')-1, 0, m-2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c0 = np.where(a_b[left]==a0, c_b[left], (a0 - a_b[interval]) / rate[interval] + c_b[interval])
+        # energy infeasible condition
+        c0 = np.where(a0 < 0, - a0 / rate[0], c0)
+
+        c1 = c0 + duration
+        a1 = np.interp(c1, c_b, a_b)
+        return (a1 - a0) * E  # kWh
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+class Deadhead():
+
+    """
+    A Deadhead object resolves the attribute (time or energy) of a deadhead arc (i,j)
+    by indexing into a terminal x terminal matrix instead of storing one value per arc.
+    The deadhead of arc (i,j) starts at the terminal where node i ends and finishes at
+    the terminal where node j starts.
+    """
+
+    __slots__ = ['matrix','fromTerminal','toTerminal']
+
+    def __init__(self, matrix, fromTerminal:dict, toTerminal:dict):
+        """
+        matrix: terminal x terminal matrix, matrix[a][b] is the value from terminal a to terminal b
+        fromTerminal: dict, node -> terminal where the node ends (tail of an arc)
+        toTerminal: dict, node -> terminal where the node starts (head of an arc)
+        """
+        self.matrix = np.asarray(matrix, dtype=float).tolist()  # nested list for fast scalar indexing
+        self.fromTerminal = fromTerminal
+        self.toTerminal = toTerminal
+
+    def __getitem__(self, arc):
+        i, j = arc
+        return self.matrix[self.fromTerminal[i]][self.toTerminal[j]]
+
+    def __contains__(self, arc):
+        i, j = arc
+        return (i in self.fromTerminal) and (j in self.toTerminal)
+
+    def get(self, arc, default=None):
+        if arc in self:
+            return self[arc]
+        else:
+            return default
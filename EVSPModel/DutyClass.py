@@ -1,7 +1,9 @@
 from EVSPModel.EVSPClass import EVSP
 from EVSPModel.Calculations import calCharge
 
-from copy import deepcopy
+from array import array
+from itertools import chain
+from collections.abc import MutableSequence, MutableMapping
 
 
 """
@@ -9,15 +11,253 @@ from copy import deepcopy
 """
 
 
+# Nodes are stored as int codes: trip i -> i, charging node 'fi' -> -i, 'o' -> 0, 'd' -> 2**31-1.
+# Charging time divisions are stored as int codes: 'rj' -> j, no charging time -> -1, None -> -2.
+_origin = 0
+_destination = 2**31 - 1
+_unassigned = -1
+_missing = object()
+
+
+class _NodeLabels(dict):
+    """
+    Labels of node codes, filled when a code is first decoded.
+    """
+    def __missing__(self, code):
+        label = code if code > 0 else "f%d" % -code
+        self[code] = label
+        return label
+
+
+class _SlotLabels(dict):
+    """
+    Labels of time division codes, filled when a code is first decoded.
+    """
+    def __missing__(self, code):
+        label = "r%d" % code
+        self[code] = label
+        return label
+
+
+_nodeLabels = _NodeLabels({_origin: 'o', _destination: 'd'})
+_slotLabels = _SlotLabels({-2: None})
+_nodeCodes = {'o': _origin, 'd': _destination}
+_slotCodes = {None: -2}
+
+
+def encodeNode(s):
+    """
+    Return the int code of node s.
+    """
+    code = _nodeCodes.get(s, s)
+    if type(code) == int:
+        return code
+    if type(code) != str:
+        return int(code)
+    if s[:1] != 'f':
+        raise ValueError("Unknown node %s." % s)
+    code = _nodeCodes[s] = -int(s[1:])
+    return code
+
+
+def encodeSlot(r):
+    """
+    Return the int code of time division r.
+    """
+    code = _slotCodes.get(r)
+    if code is None:
+        if r[:1] != 'r':
+            raise ValueError("Unknown time division %s." % r)
+        code = _slotCodes[r] = int(r[1:])
+    return code
+
+
+class NodeView(MutableSequence):
+
+    """
+    Trip chain of a duty as a list of nodes, backed by the node buffer of the duty.
+    The slot of a charging node is kept in the charging time of the duty when the node is deleted,
+    and is taken back when the node is inserted again.
+    """
+
+    __slots__ = ['duty']
+
+    def __init__(self, duty):
+        self.duty = duty
+
+    def __len__(self):
+        return len(self.duty.nodes)
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return list(map(_nodeLabels.__getitem__, self.duty.nodes[index]))
+        return _nodeLabels[self.duty.nodes[index]]
+
+    def __iter__(self):
+        return map(_nodeLabels.__getitem__, self.duty.nodes)
+
+    def __contains__(self, s):
+        try:
+            return encodeNode(s) in self.duty.nodes
+        except (TypeError, ValueError):
+            return False
+
+    def index(self, s, start=0, stop=2**31):
+        try:
+            return self.duty.nodes.index(encodeNode(s), start, stop)
+        except (TypeError, ValueError):
+            raise ValueError("%s is not in trip chain" % s)
+
+    def count(self, s):
+        try:
+            return self.duty.nodes.count(encodeNode(s))
+        except (TypeError, ValueError):
+            return 0
+
+    def __setitem__(self, index, s):
+        if type(index) == slice:
+            S = list(self)
+            S[index] = s
+            self.duty.S = S
+        else:
+            del self[index]
+            self.insert(index if index >= 0 else len(self) + 1 + index, s)
+
+    def __delitem__(self, index):
+        duty = self.duty
+        if type(index) == slice:
+            S = list(self)
+            del S[index]
+            duty.S = S
+            return
+        code, slot = duty.nodes[index], duty.slots[index]
+        if slot != _unassigned:  # charging time kept without the node
+            if duty.detached is None:
+                duty.detached = {}
+            duty.detached[_nodeLabels[code]] = _slotLabels[slot]
+        del duty.nodes[index]
+        del duty.slots[index]
+        duty.key = None
+
+    def insert(self, index, s):
+        duty = self.duty
+        code = encodeNode(s)
+        slot = _unassigned
+        if (code < 0) and duty.detached:
+            r = duty.detached.pop(s, _missing)
+            if r is not _missing:
+                slot = encodeSlot(r)
+        duty.nodes.insert(index, code)
+        duty.slots.insert(index, slot)
+        duty.key = None
+
+    def __eq__(self, other):
+        return list(self) == (list(other) if isinstance(other, (NodeView, list, tuple)) else other)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ChargingView(MutableMapping):
+
+    """
+    Charging time of a duty as a dict {charging node: time division}, backed by the slot buffer of the duty.
+    Charging time of nodes not in the trip chain is kept in a small dict of the duty.
+    """
+
+    __slots__ = ['duty']
+
+    def __init__(self, duty):
+        self.duty = duty
+
+    def position(self, f):
+        """
+        Return the position of charging node f in the trip chain, None if not exist.
+        """
+        try:
+            code = encodeNode(f)
+            return self.duty.nodes.index(code) if code < 0 else None
+        except (TypeError, ValueError):
+            return None
+
+    def __getitem__(self, f):
+        duty = self.duty
+        pos = self.position(f)
+        if (pos is not None) and (duty.slots[pos] != _unassigned):
+            return _slotLabels[duty.slots[pos]]
+        if duty.detached:
+            return duty.detached[f]
+        raise KeyError(f)
+
+    def __setitem__(self, f, r):
+        duty = self.duty
+        pos = self.position(f)
+        if pos is None:
+            if duty.detached is None:
+                duty.detached = {}
+            duty.detached[f] = r
+        else:
+            duty.slots[pos] = encodeSlot(r)
+            duty.key = None
+
+    def __delitem__(self, f):
+        duty = self.duty
+        pos = self.position(f)
+        if (pos is not None) and (duty.slots[pos] != _unassigned):
+            duty.slots[pos] = _unassigned
+            duty.key = None
+        elif duty.detached and (f in duty.detached):
+            del duty.detached[f]
+        else:
+            raise KeyError(f)
+
+    def __iter__(self):
+        duty = self.duty
+        attached = (_nodeLabels[code] for code, slot in zip(duty.nodes, duty.slots) if slot != _unassigned)
+        return chain(attached, duty.detached) if duty.detached else attached
+
+    def __len__(self):
+        duty = self.duty
+        return len(duty.slots) - duty.slots.count(_unassigned) + (len(duty.detached) if duty.detached else 0)
+
+    def __contains__(self, f):
+        duty = self.duty
+        pos = self.position(f)
+        if (pos is not None) and (duty.slots[pos] != _unassigned):
+            return True
+        return bool(duty.detached) and (f in duty.detached)
+
+    def items(self):
+        duty = self.duty
+        attached = [(_nodeLabels[code], _slotLabels[slot]) for code, slot in zip(duty.nodes, duty.slots) if slot != _unassigned]
+        return attached + list(duty.detached.items()) if duty.detached else attached
+
+    def values(self):
+        return [r for _f, r in self.items()]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class Duty():
 
     """
     A duty is schedule for a single vehicle.
     It contains information of its vehicle type, trip chain and charging time assignment.
     A feasible duty should not violate the energy constraint.
+    The trip chain and charging time are stored compactly in two parallel int buffers (array('i')),
+    node codes and time division codes of the nodes, so copying a duty is a buffer copy. S (list of nodes)
+    and R (dict of charging time) are views of the buffers, the cache key of the duty is cached until the
+    buffers are changed. Duties are mutable and compared by identity, contents are compared by cacheKey().
     """
     
-    __slots__ = ['K','S','R','vehicleCost','timeCost','chargingCost','totalCost','evsp']
+    __slots__ = ['K','nodes','slots','detached','key','vehicleCost','timeCost','chargingCost','totalCost','evsp']
 
 
     def __init__(self, evsp:EVSP, type=1, tripChain=[], chargingTime={}) -> None:
@@ -28,78 +268,191 @@ class Duty():
         chargingTime: charging time assignment, dict
         """
         self.K = type  # vehicle type
-        self.S = tripChain  # trip chain
-        self.R = chargingTime  # charging time of charging events in the trip chain
+        self.nodes = array('i')  # codes of nodes in the trip chain
+        self.slots = array('i')  # codes of charging time of nodes, -1 if not a charging node
+        self.detached = None  # charging time of charging nodes not in the trip chain
+        self.key = None  # cached cache key
+        self.setChain(tripChain, chargingTime)
         self.vehicleCost = 0  # initial vehicle cost
         self.timeCost = 0  # initial time-related cost
         self.chargingCost = 0  # initial charging cost
         self.totalCost = 0  # initial total cost
         self.evsp = evsp
 
+    def setChain(self, tripChain, chargingTime):
+        """
+        Set the trip chain and charging time of the duty.
+        """
+        charging = dict(chargingTime.items())
+        try:  # known labels are encoded at C level, trips are codes themselves
+            nodes = array('i', map(_nodeCodes.get, tripChain, tripChain))
+        except TypeError:
+            nodes = array('i', map(encodeNode, tripChain))
+        slots = array('i', [_unassigned]) * len(nodes)
+        for f in list(charging):
+            code = encodeNode(f)
+            if code in nodes:
+                slots[nodes.index(code)] = encodeSlot(charging.pop(f))
+        self.nodes = nodes
+        self.slots = slots
+        self.detached = charging if charging else None
+        self.key = None
+
+    def removeNodes(self, nodes):
+        """
+        Remove nodes from the trip chain, charging time of removed charging nodes is kept in R.
+        nodes: nodes to remove, set or list
+        Return True if any node is removed.
+        """
+        codes = set(map(encodeNode, nodes))
+        if codes.isdisjoint(self.nodes):
+            return False
+        keep = [pos for pos, code in enumerate(self.nodes) if code not in codes]
+        for pos, code in enumerate(self.nodes):
+            if (code in codes) and (self.slots[pos] != _unassigned):
+                if self.detached is None:
+                    self.detached = {}
+                self.detached[_nodeLabels[code]] = _slotLabels[self.slots[pos]]
+        self.nodes = array('i', [self.nodes[pos] for pos in keep])
+        self.slots = array('i', [self.slots[pos] for pos in keep])
+        self.key = None
+        return True
+
+    @property
+    def S(self):
+        """
+        Trip chain, list of nodes.
+        """
+        return NodeView(self)
+
+    @S.setter
+    def S(self, tripChain):
+        self.setChain(tripChain, self.R)
+
+    @property
+    def R(self):
+        """
+        Charging time of charging events in the trip chain, dict.
+        """
+        return ChargingView(self)
+
+    @R.setter
+    def R(self, chargingTime):
+        self.setChain(self.S, chargingTime)
+
     def __deepcopy__(self, memodict={}):
         """
         For deepcopy.
         """
-        info = Duty(self.evsp)
-        info.K = deepcopy(self.K)
-        info.S = [i for i in self.S]
-        info.R = {f:r for f,r in self.R.items()}
+        return self.copy()
+
+    def copy(self):
+        """
+        Return a copy of the duty, buffers are copied.
+        """
+        info = Duty.__new__(Duty)
+        info.K = self.K
+        info.nodes = self.nodes[:]
+        info.slots = self.slots[:]
+        info.detached = dict(self.detached) if self.detached else None
+        info.key = self.key
+        info.vehicleCost = 0
+        info.timeCost = 0
+        info.chargingCost = 0
+        info.totalCost = 0
+        info.evsp = self.evsp
         return info
 
+    def cacheKey(self, k=None):
+        """
+        Return the key of the duty in the duty cache: (vehicle type, bytes of node buffer, bytes of slot buffer).
+        k: vehicle type, default is the type of the duty
+        """
+        key = self.key
+        if (key is None) or (key[0] != self.K):
+            key = self.key = (self.K, self.nodes.tobytes(), self.slots.tobytes())
+        return key if k is None else (k, key[1], key[2])
+
+    def fingerprint(self):
+        """
+        Return the hash of the duty, including vehicle type, trip chain and charging time divisions.
+        """
+        return hash(self.cacheKey())
+
     def checkEnergyFeasibility(self):
         """
         Return True if a duty can meet the energy constraint, else False.
         """
-        feasibility = True
-
-        y = self.evsp.E_k[self.K]  # remaining energy at the beginning of each node
-        for i, s in enumerate(self.S[:-1]):
-            
-            if s in self.evsp.F:
-                chargeVolume = calCharge(self.evsp, self.K, y)
-                y = y + chargeVolume - self.evsp.e_kij[self.K][(s,self.S[i+1])]
-            else:
-                y = y - self.evsp.e_ki[self.K][s] - self.evsp.e_kij[self.K][(s,self.S[i+1])]
+        key = self.cacheKey()
+        cached = self.evsp.dutyCache.get(key)
+        if cached is None:
+            cached = self.calCostAndFeasibility(key)
+        return cached[4]
 
-            if y < self.evsp.batteryLB * self.evsp.E_k[self.K]:  # if battery level less than the safe level
-                feasibility = False
-                break
-        return feasibility
+    def calEnergyViolation(self):
+        """
+        Return the energy below the safe battery level at the lowest point of the duty / kWh, 0 if feasible.
+        """
+        key = self.cacheKey()
+        cached = self.evsp.dutyCache.get(key)
+        if cached is None:
+            cached = self.calCostAndFeasibility(key)
+        return cached[5]
     
     def calCost(self):
         """
         Calculate the cost of a duty.
         """
-        self.vehicleCost = 0  # initialize whenever a new cost calculation procedure is performed
-        self.timeCost = 0
-        self.chargingCost = 0
-        self.totalCost = 0
+        key = self.cacheKey()
+        cached = self.evsp.dutyCache.get(key)
+        if cached is None:
+            cached = self.calCostAndFeasibility(key)
+        self.vehicleCost, self.timeCost, self.chargingCost, self.totalCost = cached[:4]
+        return self.totalCost
+
+    def calCostAndFeasibility(self, key):
+        """
+        Calculate the cost and check the energy feasibility of a duty in one pass, and cache the result.
+        key: cache key of the duty
+        Return (vehicleCost, timeCost, chargingCost, totalCost, feasibility, energy violation).
+        """
+        vehicleCost = 0
+        timeCost = 0
+        chargingCost = 0
+        feasibility = True
+        violation = 0  # energy below the safe level at the lowest point
         
         # time and charging cost
-        y = self.evsp.E_k[self.K]
-        for i,s in enumerate(self.S[:-1]):
+        y = self.evsp.E_k[self.K]  # remaining energy at the beginning of each node
+        yLB = self.evsp.batteryLB * self.evsp.E_k[self.K]  # safe battery level
+        S = list(self.S)
+        for i,s in enumerate(S[:-1]):
 
             # time cost
-            self.timeCost += (self.evsp.t_ij[(s, self.S[i+1])] + self.evsp.t_i[s]) * self.evsp.c_t
+            timeCost += (self.evsp.t_ij[(s, S[i+1])] + self.evsp.t_i[s]) * self.evsp.c_t
             if s in self.evsp.F:
                 # charging cost
                 chargeVolume = calCharge(self.evsp, self.K, y)
-                self.chargingCost += chargeVolume * self.evsp.c_e[self.R[s]] 
-                y = y + chargeVolume - self.evsp.e_kij[self.K][(s,self.S[i+1])]
+                chargingCost += chargeVolume * self.evsp.c_e[_slotLabels[self.slots[i]]]
+                y = y + chargeVolume - self.evsp.e_kij[self.K][(s,S[i+1])]
             else:
-                y = y - self.evsp.e_ki[self.K][s] - self.evsp.e_kij[self.K][(s,self.S[i+1])]
+                y = y - self.evsp.e_ki[self.K][s] - self.evsp.e_kij[self.K][(s,S[i+1])]
+
+            if y < yLB:  # if battery level less than the safe level
+                feasibility = False
+                violation = max(violation, yLB - y)
         
         # charged to full after daily operation
-        self.chargingCost += (self.evsp.E_k[self.K] - y) * min(self.evsp.c_e.values())
+        chargingCost += (self.evsp.E_k[self.K] - y) * min(self.evsp.c_e.values())
 
         # vehicle cost
         if self.evsp.calVehCost == True:
-            self.vehicleCost = self.evsp.c_k[self.K]
+            vehicleCost = self.evsp.c_k[self.K]
         if self.evsp.calTimeCost == False:
-            self.timeCost == 0
+            timeCost = 0
         if self.evsp.calElecCost == False:
-            self.chargingCost = 0
+            chargingCost = 0
 
-        self.totalCost = self.vehicleCost + self.timeCost + self.chargingCost 
-            
-        return self.totalCost
+        result = (vehicleCost, timeCost, chargingCost, vehicleCost + timeCost + chargingCost, feasibility, violation)
+        self.evsp.dutyCache.put(key, result)
+        return result
@@ -1,6 +1,12 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from bisect import bisect_right
+from copy import copy
+
+from EVSPModel.DeadheadClass import Deadhead
+from EVSPModel.CacheClass import LRUCache
+from EVSPModel.SlotClass import SlotIndex
+from EVSPModel.Matching import hopcroftKarp
 
 """
 @author: Chen Qiuzi
@@ -24,6 +30,7 @@ class EVSP():
         U=3, # operating param, number of delta in a fixed charging duration
         lineChange=True, # operating param, whether line change activities are allowed for BEBs
         nightCharge=False,  # night charging mode
+        cacheSize=20000,  # maximum number of evaluated duties to cache
     ):
         """
         [timetable]
@@ -37,12 +44,13 @@ class EVSP():
         U: number of delta in a fixed charging duration, default=3 (delta=10, U=3 means the fixed charging duration=30min)
         lineChange: whether line change activities are allowed for BEBs, default=True
         nightCharge: whether night charging mode is adopted
+        cacheSize: maximum number of evaluated duties in the LRU cache, default=20000, 0 means caching is disabled
         """
         
         if timetable.isna().any().any():
             raise ValueError("Timetable contains NaN value.")
         else:
-            self.timetable = timetable
+            self.timetable = timetable.copy()  # edited by addTrips(), updateTrip() & removeTrips()
         self.stationCap = stationCap
         self.batteryLB = batteryLB
         # self.batteryUB = batteryUB
@@ -50,6 +58,9 @@ class EVSP():
         self.U = U
         self.lineChange = lineChange
         self.nightCharge = nightCharge
+        self.cacheSize = cacheSize
+        self.numbering = 0  # version of trip numbering, changed when trips are renumbered by removeTrips()
+        self.setTerminals()  # default deadheads, can be overwritten by user-defined terminals
 
     def setVehTypes(
             self,
@@ -96,6 +107,8 @@ class EVSP():
         ToU: whether to consider time-of-use electricity cost
         c_k: vehicle cost, should be dict, independent to time (/veh)
         c_e: electricity cost, should be dict if ToU, else a fixed num (/kWh)
+             ToU dict: {start time of price period (min from 0:00): price}, e.g. {0: 0.3, 480: 1.0, 1320: 0.3},
+             a price period lasts until the start of the next period, and the last one lasts past midnight
         c_t: labor cost, a fixed num (/min) 
         """
         if calVehCost or calElecCost or calElecCost:
@@ -110,10 +123,13 @@ class EVSP():
         if self.ToU:
             if type(c_e) != dict:
                 raise TypeError("c_e should be a dict if ToU policy is adopted.")
+            elif len(c_e) == 0 or min(c_e.keys()) < 0 or max(c_e.keys()) >= 24 * 60:
+                raise KeyError("Keys of c_e should be start time of price periods in [0, 1440) min.")
             else:
-                self.c_e = c_e  # still need key (r) transform.
+                self.c_e = c_e  # key (r) transform in createModel
         else:
             self.c_e = c_e
+        self.tariff = c_e  # electricity cost input, kept when c_e is transformed
 
         # vehicle cost
         if len(list(c_k.keys())) != self.k_num:
@@ -125,6 +141,52 @@ class EVSP():
         self.c_t = c_t
 
 
+    def setTerminals(
+            self,
+            startTerminal=None,
+            endTerminal=None,
+            deadheadTime=[[2, 3, 3], [2, 0, 0], [0, 0, 0]],  # min
+            deadheadEnergy=[[0.05, 0.05, 0.05], [0.05, 0, 0], [0, 0, 0]],  # kWh
+            station=1,
+            depot=2,
+    ):
+        """
+        Set terminals and deadhead matrices.
+        startTerminal: column of timetable storing the start terminal index of each trip, None means all trips start at terminal 0
+        endTerminal: column of timetable storing the end terminal index of each trip, None means all trips end at terminal 0
+        deadheadTime: terminal x terminal matrix of deadhead travel time, min
+        deadheadEnergy: terminal x terminal matrix of deadhead consumption, kWh, or dict of matrices for each vehicle type
+        station: terminal index of the charging station
+        depot: terminal index of the depot
+        The default setting (trips at terminal 0, station at 1, depot at 2) reproduces fixed deadheads of
+        2 min / 0.05 kWh between trips, 3 min / 0.05 kWh to the station or depot and 2 min / 0.05 kWh from the station.
+        """
+        for col in [startTerminal, endTerminal]:
+            if (col is not None) and (col not in self.timetable.columns):
+                raise KeyError("Timetable has no terminal column '%s'." % col)
+        
+        T_num = np.asarray(deadheadTime).shape[0]  # number of terminals
+        matrices = list(deadheadEnergy.values()) if type(deadheadEnergy) == dict else [deadheadEnergy]
+        for matrix in [deadheadTime] + matrices:
+            if np.asarray(matrix).shape != (T_num, T_num):
+                raise ValueError("Deadhead matrices should be square with the same number of terminals.")
+        
+        terminals = [station, depot]
+        for col in [startTerminal, endTerminal]:
+            if col is not None:
+                terminals.extend(self.timetable[col].unique().tolist())
+        if min(terminals) < 0 or max(terminals) >= T_num:
+            raise ValueError("Terminal indices should be integers in [0, %d)." % T_num)
+
+        self.startTerminal = startTerminal
+        self.endTerminal = endTerminal
+        self.T_num = T_num
+        self.deadheadTime = deadheadTime
+        self.deadheadEnergy = deadheadEnergy
+        self.station = station
+        self.depot = depot
+
+
     def setChargingFunc(
             self,
             chargingFuncType='linear',
@@ -155,6 +217,7 @@ class EVSP():
         """
         Plot charging curve.
         """
+        import matplotlib.pyplot as plt  # imported when plotting, so that solving does not import matplotlib
         if self.chargingFuncType == 'linear':
             fig, ax = plt.subplots(1,1,figsize=(6,4))
             ax.set_xlabel("Time", weight="bold")
@@ -218,39 +281,35 @@ class EVSP():
 
         # ---arcs---
 
+        ## terminals of nodes
+        startT = self.timetable[self.startTerminal].tolist() if self.startTerminal is not None else [0] * self.n
+        endT = self.timetable[self.endTerminal].tolist() if self.endTerminal is not None else [0] * self.n
+        fromTerminal = {i:endT[i-1] for i in self.T}  # terminal where a node ends
+        toTerminal = {i:startT[i-1] for i in self.T}  # terminal where a node starts
+        for f in self.F:
+            fromTerminal[f] = self.station
+            toTerminal[f] = self.station
+        fromTerminal['o'] = self.depot
+        toTerminal['d'] = self.depot
+
+        ## travel time of deadhead trips
+        self.t_ij = Deadhead(self.deadheadTime, fromTerminal, toTerminal)
+
         ## set of arcs
         if self.lineChange == True:  # allowing line change activity of EBs
             self.A = [('o', j) for j in self.T] \
-                    + [(i, j) for i in self.T for j in self.T if (self.s_i[i]+self.t_i[i]<=self.s_i[j])] \
+                    + [(i, j) for i in self.T for j in self.T if (self.s_i[i]+self.t_i[i]+self.t_ij[(i,j)]<=self.s_i[j])] \
                     + [(i, f) for i in self.T for f in self.F if i==int(f[1:])] \
                     + [(i, j) for i in self.T for j in ['d']] \
                     + [(f, j) for f in self.F for j in self.T if (self.s_i[int(f[1:])]+self.t_i[int(f[1:])]+(self.U*self.delta)<=self.s_i[j])]
             self.A = set(self.A)
         else:  # not allowing line change, that is an EB can only perform tasks of one route
             self.A = [('o', j) for j in self.T] \
-                    + [(i, j) for i in self.T for j in self.T if (self.timetable.Route.iloc[i-1]==self.timetable.Route.iloc[j-1]) and (self.s_i[i]+self.t_i[i]<=self.s_i[j])] \
+                    + [(i, j) for i in self.T for j in self.T if (self.timetable.Route.iloc[i-1]==self.timetable.Route.iloc[j-1]) and (self.s_i[i]+self.t_i[i]+self.t_ij[(i,j)]<=self.s_i[j])] \
                     + [(i, f) for i in self.T for f in self.F if i==int(f[1:])] \
                     + [(i, j) for i in self.T for j in ['d']] \
                     + [(f, j) for f in self.F for j in self.T if (self.timetable.Route.iloc[int(f[1:])-1]==self.timetable.Route.iloc[j-1]) and (self.s_i[int(f[1:])]+self.t_i[int(f[1:])]+(self.U*self.delta)<=self.s_i[j])]
             self.A = set(self.A)
-
-        ## travel time of deadhead trips
-        self.t_ij = {arc:None for arc in self.A}
-        for i, j in self.A:
-            if i == 'o':  # depart arc
-                self.t_ij[(i,j)] = 0  # min
-            if i in self.T:
-                if j in self.T:  # trip-trip arc
-                    self.t_ij[(i,j)] = 2  # min
-                if j in self.F:  # recharging deadhead arc
-                    self.t_ij[(i,j)] = 3
-                if j in ['d']:  # return arc
-                    self.t_ij[(i,j)] = 3
-            if i in self.F:
-                if j in self.T:  # depart arc
-                    self.t_ij[(i,j)] = 2
-        for f in self.F:  # for temporary schedule cost calculation
-            self.t_ij[(f,'d')] = 0
         
         ## energy consumption of trips
         if self.capRelatedCons == False:
@@ -265,23 +324,13 @@ class EVSP():
                 self.e_ki[k]['o'] = 0
         
         ## consumption of deadhead trips
-        self.e_kij = {k:{arc:None for arc in self.A} for k in self.K}
-        for k in self.K:
-            for i, j in self.A:
-                if i == 'o':  # depart arc
-                    self.e_kij[k][(i,j)] = 0.0  # kWh
-                if i in self.T:
-                    if j in self.T:  # trip-trip arc
-                        self.e_kij[k][(i,j)] = 0.05  # kWh
-                    if j in self.F:  # recharging deadhead arc
-                        self.e_kij[k][(i,j)] = 0.05  # kWh
-                if i in self.F:
-                    if j in ['d']:  # return arc
-                        self.e_kij[k][(i,j)] = 0  # kWh
-                    if j in self.T:  # depart arc
-                        self.e_kij[k][(i,j)] = 0.05  # kWh
-            for i in self.T:  # for temporary schedule cost calculation
-                self.e_kij[k][(i,'d')] = 0.05  # kWh 
+        if type(self.deadheadEnergy) == dict:
+            if sorted(self.deadheadEnergy.keys()) != self.K:
+                raise KeyError("Keys of deadheadEnergy should be equal to vehicle types K.")
+            self.e_kij = {k:Deadhead(self.deadheadEnergy[k], fromTerminal, toTerminal) for k in self.K}
+        else:
+            e_ij = Deadhead(self.deadheadEnergy, fromTerminal, toTerminal)
+            self.e_kij = {k:e_ij for k in self.K}  # shared by vehicle types
        
         # ---time division parameters---
 
@@ -292,32 +341,331 @@ class EVSP():
         ## set of time division indicators
         self.I = set([(f,r) for f in self.F for r in self.R if self.s_i[int(f[1:])]+self.t_i[int(f[1:])]+self.t_ij[(int(f[1:]), f)]<=self.s_r[r]])
 
+        # --- cost ---
+
+        self.createCosts()
+
         # ---remove infeasible arcs---
 
-        for i in self.T:
-            for j in self.T:
-                if ((i,j) in self.A) and (self.s_i[i]+self.t_i[i]+self.t_ij[(i,j)]>self.s_i[j]):
-                    self.A.remove((i,j))
         for f in self.F:
             for j in self.T:
                 if (f,j) in self.A:
-                    possibleR = [r for r in self.R if ((self.s_r[r]>=self.s_i[int(f[1:])]+self.t_i[int(f[1:])]+self.t_ij[(int(f[1:]),f)]) and (self.s_r[r]+self.U*self.delta+self.t_ij[(f,j)]<=self.s_i[j]))]
-                    if len(possibleR)==0:
+                    a, b = self.slotIndex.window(self.s_i[int(f[1:])]+self.t_i[int(f[1:])]+self.t_ij[(int(f[1:]),f)], self.s_i[j]-self.U*self.delta-self.t_ij[(f,j)])
+                    if a > b:  # no possible time division
                         self.A.remove((f,j))
 
-        # --- cost ---
-        
-        c_e = self.c_e
+        # --- batched evaluation ---
+
+        self.evaluator = None  # compiled when a schedule is evaluated, see Schedule.evaluate
+        self.dutyCache = LRUCache(self.cacheSize)  # evaluated duties, reset whenever the model is created
+
+
+    def createCosts(self):
+        """
+        Create unit electricity cost of time divisions and index time divisions by start time & price.
+        Called by createModel(), and again when costs of a created model change (see variant()).
+        """
         self.c_e = {}  # unit electricity cost
         ## time of use
         if self.ToU:
-            """
-            Time-of-use policy is not yet available.
-            """
-            pass
+            periods = sorted(self.tariff.keys())  # start time of price periods
+            for r in self.R:
+                index = bisect_right(periods, self.s_r[r] % (24 * 60)) - 1  # -1 means the last period of the previous day
+                self.c_e[r] = self.tariff[periods[index]]  # /kWh
         else:
             for r in self.R:
-                self.c_e[r] = c_e  # /kWh
+                self.c_e[r] = self.tariff  # /kWh
+
+        ## time divisions indexed by start time & price
+        self.slotIndex = SlotIndex(self.R, self.s_r, self.c_e)
+
+
+    def arcsOfTrip(self, i:int):
+        """
+        Return the set of arcs related to trip i and its charging node in the created model,
+        the same as the arcs created by createModel().
+        """
+        f = 'f%d' % i
+        arcs = {('o', i), (i, 'd'), (i, f)}
+        routes = self.timetable.Route.tolist()
+        end_i = self.s_i[i] + self.t_i[i]  # end time of trip i
+        earliest_i = end_i + self.t_ij[(i, f)]  # earliest charging time after trip i
+        for j in self.T:
+            if j == i or ((self.lineChange == False) and (routes[j-1] != routes[i-1])):
+                continue
+            end_j = self.s_i[j] + self.t_i[j]
+            # trip arcs
+            if end_i + self.t_ij[(i, j)] <= self.s_i[j]:
+                arcs.add((i, j))
+            if end_j + self.t_ij[(j, i)] <= self.s_i[i]:
+                arcs.add((j, i))
+            # charging arcs with possible time divisions
+            if end_i + self.U * self.delta <= self.s_i[j]:
+                a, b = self.slotIndex.window(earliest_i, self.s_i[j] - self.U * self.delta - self.t_ij[(f, j)])
+                if a <= b:
+                    arcs.add((f, j))
+            if end_j + self.U * self.delta <= self.s_i[i]:
+                f_ = 'f%d' % j
+                a, b = self.slotIndex.window(end_j + self.t_ij[(j, f_)], self.s_i[i] - self.U * self.delta - self.t_ij[(f_, i)])
+                if a <= b:
+                    arcs.add((f_, i))
+        return arcs
+
+
+    def setTripParams(self, i:int):
+        """
+        Set node params (start time, travel time, terminals, energy consumption) of trip i
+        from the timetable in the created model.
+        """
+        self.s_i[i] = self.timetable.StartTimeMin.iloc[i-1]
+        self.t_i[i] = self.timetable.TravelTimeMin.iloc[i-1]
+        self.t_i['f%d' % i] = 0
+        fromTerminal, toTerminal = self.t_ij.fromTerminal, self.t_ij.toTerminal  # shared by deadhead matrices
+        fromTerminal[i] = self.timetable[self.endTerminal].iloc[i-1] if self.endTerminal is not None else 0
+        toTerminal[i] = self.timetable[self.startTerminal].iloc[i-1] if self.startTerminal is not None else 0
+        fromTerminal['f%d' % i] = self.station
+        toTerminal['f%d' % i] = self.station
+        for k in self.K:
+            if self.capRelatedCons == False:
+                self.e_ki[k][i] = self.timetable.Consumption.iloc[i-1]
+            else:
+                self.e_ki[k][i] = self.timetable.Consumption.iloc[i-1] + (self.E_k[k] - self.benchCap) * self.consIncRate * self.timetable.Distance.iloc[i-1]
+
+
+    def setTripIndicators(self, i:int):
+        """
+        Set time division indicators I of the charging node of trip i in the created model.
+        """
+        f = 'f%d' % i
+        earliest = self.s_i[i] + self.t_i[i] + self.t_ij[(i, f)]
+        self.I.difference_update([(f, r) for r in self.R])
+        self.I.update([(f, r) for r in self.R if earliest <= self.s_r[r]])
+
+
+    def resetCaches(self):
+        """
+        Reset the compiled evaluator and the duty cache, after the model is edited.
+        """
+        self.evaluator = None
+        self.dutyCache = LRUCache(self.cacheSize)
+
+
+    def addTrips(self, trips:pd.DataFrame):
+        """
+        Add trips to a created model, only arcs related to new trips are created.
+        Trip nodes follow the order of insertion: new rows are appended to the timetable and numbered after
+        existing trips, which keep their nodes. Rows are not re-sorted by start time (see updateTrip()).
+        trips: rows of new trips with the same columns as the timetable
+        Return the list of new trip nodes.
+        """
+        missing = [col for col in self.timetable.columns if col not in trips.columns]
+        if missing:
+            raise KeyError("New trips have no column %s." % missing)
+        trips = trips[self.timetable.columns]
+        if trips.isna().any().any():
+            raise ValueError("New trips contain NaN value.")
+        newTrips = list(range(self.n+1, self.n+len(trips)+1))
+        self.timetable = pd.concat([self.timetable, trips], ignore_index=True)
+        self.n = self.timetable.shape[0]
+        for i in newTrips:
+            self.T.add(i)
+            self.F.add('f%d' % i)
+            self.setTripParams(i)
+        for i in newTrips:
+            self.A.update(self.arcsOfTrip(i))
+            self.setTripIndicators(i)
+        self.resetCaches()
+        return newTrips
+
+
+    def updateTrip(self, i:int, **values):
+        """
+        Update columns of trip i in a created model (e.g. StartTimeMin=480), only arcs related to trip i are rebuilt.
+        Trip nodes follow the order of insertion, so trip i keeps its node and its row is not re-sorted when
+        its start time changes (see addTrips()).
+        The timetable of the model is a copy of the one passed in, so the caller's DataFrame is not changed,
+        but variants of the model (see variant()) share the edited timetable, nodes and arcs.
+        values: column: new value
+        """
+        if i not in self.T:
+            raise KeyError("Trip %s is not in the model." % i)
+        for col, value in values.items():
+            if col not in self.timetable.columns:
+                raise KeyError("Timetable has no column '%s'." % col)
+            self.timetable.loc[self.timetable.index[i-1], col] = value
+        self.setTripParams(i)
+
+        f = 'f%d' % i
+        oldArcs = [(i, j) for j in self.T] + [(j, i) for j in self.T] + [(f, j) for j in self.T] + [('f%d' % j, i) for j in self.T]
+        self.A.difference_update(oldArcs)
+        self.A.update(self.arcsOfTrip(i))
+        self.setTripIndicators(i)
+        self.resetCaches()
+
+
+    def removeTrips(self, trips:list):
+        """
+        Remove trips from a created model.
+        Schedules made before are out of date, trips of them are mapped by the returned renumbering.
+        Remaining trips are renumbered in the order of the timetable, and existing arcs are renumbered
+        instead of being created again.
+        trips: trip nodes to remove
+        Return the renumbering of remaining trips, dict {old trip node: new trip node}.
+        """
+        removed = set(trips)
+        if not removed.issubset(self.T):
+            raise KeyError("Trips %s are not in the model." % sorted(removed - self.T))
+        kept = [i for i in sorted(self.T) if i not in removed]
+        mapping = {old: new for new, old in enumerate(kept, start=1)}
+
+        self.timetable = self.timetable.iloc[[i-1 for i in kept]].reset_index(drop=True)
+        self.n = self.timetable.shape[0]
+        self.T = set(range(1, self.n+1))
+        self.F = set(['f%d' % i for i in self.T])
+        self.renumber(mapping)
+        self.numbering += 1
+        self.resetCaches()
+        return mapping
+
+
+    def renumber(self, mapping:dict):
+        """
+        Renumber trips in node params, arcs and time division indicators of the created model,
+        trips not in the renumbering are dropped.
+        mapping: {old trip node: new trip node}
+        """
+        nodeMap = {'o': 'o', 'd': 'd'}
+        for old, new in mapping.items():
+            nodeMap[old] = new
+            nodeMap['f%d' % old] = 'f%d' % new
+        for params in [self.s_i, self.t_i, self.t_ij.fromTerminal, self.t_ij.toTerminal] + [self.e_ki[k] for k in self.K]:
+            renumbered = {nodeMap[node]: value for node, value in params.items() if node in nodeMap}
+            params.clear()  # in place, dicts are shared by deadhead matrices
+            params.update(renumbered)
+        self.A = set((nodeMap[i], nodeMap[j]) for i, j in self.A if (i in nodeMap) and (j in nodeMap))
+        self.I = set((nodeMap[f], r) for f, r in self.I if f in nodeMap)
+
+
+    def setStationCap(self, stationCap):
+        """
+        Set station capacity of a created model, -1 means capacity is not considered.
+        """
+        self.stationCap = stationCap
+        self.C_r = {r:stationCap for r in self.R}
+
+
+    def variant(self, stationCap=None, batteryLB=None, nightCharge=None, costs=None, chargingFunc=None):
+        """
+        Derive a variant of a created model with different params, without creating the model again.
+        Sets, nodes, arcs and time divisions do not depend on these params, so they are shared with the model,
+        only cost params and caches are rebuilt. The model should not be edited while its variants are in use.
+        stationCap, batteryLB, nightCharge: new params, None means the same as the model
+        costs: dict of new params of setCosts(), e.g. {'ToU': True, 'c_e': {0: 0.3, 480: 1.0}}
+        chargingFunc: dict of new params of setChargingFunc(), e.g. {'chargingFuncType': 'piecewise'}
+        Return the variant.
+        """
+        view = copy(self)
+        if stationCap is not None:
+            view.stationCap = stationCap
+            view.C_r = {r:stationCap for r in view.R}
+        if batteryLB is not None:
+            view.batteryLB = batteryLB
+        if nightCharge is not None:
+            view.nightCharge = nightCharge
+        if costs is not None:
+            params = {
+                'calVehCost': self.calVehCost, 'calElecCost': self.calElecCost, 'calTimeCost': self.calTimeCost,
+                'ToU': self.ToU, 'c_k': self.c_k, 'c_e': self.tariff, 'c_t': self.c_t,
+            }
+            params.update(costs)
+            view.setCosts(**params)
+            view.createCosts()
+        if chargingFunc is not None:
+            view.setChargingFunc(**chargingFunc)
+        view.evaluator = None
+        view.dutyCache = LRUCache(self.cacheSize)
+        return view
+
+
+    def subProblem(self, trips:list, stationCap=None):
+        """
+        Create an EVSP object of a subset of trips with the same params.
+        trips: trip nodes in the subset, trip i of the sub problem is trips[i-1]
+        stationCap: station capacity of the sub problem, default is the same as the model
+        Return the sub problem, createModel() is not called.
+        """
+        sub = EVSP(
+            self.timetable.iloc[[i-1 for i in trips]].reset_index(drop=True),
+            batteryLB=self.batteryLB,
+            stationCap=self.stationCap if stationCap is None else stationCap,
+            delta=self.delta,
+            U=self.U,
+            lineChange=self.lineChange,
+            nightCharge=self.nightCharge,
+            cacheSize=self.cacheSize,
+        )
+        sub.setTerminals(self.startTerminal, self.endTerminal, self.deadheadTime, self.deadheadEnergy, self.station, self.depot)
+        sub.setVehTypes(self.E_k, self.capRelatedCons, self.benchCap, self.consIncRate)
+        sub.setCosts(self.calVehCost, self.calElecCost, self.calTimeCost, self.ToU, self.c_k, self.tariff, self.c_t)
+        if self.chargingFuncType == 'linear':
+            sub.setChargingFunc('linear', chargingRate=self.v_k)
+        else:
+            sub.setChargingFunc('piecewise', breakpoint_time=self.c_kb, breakpoint_soc=self.a_kb)
+        return sub
+
+
+    def minPathCover(self, trips=None):
+        """
+        Minimum path cover of the trip-compatibility graph of the created model, trip j can follow trip i
+        if (i, j) or (fi, j) is an arc. Solved as a maximum bipartite matching by Hopcroft-Karp,
+        the number of chains is the minimum fleet size without energy constraints.
+        trips: trips to cover, default is all the trips
+        Return list of chains, lists of trips in time order.
+        """
+        trips = sorted(self.T if trips is None else trips, key=lambda i: self.s_i[i])
+        position = {i: p for p, i in enumerate(trips)}
+        adj = [set() for _ in trips]
+        for a, b in self.A:
+            if (type(b) == int) and (a != 'o'):
+                i = a if type(a) == int else int(a[1:])
+                if (i in position) and (b in position):
+                    adj[position[i]].add(position[b])
+        adj = [sorted(succ) for succ in adj]  # earlier trips first
+        matchL, matchR = hopcroftKarp(adj, len(trips))
+        chains = []
+        for p in range(len(trips)):
+            if matchR[p] == -1:  # no predecessor
+                chain = [trips[p]]
+                while matchL[p] != -1:
+                    p = matchL[p]
+                    chain.append(trips[p])
+                chains.append(chain)
+        return chains
+
+
+    def lowerBound(self):
+        """
+        A valid lower bound of the total cost of the created model, cheap to compute.
+        Vehicle cost: minimum fleet size (see minPathCover) x the cheapest vehicle.
+        Time cost: travel time of trips, and pull-out & pull-in deadheads of each vehicle at least.
+        Charging cost: energy consumed by trips and pull-out & pull-in deadheads (the least among vehicle types)
+        x the cheapest unit electricity cost, since all the energy consumed is charged during the day or after daily operation.
+        Return the lower bound / yuan.
+        """
+        fleet = len(self.minPathCover())
+        pullOutTime = min(self.t_ij[('o', j)] for j in self.T)
+        pullInTime = min(self.t_ij[(i, 'd')] for i in self.T)
+        energy = sum(min(self.e_ki[k][i] for k in self.K) for i in self.T) \
+               + fleet * min(min(self.e_kij[k][('o', j)] for j in self.T) + min(self.e_kij[k][(i, 'd')] for i in self.T) for k in self.K)
+
+        lowerBound = 0
+        if self.calVehCost == True:
+            lowerBound += fleet * min(self.c_k.values())
+        if self.calTimeCost == True:
+            lowerBound += (sum(self.t_i[i] for i in self.T) + fleet * (pullOutTime + pullInTime)) * self.c_t
+        if self.calElecCost == True:
+            lowerBound += energy * min(self.c_e.values())
+        return lowerBound
 
 
     def printParams(self):
@@ -331,6 +679,8 @@ class EVSP():
               "Lowest Battery Level:", self.batteryLB, "\n",
               "Station Capacity:", "not considered" if self.stationCap==-1 else self.stationCap, "\n",
               "Allow Line Change:", self.lineChange, "\n",
+              "Number of Terminals:", self.T_num, "\n",
+              "Time-of-Use Price:", self.tariff if self.ToU else "not considered", "\n",
               "Adopt Night Change:", self.nightCharge, "\n",
               "Charging Function:", self.chargingFuncType, "\n",
               "Time Interval:", self.delta, "\n",
@@ -0,0 +1,230 @@
+from EVSPModel.EVSPClass import EVSP
+from EVSPModel.Calculations import calCharge, calChargeArray
+
+import numpy as np
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+class Evaluator():
+
+    """
+    An Evaluator object evaluates a whole list of duties in one batched pass.
+    Duties are packed into padded arrays of node ids and charging time divisions,
+    and the energy of all the duties is updated column by column (node position by node position).
+    Results are the same as Duty.checkEnergyFeasibility and Duty.calCost.
+    """
+
+    def __init__(self, evsp:EVSP):
+        """
+        Compile node, arc and cost params of a created EVSP model into arrays.
+        Node ids: 'o'=0, trip i=i, charging node 'fi'=n+i, 'd'=2n+1.
+        """
+        self.evsp = evsp
+        n = evsp.n
+        N = 2 * n + 2  # number of node ids
+
+        self.nodeId = {'o': 0, 'd': N - 1}
+        for i in evsp.T:
+            self.nodeId[i] = i
+            self.nodeId['f%d' % i] = n + i
+        self.isCharge = np.zeros(N, dtype=bool)
+        self.isCharge[n+1:2*n+1] = True
+
+        # nodes
+        self.s_node = np.full(N, np.nan)  # start time of trip nodes
+        self.t_node = np.zeros(N)  # travel time of nodes
+        self.e_knode = {k: np.zeros(N) for k in evsp.K}  # energy consumption of nodes
+        for i in evsp.T:
+            self.s_node[i] = evsp.s_i[i]
+            self.t_node[i] = evsp.t_i[i]
+            for k in evsp.K:
+                self.e_knode[k][i] = evsp.e_ki[k][i]
+
+        # arcs, resolved by terminals of nodes
+        self.fromTerminal = np.full(N, evsp.depot)
+        self.toTerminal = np.full(N, evsp.depot)
+        for node, index in self.nodeId.items():
+            if node in evsp.t_ij.fromTerminal:
+                self.fromTerminal[index] = evsp.t_ij.fromTerminal[node]
+            if node in evsp.t_ij.toTerminal:
+                self.toTerminal[index] = evsp.t_ij.toTerminal[node]
+        self.t_mat = np.asarray(evsp.t_ij.matrix)
+        self.e_kmat = {k: np.asarray(evsp.e_kij[k].matrix) for k in evsp.K}
+
+        # time divisions
+        self.slotId = {r: index for index, r in enumerate(evsp.R)}
+        self.s_slot = np.array([evsp.s_r[r] for r in evsp.R])  # start time of time divisions
+        self.c_e = np.array([evsp.c_e[r] for r in evsp.R])  # unit electricity cost of time divisions
+        self.c_e_min = min(evsp.c_e.values())
+
+        # vehicle types, indexed by k
+        self.E_k = np.zeros(max(evsp.K) + 1)
+        self.c_k = np.zeros(max(evsp.K) + 1)
+        for k in evsp.K:
+            self.E_k[k] = evsp.E_k[k]
+            self.c_k[k] = evsp.c_k[k]
+
+        # vehicle types, stacked in the order of K
+        self.E_K = np.array([evsp.E_k[k] for k in evsp.K], dtype=float)
+        self.c_K = np.array([evsp.c_k[k] for k in evsp.K], dtype=float)
+        self.e_Knode = np.stack([self.e_knode[k] for k in evsp.K])
+        self.e_Kmat = np.stack([self.e_kmat[k] for k in evsp.K])
+        if evsp.chargingFuncType == 'linear':
+            self.v_K = np.array([evsp.v_k[k] for k in evsp.K], dtype=float)
+
+    def pack(self, duties:list):
+        """
+        Pack duties into padded arrays.
+        Return (K, nodes, slots, length), rows are padded with 'd'.
+        """
+        m = len(duties)
+        L = max(len(duty.S) for duty in duties)
+        K = np.array([duty.K for duty in duties], dtype=int)
+        length = np.array([len(duty.S) for duty in duties], dtype=int)
+        nodes = np.full((m, L), self.nodeId['d'], dtype=int)
+        slots = np.zeros((m, L), dtype=int)
+        for row, duty in enumerate(duties):
+            nodes[row, :length[row]] = [self.nodeId[s] for s in duty.S]
+            for col, s in enumerate(duty.S):
+                if s in duty.R:
+                    slots[row, col] = self.slotId[duty.R[s]]
+        return K, nodes, slots, length
+
+    def evaluate(self, duties:list):
+        """
+        Evaluate energy and costs of duties.
+        Return a dict of arrays (one value per duty):
+            energy: remaining energy after each node, shape (duties, max length-1), nan after the end of a duty
+            chargeVolume: charging volume at each node, shape (duties, max length-1), 0 at other nodes
+            minSOC: minimum SOC of each duty
+            energyFeasibility: True if a duty can meet the energy constraint
+            vehicleCost, timeCost, chargingCost, totalCost
+        """
+        evsp = self.evsp
+        K, nodes, slots, length = self.pack(duties)
+        m, L = nodes.shape
+        tail, head = nodes[:, :-1], nodes[:, 1:]
+        valid = np.arange(L-1)[None, :] < (length[:, None] - 1)  # node positions followed by an arc
+
+        # time cost
+        t_arc = self.t_mat[self.fromTerminal[tail], self.toTerminal[head]]
+        timeCost = ((t_arc + self.t_node[tail]) * valid).sum(axis=1) * evsp.c_t
+        if evsp.calTimeCost == False:
+            timeCost = np.zeros(m)
+
+        # consumption of nodes and arcs
+        cons = np.zeros((m, L-1))
+        for k in evsp.K:
+            rows = (K == k)
+            if rows.any():
+                cons[rows] = self.e_knode[k][tail[rows]] + self.e_kmat[k][self.fromTerminal[tail[rows]], self.toTerminal[head[rows]]]
+        cons[~valid] = 0
+
+        # energy, column by column
+        charge = self.isCharge[tail] & valid
+        chargeVolume = np.zeros((m, L-1))
+        energy = np.zeros((m, L-1))
+        y = self.E_k[K]
+        for col in range(L-1):
+            if charge[:, col].any():
+                for k in evsp.K:
+                    rows = charge[:, col] & (K == k)
+                    if rows.any():
+                        chargeVolume[rows, col] = calChargeArray(evsp, k, y[rows])
+            y = y + chargeVolume[:, col] - cons[:, col]
+            energy[:, col] = y
+        energy[~valid] = np.nan
+
+        # SOC
+        minEnergy = np.where(valid, energy, np.inf).min(axis=1)
+        minSOC = minEnergy / self.E_k[K]
+        energyFeasibility = minEnergy >= evsp.batteryLB * self.E_k[K]
+
+        # charging cost, charged to full after daily operation
+        chargingCost = (chargeVolume * self.c_e[slots[:, :-1]]).sum(axis=1) \
+                     + (self.E_k[K] - y) * self.c_e_min
+        if evsp.calElecCost == False:
+            chargingCost = np.zeros(m)
+
+        # vehicle cost
+        if evsp.calVehCost == True:
+            vehicleCost = self.c_k[K]
+        else:
+            vehicleCost = np.zeros(m)
+
+        return {
+            'energy': energy,
+            'chargeVolume': chargeVolume,
+            'minSOC': minSOC,
+            'energyFeasibility': energyFeasibility,
+            'vehicleCost': vehicleCost,
+            'timeCost': timeCost,
+            'chargingCost': chargingCost,
+            'totalCost': vehicleCost + timeCost + chargingCost,
+        }
+
+    def evaluateVehTypes(self, S:list, R:dict):
+        """
+        Evaluate a trip chain for all the vehicle types in one pass.
+        The energy of all the types is carried in parallel, trips between two charging nodes are
+        consumed at once and charging is applied at charging nodes.
+        S: trip chain
+        R: charging time assignment, dict
+        Return (totalCost, energyFeasibility), arrays in the order of K.
+        """
+        evsp = self.evsp
+        ids = np.array([self.nodeId[s] for s in S])
+        tail, head = ids[:-1], ids[1:]
+        L = len(tail)
+
+        # time cost, independent to vehicle type
+        timeCost = (self.t_mat[self.fromTerminal[tail], self.toTerminal[head]] + self.t_node[tail]).sum() * evsp.c_t
+        if evsp.calTimeCost == False:
+            timeCost = 0
+
+        # energy
+        cons = self.e_Knode[:, tail] + self.e_Kmat[:, self.fromTerminal[tail], self.toTerminal[head]]  # (K, nodes)
+        energy = np.empty((len(evsp.K), L))
+        chargingCost = np.zeros(len(evsp.K))
+        y = self.E_K
+        start = 0
+        for pos in np.flatnonzero(self.isCharge[tail]).tolist() + [L]:
+            if pos > start:  # trips before the charging node
+                energy[:, start:pos] = y[:, None] - np.cumsum(cons[:, start:pos], axis=1)
+                y = energy[:, pos-1]
+            if pos < L:  # charging node
+                if evsp.chargingFuncType == 'linear':
+                    chargeVolume = np.minimum(self.E_K - y, self.v_K * evsp.U * evsp.delta)
+                else:
+                    chargeVolume = np.array([calCharge(evsp, k, y[index]) for index, k in enumerate(evsp.K)])
+                chargingCost += chargeVolume * evsp.c_e[R[S[pos]]]
+                y = y + chargeVolume - cons[:, pos]
+                energy[:, pos] = y
+                start = pos + 1
+        energyFeasibility = energy.min(axis=1) >= evsp.batteryLB * self.E_K
+
+        # charged to full after daily operation
+        chargingCost += (self.E_K - y) * self.c_e_min
+        if evsp.calElecCost == False:
+            chargingCost = np.zeros(len(evsp.K))
+
+        # vehicle cost
+        if evsp.calVehCost == True:
+            vehicleCost = self.c_K
+        else:
+            vehicleCost = np.zeros(len(evsp.K))
+
+        return vehicleCost + timeCost + chargingCost, energyFeasibility
+
+
+def getEvaluator(evsp:EVSP):
+    """
+    Return the evaluator of an EVSP model, compile it if not yet.
+    """
+    if evsp.evaluator is None:
+        evsp.evaluator = Evaluator(evsp)
+    return evsp.evaluator
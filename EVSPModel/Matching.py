@@ -0,0 +1,66 @@
+"""
+@author: Chen Qiuzi
+This Python file includes maximum bipartite matching used for fleet size calculations.
+"""
+
+
+def hopcroftKarp(adj:list, nRight:int):
+    """
+    Maximum matching of a bipartite graph by the Hopcroft-Karp algorithm.
+    Shortest augmenting paths are layered by BFS from free left vertices and augmented by DFS
+    (iterative, so that long paths do not hit the recursion limit) until no augmenting path exists.
+    adj: adj[u] is the list of right vertices adjacent to left vertex u
+    nRight: number of right vertices
+    Return (matchL, matchR), the matched vertex of each left/right vertex, -1 if not matched.
+    """
+    nLeft = len(adj)
+    matchL = [-1] * nLeft
+    matchR = [-1] * nRight
+    while True:
+        # BFS layers from free left vertices
+        dist = [-1] * nLeft
+        queue = [u for u in range(nLeft) if matchL[u] == -1]
+        for u in queue:
+            dist[u] = 0
+        found = False
+        head = 0
+        while head < len(queue):
+            u = queue[head]
+            head += 1
+            for v in adj[u]:
+                w = matchR[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == -1:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            break
+
+        # DFS along layers, vertex-disjoint augmenting paths
+        it = [0] * nLeft  # next edge to try of each left vertex
+        for root in range(nLeft):
+            if matchL[root] != -1:
+                continue
+            stack, path = [root], []  # left vertices & right vertices between them
+            while stack:
+                u = stack[-1]
+                if it[u] < len(adj[u]):
+                    v = adj[u][it[u]]
+                    it[u] += 1
+                    w = matchR[v]
+                    if w == -1:  # augment
+                        path.append(v)
+                        for u_, v_ in zip(stack, path):
+                            matchL[u_] = v_
+                            matchR[v_] = u_
+                        break
+                    elif dist[w] == dist[u] + 1:
+                        stack.append(w)
+                        path.append(v)
+                else:  # dead end
+                    dist[u] = -1
+                    stack.pop()
+                    if path:
+                        path.pop()
+    return matchL, matchR
@@ -1,11 +1,11 @@
-from copy import deepcopy
 from EVSPModel.DutyClass import Duty
 from EVSPModel.EVSPClass import EVSP
-from EVSPModel.Calculations import calCharge
+from EVSPModel.EvaluatorClass import getEvaluator
+from EVSPModel.Analytics import chargerOccupancy, chargingPower, costBreakdown
 
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.patches import Patch
+from itertools import chain
 
 
 """
@@ -13,6 +13,9 @@ from matplotlib.patches import Patch
 """
 
 
+SCHEDULE_COLUMNS = ['Duty', 'VehicleType', 'Position', 'Node', 'TimeDivision']  # columns of exported schedules
+
+
 class Schedule():
     """
     A schedule is an object which contains a series of vehicles with their service trips and
@@ -25,7 +28,7 @@ class Schedule():
         capacity feasibility: True if the charging station capacity constraints are satisfied, else False
     """
 
-    __slots__ = ['schedule','R','vehicleCost','timeCost','chargingCost','totalCost','evsp']
+    __slots__ = ['schedule','R','vehicleCost','timeCost','chargingCost','totalCost','evsp','numbering']
 
     def __init__(self, evsp:EVSP, schedule=[], R={}):
         """
@@ -40,6 +43,7 @@ class Schedule():
         self.chargingCost = 0
         self.totalCost = 0
         self.evsp = evsp
+        self.numbering = evsp.numbering  # trip numbering of the model the duties refer to, see EVSP.removeTrips
 
 
     def __deepcopy__(self, memodict={}):
@@ -47,10 +51,9 @@ class Schedule():
         For deepcopy.
         """
         info = Schedule(self.evsp, [], {})
-        for duty in self.schedule:
-            duty_ = deepcopy(duty)
-            info.schedule.append(duty_)
+        info.schedule = [duty.copy() for duty in self.schedule]
         info.R = {f:r for f,r in self.R.items()}
+        info.numbering = self.numbering
         return info
 
 
@@ -113,6 +116,17 @@ class Schedule():
         r_ = self.R.pop(f)
 
 
+    def fingerprint(self):
+        """
+        Return an order-independent hash of the schedule (XOR of hashes of duties).
+        Schedules with the same duties have the same fingerprint regardless of the order of duties.
+        """
+        value = 0
+        for duty in self.schedule:
+            value ^= duty.fingerprint()
+        return hash((value, len(self.schedule)))
+
+
     def checkEnergyFeasibility(self):
         """
         Return True if the energy constraints are satisfied, else False
@@ -127,23 +141,33 @@ class Schedule():
         """
         Return True if the capacity constraints are satisfied, else Flase.
         """
-        feasibility = True
+        return self.calCapacityViolation() == 0
+
+
+    def calEnergyViolation(self):
+        """
+        Return the energy violation of all the duties / kWh,
+        sum of energy below the safe battery level at the lowest point of each duty.
+        """
+        return sum(duty.calEnergyViolation() for duty in self.schedule)
+
+
+    def calCapacityViolation(self):
+        """
+        Return the capacity violation, sum of vehicles over the station capacity in each time division.
+        """
         if self.evsp.stationCap < 0:
-            return feasibility
-        else:
-            for r in set(self.R.values()):
-                num = []  # number of vehicle in the station before r when i is charging
-                for u in range(self.evsp.U):  # 0, 1, 2...
-                    index = int(r[1:])+u  # index of r to check capacity, if r=r3, then index=3,4,5...
-                    num_before = 0
-                    for u in range(self.evsp.U):
-                        index_before = index-u  # index of r when vehicle is still being charged
-                        if index_before > 0:  # considering r1, r2...
-                            num_before += sum(map(('r%d'%(index_before)).__eq__, self.R.values()))
-                    num.append(num_before)
-                if (max(num) > self.evsp.stationCap):
-                    feasibility = False
-            return feasibility
+            return 0
+        starts = {}  # number of charging events starting at each time division index
+        for r in self.R.values():
+            index = int(r[1:])
+            starts[index] = starts.get(index, 0) + 1
+        occupied = set(index + u for index in starts for u in range(self.evsp.U))  # divisions with vehicles being charged
+        violation = 0
+        for index in occupied:
+            num = sum(starts.get(index - u, 0) for u in range(self.evsp.U))  # vehicles being charged in the division
+            violation += max(num - self.evsp.stationCap, 0)
+        return violation
 
 
     def calCost(self):
@@ -167,17 +191,113 @@ class Schedule():
         return self.totalCost
 
 
+    def evaluate(self):
+        """
+        Calculate schedule cost and check energy feasibility of all the duties in one batched pass.
+        Return (totalCost, energyFeasibility), same as calCost() and checkEnergyFeasibility().
+        """
+        result = getEvaluator(self.evsp).evaluate(self.schedule)
+
+        self.totalCost = float(result['totalCost'].sum())
+        self.vehicleCost = float(result['vehicleCost'].sum()) if self.evsp.calVehCost == True else 0
+        self.timeCost = float(result['timeCost'].sum()) if self.evsp.calTimeCost == True else 0
+        self.chargingCost = float(result['chargingCost'].sum()) if self.evsp.calElecCost == True else 0
+
+        return self.totalCost, bool(result['energyFeasibility'].all())
+
+
     def printTimetable(self):
         """
         Print out a table(DataFrame) of the schedule.
         """
         self.sortDuty()
-        df = pd.DataFrame(columns=['Vehicle Type', 'Trip Chain', 'Charging Time'])
-        for duty in self.schedule:
-            df.loc[len(df.index)] = [duty.K, duty.S, duty.R]
+        df = pd.DataFrame({
+            'Vehicle Type': [duty.K for duty in self.schedule],
+            'Trip Chain': [duty.S for duty in self.schedule],
+            'Charging Time': [duty.R for duty in self.schedule],
+        }, columns=['Vehicle Type', 'Trip Chain', 'Charging Time'])
         print(df)
 
 
+    # --- Export & Import ---
+
+
+    def to_frame(self):
+        """
+        Export the schedule into a DataFrame with a row for each node of each duty, columns:
+            Duty: index of the duty in the schedule
+            VehicleType: vehicle type of the duty
+            Position: position of the node in the trip chain
+            Node: node label, 'o', trip number (e.g. '12'), charging node (e.g. 'f12') or 'd'
+            TimeDivision: charging time division of charging nodes (e.g. 'r40'), None for other nodes
+        """
+        length = np.array([len(duty.S) for duty in self.schedule], dtype=int)
+        nodes = list(chain.from_iterable(duty.S for duty in self.schedule))
+        return pd.DataFrame({
+            'Duty': np.repeat(np.arange(len(self.schedule)), length),
+            'VehicleType': np.repeat(np.array([duty.K for duty in self.schedule], dtype=int), length),
+            'Position': np.arange(len(nodes)) - np.repeat(np.cumsum(length) - length, length),
+            'Node': [str(s) for s in nodes],
+            'TimeDivision': [r for duty in self.schedule for r in map(duty.R.get, duty.S)],
+        }, columns=SCHEDULE_COLUMNS)
+
+
+    def to_parquet(self, path, **kwargs):
+        """
+        Export the schedule into a parquet file (see to_frame), kwargs are passed to DataFrame.to_parquet.
+        """
+        self.to_frame().to_parquet(path, index=False, **kwargs)
+
+
+    def to_json(self, path=None, **kwargs):
+        """
+        Export the schedule into JSON records (see to_frame), kwargs are passed to DataFrame.to_json.
+        Return the JSON string if path is None.
+        """
+        return self.to_frame().to_json(path, orient='records', **kwargs)
+
+
+    @staticmethod
+    def from_frame(evsp:EVSP, frame:pd.DataFrame):
+        """
+        Import a schedule from a DataFrame in the form of to_frame(), e.g. read by pd.read_parquet or
+        pd.read_json(orient='records'), nodes are validated against the model.
+        evsp: EVSP model, createModel() should be called
+        Return the schedule.
+        """
+        missing = [col for col in SCHEDULE_COLUMNS if col not in frame.columns]
+        if missing:
+            raise KeyError("Schedule frame has no column %s." % missing)
+        frame = frame.sort_values(['Duty', 'Position'], kind='stable')
+
+        nodes = []
+        for label in frame['Node'].astype(str).tolist():
+            node = int(label) if label.isdigit() else label
+            if (node not in evsp.T) and (node not in evsp.F) and (node not in ['o', 'd']):
+                raise ValueError("Unknown node '%s' in the schedule frame." % label)
+            nodes.append(node)
+        slots = frame['TimeDivision'].tolist()
+        dutyId = frame['Duty'].to_numpy()
+        vehType = frame['VehicleType'].to_numpy()
+
+        newSchedule = Schedule(evsp, [], {})
+        if len(nodes) == 0:
+            return newSchedule
+        bounds = np.flatnonzero(np.diff(dutyId)) + 1
+        for start, end in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(nodes)]])):
+            S = nodes[start:end]
+            if S[0] != 'o' or S[-1] != 'd':
+                raise ValueError("Trip chain of duty %d should start with 'o' and end with 'd'." % dutyId[start])
+            R = {}
+            for s, r in zip(S, slots[start:end]):
+                if s in evsp.F:
+                    if r not in evsp.s_r:
+                        raise ValueError("Unknown time division '%s' of charging node '%s'." % (r, s))
+                    R[s] = r
+            newSchedule.addDuty(Duty(evsp, int(vehType[start]), S, R))
+        return newSchedule
+
+
     # --- Plot ---
 
 
@@ -185,6 +305,8 @@ class Schedule():
         """
         Display timetable & schedule in form of Gantt Chart.
         """
+        import matplotlib.pyplot as plt  # imported when plotting, so that solving does not import matplotlib
+        from matplotlib.patches import Patch
         fig, ax = plt.subplots(1,1,figsize=(16,10))
         vehType = {1:'A',2:'B',3:'C',4:'D',5:'E',6:'F'}
         index = 0
@@ -226,9 +348,10 @@ class Schedule():
         """
         Display the cost composition of a schedule.
         """
-        _cost = self.calCost()
+        import matplotlib.pyplot as plt
+        breakdown = costBreakdown(self).sum()
         fig, ax = plt.subplots(1,1,figsize=(6,6))
-        costs = [round(self.vehicleCost,1), round(self.chargingCost,1), round(self.timeCost,1)]
+        costs = [round(breakdown['VehicleCost'],1), round(breakdown['ChargingCost'],1), round(breakdown['TimeCost'],1)]
         labels = ['Purchase Cost', 'Electricity Cost', 'Time-related Cost']
         ax.bar(labels, costs, width=0.8,color='gray', zorder=10)
         ax.set_ylabel("Cost / CNY", fontsize=20)
@@ -242,32 +365,11 @@ class Schedule():
         """
         Display charging power at station in form of plot.
         """
-        # calculate charging volume of each charging activity "f"
-        chargingV = {}
-        for duty in self.schedule:
-            k = duty.K
-            y = self.evsp.E_k[k]  # initial battery volume
-            for i in range(len(duty.S)-1):
-                if duty.S[i] in self.evsp.F:
-                    chargeVolume = calCharge(self.evsp, k, y)
-                    chargingV[duty.S[i]] = chargeVolume
-                    y = y + chargeVolume - self.evsp.e_kij[k][(duty.S[i],duty.S[i+1])]
-                else:
-                    y = y - self.evsp.e_ki[k][duty.S[i]] - self.evsp.e_kij[k][(duty.S[i],duty.S[i+1])]
-    
-        # calculate charging volume of each r
-        cons_rate, start_t = [], []
-        interval = self.evsp.U * self.evsp.delta
-        for t in list(range(300, 1620, interval)):  # 5:00 - 1:30
-            start_t.append(t)
-            cons = 0
-            for r in [r for r in self.evsp.R if t<=self.evsp.s_r[r]<t+interval]:
-                for f in [f for f in self.R.keys() if self.R[f] == r]:
-                    cons += chargingV[f]
-            cons_rate.append(cons/interval)
+        import matplotlib.pyplot as plt
+        power = chargingPower(self)
         # plot
         fig, ax = plt.subplots(1,1,figsize=(14,6))
-        ax.plot(start_t, cons_rate, 'k^-', label="Energy Consumption per Minute")
+        ax.plot(power['StartTime'], power['Power'], 'k^-', label="Energy Consumption per Minute")
         ax.set_xticks(list(range(300,1620, 60)))
         ax.set_xlim(300, 1560)
         ax.set_xticklabels(['%d:00'%i for i in list(range(5,24))+[0,1,2]])
@@ -282,17 +384,10 @@ class Schedule():
         """
         Vehicle number - time division plot.
         """
+        import matplotlib.pyplot as plt
+        occupancy = chargerOccupancy(self)
         fig, ax = plt.subplots(1,1,figsize=(14,6))
-        veh_in, start_t = [], []  # vehicle in station
-        for r in self.evsp.R:
-            start_t.append(self.evsp.s_r[r])
-            num = 0
-            for u in range(self.evsp.U):
-                index = int(r[1:])-u  # index of r when still charging
-                num += sum(map(('r%d'%(index)).__eq__, self.R.values()))
-            veh_in.append(num)
-
-        ax.plot(start_t, veh_in, 'ko-', label="Number of Buses in Station")
+        ax.plot(occupancy['StartTime'], occupancy['Occupancy'], 'ko-', label="Number of Buses in Station")
         ax.set_xticks(list(range(300,1620, 60)))
         ax.set_xlim(300, 1560)
         ax.set_xticklabels(['%d:00'%i for i in list(range(5,24))+[0,1,2]])
@@ -300,4 +395,4 @@ class Schedule():
 
         plt.legend(fontsize=20, loc=2)
         plt.grid(zorder=0)
-        plt.show()
\ No newline at end of file
+        plt.show()
@@ -0,0 +1,85 @@
+from bisect import bisect_left, bisect_right
+import heapq
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+class SlotIndex():
+
+    """
+    A SlotIndex object indexes charging time divisions by start time and unit electricity price.
+    Time divisions are sorted by start time, so the divisions within a time window are found by bisection.
+    Prices are compiled into an array with a sparse table, so the cheapest division in a range of
+    divisions is found in O(1), and the cheapest one with free capacity by best-first splitting of the range.
+    Ties are broken by the earlier division.
+    """
+
+    __slots__ = ['R','s_r','price','table']
+
+    def __init__(self, R:list, s_r:dict, c_e:dict):
+        """
+        R: time divisions, sorted by start time
+        s_r: start time of time divisions
+        c_e: unit electricity cost of time divisions
+        """
+        self.R = list(R)
+        self.s_r = [s_r[r] for r in self.R]
+        self.price = [c_e[r] for r in self.R]
+
+        # sparse table, table[j][i] is the index of the cheapest division in [i, i+2^j)
+        n = len(self.R)
+        self.table = [list(range(n))]
+        j = 1
+        while (1 << j) <= n:
+            prev, half = self.table[-1], 1 << (j-1)
+            self.table.append([self.cheaper(prev[i], prev[i+half]) for i in range(n - (1 << j) + 1)])
+            j += 1
+
+    def cheaper(self, i1, i2):
+        """
+        Return the index of the cheaper division, the earlier one if equal.
+        """
+        if (self.price[i1], i1) <= (self.price[i2], i2):
+            return i1
+        else:
+            return i2
+
+    def window(self, earliest, latest=None):
+        """
+        Return (a, b), the index range of divisions starting in [earliest, latest].
+        latest: None means no upper bound
+        a > b if no division is available.
+        """
+        a = bisect_left(self.s_r, earliest)
+        b = len(self.s_r) - 1 if latest is None else bisect_right(self.s_r, latest) - 1
+        return a, b
+
+    def argmin(self, a, b):
+        """
+        Return the index of the cheapest division in [a, b].
+        """
+        j = (b - a + 1).bit_length() - 1
+        return self.cheaper(self.table[j][a], self.table[j][b - (1 << j) + 1])
+
+    def cheapest(self, a, b, isFree=None):
+        """
+        Return the index of the cheapest division in [a, b] which has free capacity, None if not exist.
+        isFree: function of division index, return True if the division has free capacity,
+                None means capacity is not considered
+        """
+        if a > b:
+            return None
+        i = self.argmin(a, b)
+        heap = [(self.price[i], i, a, b)]
+        while heap:
+            _price, i, lo, hi = heapq.heappop(heap)
+            if isFree is None or isFree(i):
+                return i
+            for lo_, hi_ in [(lo, i-1), (i+1, hi)]:  # split the range by the occupied division
+                if lo_ <= hi_:
+                    i_ = self.argmin(lo_, hi_)
+                    heapq.heappush(heap, (self.price[i_], i_, lo_, hi_))
+        return None
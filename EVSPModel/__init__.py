@@ -5,3 +5,4 @@
 from .DutyClass import Duty
 from .ScheduleClass import Schedule
 from .EVSPClass import EVSP
+from .Analytics import chargerOccupancy, chargingPower, socTraces, costBreakdown
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EVSPModel import EVSP
+
+
+"""
+@author: Chen Qiuzi
+"""
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+datasets = ['T20', 'T40', 'T80', 'T100', 'T275_Ave']
+
+
+def readTimetable(name):
+    """
+    Read a bundled timetable from Data/.
+    """
+    return pd.read_excel(os.path.join(root, 'Data', '%s.xlsx' % name))
+
+
+def createEVSP(timetable, chargingFuncType='linear', ToU=False, calTimeCost=True, **params):
+    """
+    Create a model with the default settings of the README.
+    params: params of EVSP()
+    """
+    evsp = EVSP(timetable, **params)
+    evsp.setVehTypes()
+    if ToU:
+        evsp.setCosts(ToU=True, c_e={0: 0.3, 480: 1.0, 720: 0.6, 1320: 0.3}, calTimeCost=calTimeCost)
+    else:
+        evsp.setCosts(calTimeCost=calTimeCost)
+    evsp.setChargingFunc(chargingFuncType=chargingFuncType)
+    evsp.createModel()
+    return evsp
+
+
+@pytest.fixture(scope='session')
+def timetables():
+    return {name: readTimetable(name) for name in datasets}
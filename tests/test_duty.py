@@ -0,0 +1,88 @@
+import copy
+
+import pytest
+
+from EVSPModel import Duty
+from conftest import createEVSP
+
+
+@pytest.fixture(scope='module')
+def evsp(timetables):
+    return createEVSP(timetables['T20'])
+
+
+def chargingDuty(evsp):
+    """
+    A duty of type 2 with one charging event, R of charging nodes not in the chain is kept too.
+    """
+    S = ['o', 1, 'f1', 8, 15, 'd']
+    r = min([r for r in evsp.R if ('f1', r) in evsp.I], key=lambda r: evsp.s_r[r])
+    return Duty(evsp, 2, S, {'f1': r, 'f15': 'r3'})
+
+
+def test_copy_round_trip(evsp):
+    duty = chargingDuty(evsp)
+    duty.calCost()
+    other = duty.copy()
+    assert other is not duty
+    assert (other.K, list(other.S), dict(other.R.items())) == (duty.K, list(duty.S), dict(duty.R.items()))
+    assert other.cacheKey() == duty.cacheKey()
+    assert other.calCost() == duty.totalCost
+    assert other.checkEnergyFeasibility() == duty.checkEnergyFeasibility()
+
+    # buffers are not shared
+    other.S.insert(4, 'f8')
+    other.R['f8'] = 'r40'
+    other.R['f1'] = 'r50'
+    assert list(duty.S) == ['o', 1, 'f1', 8, 15, 'd']
+    assert 'f8' not in duty.R
+    assert duty.R['f1'] != 'r50'
+    assert other.cacheKey() != duty.cacheKey()
+
+    # charging time of nodes out of the chain is copied too
+    other.S = ['o', 1, 'f1', 8, 'f8', 15, 'f15', 'd']
+    assert other.R['f15'] == 'r3'
+    duty.removeNodes(['f1'])
+    duty.S = ['o', 1, 'f1', 8, 15, 'd']
+    assert other.R['f1'] == 'r50'
+
+    deep = copy.deepcopy(duty)
+    assert deep.cacheKey() == duty.cacheKey() and deep is not duty
+    assert deep.evsp is duty.evsp
+
+
+def test_cache_key_round_trip(evsp):
+    duty = chargingDuty(evsp)
+    key = duty.cacheKey()
+    assert key == Duty(evsp, duty.K, list(duty.S), dict(duty.R.items())).cacheKey()
+    assert duty.fingerprint() == hash(key)
+
+    # changed by the trip chain, charging time and vehicle type
+    duty.S.remove(8)
+    assert duty.cacheKey() != key
+    duty.S.insert(3, 8)
+    assert duty.cacheKey() == key
+    slot = duty.R['f1']
+    duty.R['f1'] = 'r60'
+    assert duty.cacheKey() != key
+    duty.R['f1'] = slot
+    assert duty.cacheKey() == key
+    duty.K = 3
+    assert duty.cacheKey() == (3, key[1], key[2])
+    assert duty.cacheKey(2) == key
+    duty.K = 2
+
+    # removed charging nodes keep their charging time
+    assert duty.removeNodes(['f1', 15])
+    assert list(duty.S) == ['o', 1, 8, 'd']
+    assert duty.removeNodes([15]) is False
+    duty.S = ['o', 1, 'f1', 8, 15, 'd']
+    assert duty.cacheKey() == key
+
+
+def test_duties_compared_by_identity(evsp):
+    duty = chargingDuty(evsp)
+    other = duty.copy()
+    assert duty != other
+    assert len({duty, other}) == 2
+    assert duty.cacheKey() == other.cacheKey()
@@ -0,0 +1,69 @@
+import random
+
+import numpy as np
+import pytest
+
+from ALNS.InitialSolution import initialize
+from EVSPModel import Duty
+from EVSPModel.EvaluatorClass import getEvaluator
+from conftest import createEVSP
+
+
+def sampleDuties(evsp, seed=0):
+    """
+    Duties of the greedy initial schedule for every vehicle type, with and without charging events
+    inserted after trips, so both feasible and infeasible duties are sampled.
+    """
+    rng = random.Random(seed)
+    duties = []
+    for duty in initialize(evsp).schedule:
+        S = list(duty.S)
+        for k in evsp.K:
+            duties.append(Duty(evsp, k, S, {}))
+            charged, R = [S[0]], {}
+            for pos in range(1, len(S)-1):
+                charged.append(S[pos])
+                f = 'f%d' % S[pos]
+                slots = [r for r in evsp.R if (f, r) in evsp.I]
+                if ((f, S[pos+1]) in evsp.A) and slots and (rng.random() < 0.5):
+                    charged.append(f)
+                    R[f] = rng.choice(slots)
+            charged.append(S[-1])
+            duties.append(Duty(evsp, k, charged, R))
+    return duties
+
+
+@pytest.mark.parametrize('chargingFuncType', ['linear', 'piecewise'])
+@pytest.mark.parametrize('ToU', [False, True])
+@pytest.mark.parametrize('calTimeCost', [True, False])
+def test_evaluate_same_as_duty(timetables, chargingFuncType, ToU, calTimeCost):
+    evsp = createEVSP(timetables['T100'], chargingFuncType=chargingFuncType, ToU=ToU, calTimeCost=calTimeCost)
+    duties = sampleDuties(evsp)
+    assert any(len(duty.R) > 0 for duty in duties)
+    result = getEvaluator(evsp).evaluate(duties)
+
+    expected = [duty.calCostAndFeasibility(duty.cacheKey()) for duty in duties]
+    for name, index in [('vehicleCost', 0), ('timeCost', 1), ('chargingCost', 2), ('totalCost', 3)]:
+        np.testing.assert_allclose(result[name], [cost[index] for cost in expected], rtol=1e-9, atol=1e-9)
+    assert result['energyFeasibility'].tolist() == [cost[4] for cost in expected]
+    assert not all(cost[4] for cost in expected)  # infeasible duties are sampled too
+    if not calTimeCost:
+        assert not result['timeCost'].any()
+
+    for duty in duties:
+        assert duty.calCost() == pytest.approx(duty.totalCost)
+        assert duty.checkEnergyFeasibility() == duty.calCostAndFeasibility(duty.cacheKey())[4]
+
+
+@pytest.mark.parametrize('chargingFuncType', ['linear', 'piecewise'])
+@pytest.mark.parametrize('calTimeCost', [True, False])
+def test_evaluate_veh_types_same_as_duty(timetables, chargingFuncType, calTimeCost):
+    evsp = createEVSP(timetables['T100'], chargingFuncType=chargingFuncType, ToU=True, calTimeCost=calTimeCost)
+    evaluator = getEvaluator(evsp)
+    for duty in sampleDuties(evsp, seed=1)[1::len(evsp.K)*2]:  # duties with charging events, one per chain
+        totalCost, energyFeasibility = evaluator.evaluateVehTypes(list(duty.S), dict(duty.R.items()))
+        for index, k in enumerate(evsp.K):
+            typed = Duty(evsp, k, list(duty.S), dict(duty.R.items()))
+            expected = typed.calCostAndFeasibility(typed.cacheKey())
+            assert totalCost[index] == pytest.approx(expected[3], rel=1e-9)
+            assert bool(energyFeasibility[index]) == expected[4]
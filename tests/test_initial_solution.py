@@ -0,0 +1,27 @@
+import json
+import os
+
+import pytest
+
+from ALNS.InitialSolution import initialize, initialize_nightCharge
+from conftest import createEVSP, datasets
+
+
+# Initial schedules of the baseline initializers on the bundled datasets:
+# {'<dataset>/<greedy|nightCharge>': {'cost': ..., 'duties': [[type, trip chain, charging time], ...]}}
+with open(os.path.join(os.path.dirname(__file__), 'data', 'baseline_initial.json')) as f:
+    baseline = json.load(f)
+
+
+def dump(schedule):
+    return [[duty.K, list(duty.S), dict(duty.R.items())] for duty in schedule.schedule]
+
+
+@pytest.mark.parametrize('name', datasets)
+@pytest.mark.parametrize('mode', ['greedy', 'nightCharge'])
+def test_initial_schedule_same_as_baseline(timetables, name, mode):
+    evsp = createEVSP(timetables[name], nightCharge=(mode == 'nightCharge'))
+    schedule = (initialize_nightCharge if mode == 'nightCharge' else initialize)(evsp)
+    expected = baseline['%s/%s' % (name, mode)]
+    assert dump(schedule) == expected['duties']
+    assert schedule.calCost() == pytest.approx(expected['cost'], abs=1e-6)
@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+
+from ALNS.InitialSolution import initialize
+from EVSPModel import Duty
+from conftest import createEVSP
+
+
+def assertSameModel(edited, fresh):
+    """
+    Assert that an edited model has the same nodes, arcs, params and duty costs as a model created from scratch.
+    """
+    assert edited.n == fresh.n
+    assert edited.T == fresh.T
+    assert edited.F == fresh.F
+    assert edited.A == fresh.A
+    assert edited.I == fresh.I
+    for node in fresh.s_i:
+        assert edited.s_i[node] == fresh.s_i[node]
+    for node in fresh.t_i:
+        assert edited.t_i[node] == fresh.t_i[node]
+    for k in fresh.K:
+        for node in fresh.e_ki[k]:
+            assert edited.e_ki[k][node] == fresh.e_ki[k][node]
+        for arc in fresh.A:
+            assert edited.e_kij[k][arc] == fresh.e_kij[k][arc]
+    for arc in fresh.A:
+        assert edited.t_ij[arc] == fresh.t_ij[arc]
+
+    for duty in initialize(fresh).schedule:
+        copy = Duty(edited, duty.K, list(duty.S), dict(duty.R.items()))
+        assert copy.calCost() == pytest.approx(duty.calCost())
+        assert copy.checkEnergyFeasibility() == duty.checkEnergyFeasibility()
+
+
+@pytest.fixture(params=[True, False], ids=['lineChange', 'noLineChange'])
+def lineChange(request):
+    return request.param
+
+
+def test_add_trips(timetables, lineChange):
+    timetable = timetables['T100']
+    added = timetable.iloc[::3]  # spread over the day, appended after the other trips
+    evsp = createEVSP(timetable.drop(added.index).reset_index(drop=True), lineChange=lineChange)
+    newTrips = evsp.addTrips(added)
+    assert newTrips == list(range(len(timetable) - len(added) + 1, len(timetable) + 1))
+    assert evsp.timetable.ID.tolist()[-len(added):] == added.ID.tolist()
+    assertSameModel(evsp, createEVSP(evsp.timetable, lineChange=lineChange))
+
+
+def test_remove_trips(timetables, lineChange):
+    timetable = timetables['T100']
+    evsp = createEVSP(timetable, lineChange=lineChange)
+    removed = list(range(2, evsp.n+1, 4))
+    mapping = evsp.removeTrips(removed)
+    assert evsp.numbering == 1
+    assert sorted(mapping) == [i for i in range(1, len(timetable)+1) if i not in removed]
+    assert sorted(mapping.values()) == list(range(1, evsp.n+1))
+    assert evsp.timetable.ID.tolist() == [timetable.ID.iloc[old-1] for old in sorted(mapping)]
+    assertSameModel(evsp, createEVSP(evsp.timetable, lineChange=lineChange))
+
+
+def test_update_trip(timetables, lineChange):
+    timetable = timetables['T100']
+    evsp = createEVSP(timetable, lineChange=lineChange)
+    evsp.updateTrip(10, StartTimeMin=evsp.s_i[10] + 95, TravelTimeMin=evsp.t_i[10] + 5)
+    evsp.updateTrip(60, Consumption=evsp.e_ki[1][60] * 2)
+    evsp.updateTrip(60, StartTimeMin=evsp.s_i[60] - 120)
+    assert evsp.timetable.ID.tolist() == timetable.ID.tolist()  # rows are not re-sorted
+    assert timetables['T100'].StartTimeMin.iloc[9] == timetable.StartTimeMin.iloc[9]  # the input is not changed
+    assertSameModel(evsp, createEVSP(evsp.timetable, lineChange=lineChange))
+
+
+def test_edits_in_sequence(timetables):
+    timetable = timetables['T80']
+    evsp = createEVSP(timetable.iloc[:60].reset_index(drop=True))
+    evsp.addTrips(timetable.iloc[60:])
+    evsp.updateTrip(70, StartTimeMin=evsp.s_i[70] - 200)
+    evsp.removeTrips([3, 65])
+    evsp.addTrips(timetable.iloc[[2]])
+    assertSameModel(evsp, createEVSP(evsp.timetable))
+
+
+def test_add_trips_checks_columns(timetables):
+    timetable = timetables['T20']
+    evsp = createEVSP(timetable)
+    with pytest.raises(KeyError):
+        evsp.addTrips(timetable.drop(columns=['Consumption']))
+    with pytest.raises(ValueError):
+        evsp.addTrips(timetable.assign(Consumption=float('nan')))
+    assert evsp.n == len(timetable)
+    assert isinstance(evsp.timetable, pd.DataFrame) and evsp.timetable is not timetable
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+import urllib.request
+
+import pytest
+
+from ALNS.Service import SolverService
+from conftest import root
+
+
+def request(service, method, path, body=None):
+    """
+    Send a JSON request to the service, return (status code, JSON content).
+    """
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request('http://%s:%d%s' % (service.host, service.port, path), data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def service():
+    service = SolverService(port=0, processes=1, printLog=False)
+    service.startInThread()
+    yield service
+    service.stopInThread()
+
+
+def test_round_trip(service):
+    code, model = request(service, 'POST', '/models', {'name': 'T20', 'timetable': os.path.join(root, 'Data', 'T20.xlsx')})
+    assert code == 201
+    assert model == {'Name': 'T20', 'Trips': 20}
+
+    code, status = request(service, 'POST', '/jobs', {'model': 'T20', 'params': {'iterMax': 50, 'segLength': 10}, 'seed': 1})
+    assert code == 202
+    jobId = status['Id']
+    assert status['Status'] in ['queued', 'running']
+
+    deadline = time.time() + 120
+    while status['Status'] in ['queued', 'running']:
+        assert time.time() < deadline
+        time.sleep(0.2)
+        code, status = request(service, 'GET', '/jobs/%d' % jobId)
+        assert code == 200
+    assert status['Status'] == 'done', status['Error']
+
+    result = status['Result']
+    assert result['Iterations'] <= 50
+    assert result['Feasible'] is True
+    assert result['Buses'] > 0 and result['Cost'] > 0
+    column = result['Schedule']['columns'].index('Node')
+    nodes = [row[column] for row in result['Schedule']['data']]
+    assert sorted(int(s) for s in nodes if s.isdigit()) == list(range(1, 21))  # each trip is served once
+    assert status['Progress'] is not None
+
+    # the same seed gives the same result
+    code, again = request(service, 'POST', '/jobs', {'model': 'T20', 'params': {'iterMax': 50, 'segLength': 10}, 'seed': 1})
+    while again['Status'] in ['queued', 'running']:
+        time.sleep(0.2)
+        code, again = request(service, 'GET', '/jobs/%d' % again['Id'])
+    assert again['Result']['Cost'] == pytest.approx(result['Cost'])
+
+
+def test_bad_requests(service):
+    code, content = request(service, 'POST', '/jobs', {'model': 'missing'})
+    assert code == 400
+    code, content = request(service, 'GET', '/nothing')
+    assert code == 404
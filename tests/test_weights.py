@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from ALNS.WeightsManagement import SelectionPolicy, UCBPolicy, ThompsonPolicy, Weights
+
+
+@pytest.mark.parametrize('policy', [UCBPolicy, ThompsonPolicy])
+@pytest.mark.parametrize('decay', [0, -0.5, 1.5])
+def test_decay_out_of_range(policy, decay):
+    with pytest.raises(ValueError):
+        policy(decay=decay)
+
+
+def test_ucb_small_decay():
+    # counts decay below 1 in total, the log of the total count should not be negative
+    random.seed(0)
+    policy = UCBPolicy(decay=0.001)
+    for _ in range(3):
+        policy.add()
+    for _ in range(5):
+        for i in range(policy.num):
+            policy.update(i, random.choice([0, 1, 2, 3]), 0.1)
+        policy.updateSegment()
+        assert sum(policy.count) < 1
+        assert policy.select() in range(policy.num)
+    assert all(w >= 0 for w in policy.weights())
+
+
+def test_selection_policy_is_abstract():
+    with pytest.raises(TypeError):
+        SelectionPolicy()